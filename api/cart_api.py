@@ -1,28 +1,250 @@
 """
 API client classes for Zomato cart offer operations.
 """
+import copy
+import functools
+import json
+import threading
+from bisect import bisect_right
 import requests
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Any, Sequence, Union
+
+from paise import ENGINE_FLOAT, ROUND_HALF_UP, discount_tables
+from pricing import DISCOUNTS, OFFER_TYPE_CODES, best_offer_tiers
+
+
+# Size of the request body chunks sent by the streaming bulk upload methods
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Cart values priced locally; anything else is sent to the service, which
+# validates it
+_LOCAL_CART_VALUE_TYPES = (int, float)
+
+
+def _iter_body(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """Join encoded lines and yield the body in UPLOAD_CHUNK_BYTES pieces."""
+    buffer = bytearray()
+    for line in lines:
+        buffer += line
+        if not line.endswith(b'\n'):
+            buffer += b'\n'
+        if len(buffer) >= UPLOAD_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _iter_ndjson_body(records: Iterable[Union[Dict[str, Any], str, bytes]]) -> Iterator[bytes]:
+    """
+    Encode records as an NDJSON request body.
+    
+    Records may be dicts, which are JSON-encoded, or already-encoded lines
+    such as those read from an NDJSON file.
+    """
+    def encode(record):
+        if isinstance(record, dict):
+            record = json.dumps(record, separators=(',', ':'))
+        if isinstance(record, str):
+            record = record.encode('utf-8')
+        return record
+    return _iter_body(encode(record) for record in records)
+
+
+def _iter_csv_body(rows: Iterable[Union[Sequence[Any], str, bytes]]) -> Iterator[bytes]:
+    """
+    Encode rows as a CSV request body.
+    
+    Rows may be (user_id, segment) sequences or already-encoded lines such
+    as those read from a CSV file.
+    """
+    def encode(row):
+        if isinstance(row, str):
+            return row.encode('utf-8')
+        if isinstance(row, bytes):
+            return row
+        return ','.join(str(value) for value in row).encode('utf-8')
+    return _iter_body(encode(row) for row in rows)
+
+
+def _compile_offers(offers: Dict[str, Any], discounts: Sequence[Callable[..., float]] = DISCOUNTS) -> Optional[Dict[str, tuple]]:
+    """
+    Turn a restaurant's offers in the API layout into
+    {segment: (thresholds, choices)}, each choice (discount, offer_value, max_discount) or None.
+    
+    choices[bisect_right(thresholds, cart_value)] is the offer the service
+    applies to a cart: a segment with several offers (a list) or a
+    min_cart_value is resolved with the same precomputed thresholds.
+    
+    discounts is the discount table of the service's pricing engine.
+    
+    Returns None when an offer type is not known to this client, so the
+    restaurant is priced by the service instead.
+    """
+    compiled = {}
+    for segment, offer in offers.items():
+        members = offer if isinstance(offer, list) else [offer]
+        candidates = []
+        for member in members:
+            code = OFFER_TYPE_CODES.get(member['offer_type'])
+            if code is None:
+                return None
+            candidates.append((code, member['offer_value'], member.get('min_cart_value', 0), member.get('max_discount')))
+        if len(candidates) == 1 and not candidates[0][2]:
+            thresholds, choices = (), (0,)
+        else:
+            thresholds, choices = best_offer_tiers(candidates)
+        compiled[segment] = (thresholds, tuple(
+            None if choice is None else (discounts[candidates[choice][0]], candidates[choice][1], candidates[choice][3])
+            for choice in choices
+        ))
+    return compiled
+
+
+class _FeedMirror:
+    """Local copy of a data set served by a change feed endpoint."""
+    
+    def __init__(self, path: str, key: str, value: str, compile: Optional[Callable[[Any], Any]] = None):
+        """
+        Args:
+            path: Path of the change feed endpoint
+            key: Name of the key field of a change
+            value: Name of the value field of a change
+            compile: Optional function deriving a second, compiled value
+                from each value; None results are left out
+        """
+        self.path = path
+        self.key = key
+        self.value = value
+        self.compile = compile
+        self.data: Dict[Any, Any] = {}
+        self.compiled: Dict[Any, Any] = {}
+        self.version = 0
+        self.epoch: Optional[str] = None
+        # Serializes syncs, e.g. by the refresh thread and the caller
+        self.lock = threading.Lock()
+    
+    def replace(self, data: Dict[Any, Any], epoch: str) -> None:
+        """Replace the whole copy, e.g. with a snapshot."""
+        compiled = {}
+        if self.compile is not None:
+            for key, value in data.items():
+                value = self.compile(value)
+                if value is not None:
+                    compiled[key] = value
+        self.data, self.compiled = data, compiled
+        self.epoch = epoch
+    
+    def apply(self, changes: List[Dict[str, Any]]) -> None:
+        """Apply the changes of a delta page."""
+        data, compiled, compile = self.data, self.compiled, self.compile
+        for change in changes:
+            key, value = change[self.key], change[self.value]
+            if value is None:
+                data.pop(key, None)
+                compiled.pop(key, None)
+                continue
+            data[key] = value
+            if compile is not None:
+                value = compile(value)
+                if value is None:
+                    compiled.pop(key, None)
+                else:
+                    compiled[key] = value
 
 
 class CartAPI:
     """API client for cart and offer operations."""
     
-    def __init__(self, base_url: str = 'http://localhost:5001'):
+    def __init__(
+        self,
+        base_url: str = 'http://localhost:5001',
+        cache_validators: bool = True,
+        pricing_engine: str = ENGINE_FLOAT,
+        rounding: str = ROUND_HALF_UP
+    ):
         """
         Initialize the API client.
         
         Args:
             base_url: Base URL for the API server
+            cache_validators: Keep ETags of read responses and revalidate
+                them with If-None-Match, so unchanged data is not re-sent
+            pricing_engine: Pricing engine the service uses ('float' or
+                'paise'), for local evaluation
+            rounding: Rounding mode of the service's paise engine
         """
         self.base_url = base_url.rstrip('/')
+        # Structure: {(path, params): (etag, data)}
+        self._validators: Optional[Dict[tuple, tuple]] = {} if cache_validators else None
+        # Local copies of the offer catalog and user segments, kept up to
+        # date by sync_offers() and sync_segments()
+        discounts, _ = discount_tables(pricing_engine, rounding)
+        self._offers = _FeedMirror('/api/v1/offers/changes', 'restaurant_id', 'offers',
+                                   functools.partial(_compile_offers, discounts=discounts))
+        self._segments = _FeedMirror('/api/v1/user_segments/changes', 'user_id', 'segment')
+        # Whether apply_offer and quote price carts from the local copies
+        self.local_evaluation = False
+        self._refresh_stop: Optional[threading.Event] = None
+    
+    @property
+    def offers_mirror(self) -> Dict[Any, Dict[str, Dict[str, Any]]]:
+        """Local copy of the offer catalog: {restaurant_id: {segment: {"offer_type", "offer_value"}}}."""
+        return self._offers.data
+    
+    @property
+    def offers_version(self) -> int:
+        """Catalog version offers_mirror is synced to."""
+        return self._offers.version
+    
+    @property
+    def offers_epoch(self) -> Optional[str]:
+        """Epoch of the service run offers_mirror was synced from."""
+        return self._offers.epoch
+    
+    @property
+    def segments_mirror(self) -> Dict[Any, str]:
+        """Local copy of the user segments: {user_id: segment}."""
+        return self._segments.data
+    
+    def _conditional_get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        GET a resource, revalidating a cached copy with If-None-Match.
+        
+        A 304 response is answered from the cache, so the returned status
+        code is the one the cached response had.
+        
+        Returns:
+            Response dictionary; not_modified is True when the data came
+            from the cache
+        """
+        key = (path, tuple(sorted(params.items())))
+        cached = self._validators.get(key) if self._validators is not None else None
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = requests.get(f'{self.base_url}{path}', params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return {'status_code': 200, 'data': copy.deepcopy(cached[1]), 'not_modified': True}
+        
+        data = response.json() if response.content else {}
+        if self._validators is not None:
+            etag = response.headers.get('ETag')
+            if response.status_code == 200 and etag:
+                self._validators[key] = (etag, copy.deepcopy(data))
+            else:
+                self._validators.pop(key, None)
+        return {'status_code': response.status_code, 'data': data, 'not_modified': False}
     
     def add_offer(
         self,
         restaurant_id: int,
         offer_type: str,
         offer_value: float,
-        customer_segment: List[str]
+        customer_segment: List[str],
+        valid_from: Optional[float] = None,
+        valid_until: Optional[float] = None,
+        mode: Optional[str] = None,
+        min_cart_value: Optional[float] = None,
+        max_discount: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Add offer to a restaurant for customer segments.
@@ -32,23 +254,393 @@ class CartAPI:
             offer_type: Type of offer ('FLATX' or 'FLAT%')
             offer_value: Offer value (amount or percentage)
             customer_segment: List of customer segments ['p1', 'p2', 'p3']
+            valid_from: Optional Unix time the offer starts to apply
+            valid_until: Optional Unix time the offer is removed
+            mode: 'replace' (the default) to replace the segments' offers,
+                or 'add' to run the offer alongside them
+            min_cart_value: Optional smallest cart value the offer applies to
+            max_discount: Optional cap on the amount a FLAT% offer takes off
         
         Returns:
             Response dictionary
         """
-        url = f'{self.base_url}/api/v1/offer'
         payload = {
             'restaurant_id': restaurant_id,
             'offer_type': offer_type,
             'offer_value': offer_value,
             'customer_segment': customer_segment
         }
-        response = requests.post(url, json=payload)
+        return self._post_offer('/api/v1/offer', payload, valid_from=valid_from, valid_until=valid_until,
+                                mode=mode, min_cart_value=min_cart_value, max_discount=max_discount)
+    
+    def add_chain_offer(
+        self,
+        chain_id: int,
+        offer_type: str,
+        offer_value: float,
+        customer_segment: List[str],
+        valid_from: Optional[float] = None,
+        valid_until: Optional[float] = None,
+        mode: Optional[str] = None,
+        min_cart_value: Optional[float] = None,
+        max_discount: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Add offer to a chain for customer segments.
+        
+        The offer applies to the chain's outlets, except for segments where
+        an outlet has an offer of its own. Takes the same optional arguments
+        as add_offer.
+        
+        Args:
+            chain_id: Chain ID
+            offer_type: Type of offer ('FLATX' or 'FLAT%')
+            offer_value: Offer value (amount or percentage)
+            customer_segment: List of customer segments ['p1', 'p2', 'p3']
+        
+        Returns:
+            Response dictionary
+        """
+        payload = {
+            'chain_id': chain_id,
+            'offer_type': offer_type,
+            'offer_value': offer_value,
+            'customer_segment': customer_segment
+        }
+        return self._post_offer('/api/v1/chain/offer', payload, valid_from=valid_from, valid_until=valid_until,
+                                mode=mode, min_cart_value=min_cart_value, max_discount=max_discount)
+    
+    def _post_offer(self, path: str, payload: Dict[str, Any], **optional: Any) -> Dict[str, Any]:
+        """POST an offer payload, with the optional fields that are set."""
+        payload.update((name, value) for name, value in optional.items() if value is not None)
+        response = requests.post(f'{self.base_url}{path}', json=payload)
+        return {
+            'status_code': response.status_code,
+            'data': response.json() if response.content else {}
+        }
+    
+    def set_chain_outlets(self, chain_id: Optional[int], restaurant_ids: List[int]) -> Dict[str, Any]:
+        """
+        Make restaurants outlets of a chain.
+        
+        Args:
+            chain_id: Chain ID, or None for the restaurants to leave their chains
+            restaurant_ids: Restaurant IDs
+        
+        Returns:
+            Response dictionary
+        """
+        url = f'{self.base_url}/api/v1/chain/outlets'
+        response = requests.post(url, json={'chain_id': chain_id, 'restaurant_ids': restaurant_ids})
         return {
             'status_code': response.status_code,
             'data': response.json() if response.content else {}
         }
     
+    def get_chain(self, chain_id: int) -> Dict[str, Any]:
+        """
+        Get a chain's offers and outlets.
+        
+        Args:
+            chain_id: Chain ID
+        
+        Returns:
+            Response dictionary with chain_id, offers by segment and restaurant_ids
+        """
+        url = f'{self.base_url}/api/v1/chain'
+        response = requests.get(url, params={'chain_id': chain_id})
+        return {
+            'status_code': response.status_code,
+            'data': response.json() if response.content else {}
+        }
+    
+    def add_offers_bulk(
+        self,
+        offers: Iterable[Union[Dict[str, Any], str, bytes]]
+    ) -> Dict[str, Any]:
+        """
+        Bulk-import offers as a streamed NDJSON upload.
+        
+        The body is sent with chunked transfer encoding, so large catalogs
+        are never held in memory on either side.
+        
+        Args:
+            offers: Offer payloads (same fields as add_offer) as dicts, or
+                NDJSON lines, e.g. an NDJSON file opened in binary mode
+        
+        Returns:
+            Response dictionary with accepted/rejected counts and per-line errors
+        """
+        url = f'{self.base_url}/api/v1/offer/bulk'
+        headers = {'Content-Type': 'application/x-ndjson'}
+        response = requests.post(url, data=_iter_ndjson_body(offers), headers=headers)
+        return {
+            'status_code': response.status_code,
+            'data': response.json() if response.content else {}
+        }
+    
+    def get_offers(self, restaurant_id: int) -> Dict[str, Any]:
+        """
+        Get a restaurant's offers for each customer segment.
+        
+        Args:
+            restaurant_id: Restaurant ID
+        
+        Returns:
+            Response dictionary with restaurant_id and offers by segment
+        """
+        return self._conditional_get('/api/v1/offer', {'restaurant_id': restaurant_id})
+    
+    def _get_changes(self, path: str, since: int, limit: Optional[int], cursor: Optional[int]) -> Dict[str, Any]:
+        """GET one page of a change feed endpoint."""
+        params: Dict[str, Any] = {'since': since}
+        if limit is not None:
+            params['limit'] = limit
+        if cursor is not None:
+            params['cursor'] = cursor
+        response = requests.get(f'{self.base_url}{path}', params=params)
+        return {
+            'status_code': response.status_code,
+            'data': response.json() if response.content else {}
+        }
+    
+    def get_offer_changes(
+        self,
+        since: int,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of the restaurants whose offers changed after a catalog version.
+        
+        Args:
+            since: Catalog version the client has synced up to
+            limit: Largest number of changes in the page
+            cursor: next_cursor of the previous snapshot page
+        
+        Returns:
+            Response dictionary with epoch, version, snapshot, has_more and changes
+        """
+        return self._get_changes(self._offers.path, since, limit, cursor)
+    
+    def get_user_segment_changes(
+        self,
+        since: int,
+        limit: Optional[int] = None,
+        cursor: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Get one page of the users whose segment changed after a version.
+        
+        Args:
+            since: Version the client has synced up to
+            limit: Largest number of changes in the page
+            cursor: next_cursor of the previous snapshot page
+        
+        Returns:
+            Response dictionary with epoch, version, snapshot, has_more and changes
+        """
+        return self._get_changes(self._segments.path, since, limit, cursor)
+    
+    def _sync(self, mirror: _FeedMirror, limit: Optional[int]) -> Dict[str, Any]:
+        """
+        Bring a local copy up to date with its change feed.
+        
+        Fetches only the keys changed since the last sync. The first sync,
+        and any sync after the service restarted, cleared the data or dropped
+        the changes since the copy's version from its change ring, loads a
+        full snapshot instead.
+        """
+        with mirror.lock:
+            applied = 0
+            loaded_snapshot = False
+            snapshot: Optional[Dict[Any, Any]] = None
+            snapshot_epoch = None
+            since = mirror.version
+            cursor = None
+            while True:
+                response = self._get_changes(mirror.path, since, limit, cursor)
+                if response['status_code'] != 200:
+                    return response
+                page = response['data']
+                
+                if page['snapshot']:
+                    if page['cursor'] == 0:
+                        snapshot = {}
+                        snapshot_epoch = page['epoch']
+                    elif snapshot is None or page['epoch'] != snapshot_epoch:
+                        # The service restarted between pages
+                        snapshot, since, cursor = None, 0, None
+                        continue
+                    for change in page['changes']:
+                        snapshot[change[mirror.key]] = change[mirror.value]
+                    applied += len(page['changes'])
+                    since = page['version']
+                    if page['has_more']:
+                        cursor = page['next_cursor']
+                        continue
+                    mirror.replace(snapshot, page['epoch'])
+                    mirror.version = since
+                    loaded_snapshot = True
+                    snapshot, cursor = None, None
+                    continue
+                
+                if page['epoch'] != mirror.epoch:
+                    if since != 0:
+                        # Versions of another run of the service: start over
+                        since = 0
+                        continue
+                    # The changes since version 0 are all the data of this run
+                    mirror.replace({}, page['epoch'])
+                mirror.apply(page['changes'])
+                applied += len(page['changes'])
+                mirror.version = since = page['version']
+                if not page['has_more']:
+                    break
+            
+            return {
+                'status_code': 200,
+                'data': {
+                    'epoch': mirror.epoch,
+                    'version': mirror.version,
+                    'size': len(mirror.data),
+                    'changes': applied,
+                    'snapshot': loaded_snapshot
+                }
+            }
+    
+    def sync_offers(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Bring offers_mirror up to date with the service's offer catalog.
+        
+        Fetches only the restaurants changed since the last sync. The first
+        sync, and any sync after the service restarted, cleared its catalog or
+        dropped the changes since offers_version from its change ring, loads a
+        full snapshot instead.
+        
+        Args:
+            limit: Largest number of changes per page
+        
+        Returns:
+            Response dictionary with the version and epoch synced to, the
+            number of restaurants in the mirror (size), the number of
+            changes applied and whether a snapshot was loaded; or the failed
+            response of a page
+        """
+        return self._sync(self._offers, limit)
+    
+    def sync_segments(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Bring segments_mirror up to date with the service's user segments.
+        
+        Works like sync_offers().
+        
+        Args:
+            limit: Largest number of changes per page
+        
+        Returns:
+            Response dictionary like that of sync_offers()
+        """
+        return self._sync(self._segments, limit)
+    
+    def refresh_local(self) -> Dict[str, Any]:
+        """
+        Sync the local offer and segment copies used for local evaluation.
+        
+        Returns:
+            Response dictionary with the sync_offers() and sync_segments()
+            results under 'offers' and 'segments', or the first failed response
+        """
+        offers = self.sync_offers()
+        if offers['status_code'] != 200:
+            return offers
+        segments = self.sync_segments()
+        if segments['status_code'] != 200:
+            return segments
+        return {'status_code': 200, 'data': {'offers': offers['data'], 'segments': segments['data']}}
+    
+    def enable_local_evaluation(self, refresh_interval: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Price carts from local copies of the offers and user segments.
+        
+        apply_offer and quote then compute results with the service's own
+        FLATX/FLAT% functions (of the pricing engine given to the
+        constructor), so they match the service exactly as of the last
+        refresh. Carts for users or restaurants missing from the copies,
+        and carts the service would reject, are still sent to the service.
+        
+        Args:
+            refresh_interval: Seconds between refreshes by a background
+                thread; None to refresh only when refresh_local() is called
+        
+        Returns:
+            The result of the initial refresh_local()
+        """
+        result = self.refresh_local()
+        if result['status_code'] != 200:
+            return result
+        self.local_evaluation = True
+        if refresh_interval is not None and self._refresh_stop is None:
+            stop = self._refresh_stop = threading.Event()
+            
+            def refresh():
+                while not stop.wait(refresh_interval):
+                    try:
+                        self.refresh_local()
+                    except requests.RequestException:
+                        # Keep pricing from the last copies until the service is back
+                        pass
+            
+            threading.Thread(target=refresh, name='cart-api-refresh', daemon=True).start()
+        return result
+    
+    def disable_local_evaluation(self) -> None:
+        """Send every cart to the service again and stop background refreshes."""
+        self.local_evaluation = False
+        if self._refresh_stop is not None:
+            self._refresh_stop.set()
+            self._refresh_stop = None
+    
+    def _local_quote(self, cart_value: Any, user_id: Any, restaurant_id: Any) -> Optional[float]:
+        """Price a cart from the local copies, or return None when the service has to."""
+        try:
+            segment = self._segments.data.get(user_id)
+            offers = self._offers.compiled.get(restaurant_id)
+        except TypeError:
+            # Unhashable ids; the service reports the error
+            return None
+        if segment is None or offers is None or type(cart_value) not in _LOCAL_CART_VALUE_TYPES or not cart_value >= 0:
+            return None
+        offer = offers.get(segment)
+        cart_value = float(cart_value)
+        if offer is None:
+            return cart_value
+        thresholds, choices = offer
+        offer = choices[bisect_right(thresholds, cart_value)] if thresholds else choices[0]
+        if offer is None:
+            return cart_value
+        return offer[0](cart_value, offer[1], offer[2])
+    
+    def quote(self, cart_value: float, user_id: int, restaurant_id: int) -> Optional[float]:
+        """
+        Get the cart value after discount, from the local copies when local evaluation is enabled.
+        
+        Args:
+            cart_value: Original cart value
+            user_id: User ID
+            restaurant_id: Restaurant ID
+        
+        Returns:
+            Cart value after discount, or None when the service rejects the
+            cart (apply_offer returns the error)
+        """
+        if self.local_evaluation:
+            final_cart_value = self._local_quote(cart_value, user_id, restaurant_id)
+            if final_cart_value is not None:
+                return final_cart_value
+        response = self._post_apply_offer(cart_value, user_id, restaurant_id)
+        return response['data']['cart_value'] if response['status_code'] == 200 else None
+    
     def apply_offer(
         self,
         cart_value: float,
@@ -66,6 +658,14 @@ class CartAPI:
         Returns:
             Response dictionary with cart_value after discount
         """
+        if self.local_evaluation:
+            final_cart_value = self._local_quote(cart_value, user_id, restaurant_id)
+            if final_cart_value is not None:
+                return {'status_code': 200, 'data': {'cart_value': final_cart_value}}
+        return self._post_apply_offer(cart_value, user_id, restaurant_id)
+    
+    def _post_apply_offer(self, cart_value: Any, user_id: Any, restaurant_id: Any) -> Dict[str, Any]:
+        """Apply an offer to a cart through the service."""
         url = f'{self.base_url}/api/v1/cart/apply_offer'
         payload = {
             'cart_value': cart_value,
@@ -78,24 +678,37 @@ class CartAPI:
             'data': response.json() if response.content else {}
         }
     
-    def get_user_segment(self, user_id: int) -> Dict[str, Any]:
+    def apply_offers_batch(self, carts: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
-        Get user segment.
+        Apply offers to many carts in a single request.
         
         Args:
-            user_id: User ID
+            carts: List of carts, each with 'cart_value', 'user_id' and
+                'restaurant_id' keys
         
         Returns:
-            Response dictionary with segment information
+            Response dictionary with one result per cart, in request order
         """
-        url = f'{self.base_url}/api/v1/user_segment'
-        params = {'user_id': user_id}
-        response = requests.get(url, params=params)
+        url = f'{self.base_url}/api/v1/cart/apply_offer/batch'
+        payload = {'carts': carts}
+        response = requests.post(url, json=payload)
         return {
             'status_code': response.status_code,
             'data': response.json() if response.content else {}
         }
     
+    def get_user_segment(self, user_id: int) -> Dict[str, Any]:
+        """
+        Get user segment.
+        
+        Args:
+            user_id: User ID
+        
+        Returns:
+            Response dictionary with segment information
+        """
+        return self._conditional_get('/api/v1/user_segment', {'user_id': user_id})
+    
     def set_user_segment(self, user_id: int, segment: str) -> Dict[str, Any]:
         """
         Set user segment (helper method for testing).
@@ -118,6 +731,42 @@ class CartAPI:
             'data': response.json() if response.content else {}
         }
     
+    def set_user_segments_bulk(
+        self,
+        rows: Iterable[Union[Dict[str, Any], Sequence[Any], str, bytes]],
+        fmt: str = 'ndjson'
+    ) -> Dict[str, Any]:
+        """
+        Bulk upsert user segments as a streamed CSV or NDJSON upload.
+        
+        Args:
+            rows: For 'ndjson', dicts with 'user_id' and 'segment' keys or
+                NDJSON lines. For 'csv', (user_id, segment) pairs or CSV
+                lines, optionally starting with a 'user_id,segment' header.
+            fmt: Upload format ('ndjson' or 'csv')
+        
+        Returns:
+            Response dictionary with inserted/updated/rejected counts and
+            per-line errors
+        
+        Raises:
+            ValueError: If fmt is not 'ndjson' or 'csv'
+        """
+        if fmt == 'csv':
+            body = _iter_csv_body(rows)
+            headers = {'Content-Type': 'text/csv'}
+        elif fmt == 'ndjson':
+            body = _iter_ndjson_body(rows)
+            headers = {'Content-Type': 'application/x-ndjson'}
+        else:
+            raise ValueError(f"Unsupported format: {fmt}")
+        url = f'{self.base_url}/api/v1/user_segment/bulk'
+        response = requests.post(url, data=body, headers=headers)
+        return {
+            'status_code': response.status_code,
+            'data': response.json() if response.content else {}
+        }
+    
     def health_check(self) -> Dict[str, Any]:
         """
         Check if the API server is healthy.
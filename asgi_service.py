@@ -0,0 +1,368 @@
+"""
+Asyncio (ASGI) implementation of the Zomato cart offer endpoints.
+
+Serves the same routes as the Flask app in mock_service.py without a thread
+per connection: one event loop multiplexes every open connection, so
+thousands of idle keep-alive checkout connections cost a socket and a
+coroutine each. Handlers share mock_service's state, validation and write
+path, so both apps can serve the same process's data.
+
+Routes:
+    GET  /api/v1/offer
+    POST /api/v1/offer
+    POST /api/v1/cart/apply_offer
+    GET  /api/v1/user_segment
+    POST /api/v1/user_segment
+    GET  /health
+
+`app` is a plain ASGI 3 application and runs under any ASGI server, e.g.
+`uvicorn asgi_service:app`. `serve()` is a small built-in HTTP/1.1 server
+(keep-alive, Content-Length bodies) for running it without one.
+
+Usage:
+    python3 asgi_service.py [--host 0.0.0.0] [--port 5001]
+"""
+import argparse
+import asyncio
+import json
+from bisect import bisect_right
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl
+
+import mock_service
+from responses import HEALTHY_BODY, SUCCESS_BODY, USER_SEGMENT_NOT_FOUND_BODY, encode_body, encode_cart_value
+from validation import (
+    validate_cart,
+    validate_offer,
+    validate_restaurant_id_param,
+    validate_user_id_param,
+    validate_user_segment
+)
+
+
+# Largest request head (request line + headers) and body the built-in server accepts
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+_JSON_HEADERS = [(b'content-type', b'application/json')]
+
+# Handlers return (status, body), or (status, body, etag) for conditional GETs.
+# body is a dict, or bytes that are already encoded JSON
+Response = Union[Tuple[int, Union[Dict[str, Any], bytes]], Tuple[int, Dict[str, Any], str]]
+
+_REASONS = {200: b'OK', 304: b'Not Modified', 400: b'Bad Request', 404: b'Not Found', 405: b'Method Not Allowed',
+            413: b'Payload Too Large', 500: b'Internal Server Error', 501: b'Not Implemented'}
+
+
+def _etag_matches(if_none_match: bytes, etag: str) -> bool:
+    """Whether an If-None-Match header value names etag (or is '*')."""
+    for tag in if_none_match.decode('latin-1').split(','):
+        tag = tag.strip()
+        if tag == '*' or tag.removeprefix('W/') == f'"{etag}"':
+            return True
+    return False
+
+
+def _json_body(body: bytes, headers: Dict[bytes, bytes]) -> Any:
+    """
+    Parse a JSON request body.
+
+    Raises:
+        ValueError: If the request is not JSON or the body does not parse
+    """
+    content_type = headers.get(b'content-type', b'').split(b';', 1)[0].strip()
+    if content_type != b'application/json' and not content_type.endswith(b'+json'):
+        raise ValueError("Did not attempt to load JSON data because the request "
+                         "Content-Type was not 'application/json'.")
+    return json.loads(body)
+
+
+async def _commit(record: Dict[str, Any]) -> None:
+    """
+    Commit a write record without blocking the event loop.
+
+    Commits that may wait (for an fsync, or for a pre-fork parent) run in
+    a worker thread; plain in-memory commits run inline.
+    """
+    if mock_service.persistence is not None or mock_service.commit_forwarder is not None:
+        await asyncio.to_thread(mock_service._commit, record)
+    else:
+        mock_service._commit(record)
+
+
+async def add_offer(body: bytes, headers: Dict[bytes, bytes], query: bytes) -> Response:
+    """Add offer to a restaurant for customer segments."""
+    data = _json_body(body, headers)
+    offer, error = validate_offer(data)
+    if error:
+        return error[1], {"error": error[0]}
+    row, error, op = mock_service._offer_row(offer)
+    if error:
+        return 400, {"error": error}
+    await _commit({"op": op, "rows": [row]})
+    return 200, SUCCESS_BODY
+
+
+async def apply_offer(body: bytes, headers: Dict[bytes, bytes], query: bytes) -> Response:
+    """Apply offer to cart based on user segment and restaurant."""
+    data = _json_body(body, headers)
+    cart, error = validate_cart(data)
+    if error:
+        return error[1], {"error": error[0]}
+    cart_value, user_id, restaurant_id = cart
+
+    segment = mock_service._get_segment(user_id)
+    if not segment:
+        return 404, USER_SEGMENT_NOT_FOUND_BODY
+
+    offer = mock_service.offers_db.lookup(restaurant_id, segment)
+    if offer is not None and offer.choices is not None:
+        offer = offer.choices[bisect_right(offer.thresholds, cart_value)]
+    if offer is not None:
+        cart_value = mock_service.discounts[offer.type_code](cart_value, offer.value, offer.max_discount)
+    return 200, encode_cart_value(cart_value) or {"cart_value": cart_value}
+
+
+async def get_user_segment(body: bytes, headers: Dict[bytes, bytes], query: bytes) -> Response:
+    """Get user segment."""
+    params, error = validate_user_id_param(dict(parse_qsl(query.decode('latin-1'))))
+    if error:
+        return error[1], {"error": error[0]}
+    user_id = params[0]
+    segment = mock_service._get_segment(user_id)
+    if not segment:
+        return 404, {"error": "User segment not found"}
+    return 200, {"segment": segment}, mock_service._segment_etag(segment)
+
+
+async def get_offers(body: bytes, headers: Dict[bytes, bytes], query: bytes) -> Response:
+    """Get the offers a restaurant has for each customer segment."""
+    params, error = validate_restaurant_id_param(dict(parse_qsl(query.decode('latin-1'))))
+    if error:
+        return error[1], {"error": error[0]}
+    restaurant_id = params[0]
+    versioned = mock_service.offers_db.get_versioned_offers(restaurant_id)
+    if versioned is None:
+        return 404, {"error": "No offers found"}
+    row_version, offers = versioned
+    return 200, {"restaurant_id": restaurant_id, "offers": offers}, mock_service._offers_etag(row_version)
+
+
+async def set_user_segment(body: bytes, headers: Dict[bytes, bytes], query: bytes) -> Response:
+    """Set user segment."""
+    data = _json_body(body, headers)
+    user_segment, error = validate_user_segment(data)
+    if error:
+        return error[1], {"error": error[0]}
+    user_id, segment = user_segment
+    await _commit({"op": "segments", "rows": [[user_id, segment]]})
+    return 200, SUCCESS_BODY
+
+
+async def health(body: bytes, headers: Dict[bytes, bytes], query: bytes) -> Response:
+    """Health check endpoint."""
+    return 200, HEALTHY_BODY
+
+
+Handler = Callable[[bytes, Dict[bytes, bytes], bytes], Awaitable[Response]]
+
+# Structure: {path: {method: handler}}
+ROUTES: Dict[str, Dict[str, Handler]] = {
+    '/api/v1/offer': {'GET': get_offers, 'POST': add_offer},
+    '/api/v1/cart/apply_offer': {'POST': apply_offer},
+    '/api/v1/user_segment': {'GET': get_user_segment, 'POST': set_user_segment},
+    '/health': {'GET': health},
+}
+
+
+async def _read_body(receive) -> bytes:
+    """Collect the request body from ASGI http.request messages."""
+    chunks: List[bytes] = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def app(scope, receive, send) -> None:
+    """ASGI 3 application."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    methods = ROUTES.get(scope['path'])
+    etag = None
+    if methods is None:
+        status, body = 404, {"error": "Not found"}
+    elif scope['method'] not in methods:
+        status, body = 405, {"error": "Method not allowed"}
+    else:
+        request_body = await _read_body(receive)
+        headers = dict(scope['headers'])
+        try:
+            status, body, *etag_value = await methods[scope['method']](
+                request_body, headers, scope.get('query_string', b''))
+            etag = etag_value[0] if etag_value else None
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+
+    if etag is None:
+        await send({'type': 'http.response.start', 'status': status, 'headers': _JSON_HEADERS})
+        await send({'type': 'http.response.body', 'body': body if type(body) is bytes else encode_body(body)})
+        return
+    etag_header = (b'etag', f'"{etag}"'.encode('latin-1'))
+    if _etag_matches(headers.get(b'if-none-match', b''), etag):
+        await send({'type': 'http.response.start', 'status': 304, 'headers': [etag_header]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    await send({'type': 'http.response.start', 'status': status, 'headers': _JSON_HEADERS + [etag_header]})
+    await send({'type': 'http.response.body', 'body': encode_body(body)})
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, asgi_app) -> None:
+    """Serve HTTP/1.1 requests from one connection until it closes."""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.LimitOverrunError:
+                return
+            except asyncio.IncompleteReadError:
+                return
+            lines = head[:-4].split(b'\r\n')
+            try:
+                method, target, version = lines[0].split(b' ', 2)
+            except ValueError:
+                return
+            headers: List[Tuple[bytes, bytes]] = []
+            for line in lines[1:]:
+                name, _, value = line.partition(b':')
+                headers.append((name.strip().lower(), value.strip()))
+            header_map = dict(headers)
+            keep_alive = (version == b'HTTP/1.1' and header_map.get(b'connection', b'').lower() != b'close') \
+                or header_map.get(b'connection', b'').lower() == b'keep-alive'
+
+            if b'chunked' in header_map.get(b'transfer-encoding', b'').lower():
+                await _write_response(writer, 501, _JSON_HEADERS,
+                                      encode_body({"error": "Chunked request bodies are not supported"}), False)
+                return
+            try:
+                length = int(header_map.get(b'content-length', b'0') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                await _write_response(writer, 400, _JSON_HEADERS, encode_body({"error": "Invalid Content-Length"}), False)
+                return
+            if length > MAX_BODY_BYTES:
+                await _write_response(writer, 413, _JSON_HEADERS, encode_body({"error": "Request body too large"}), False)
+                return
+            body = await reader.readexactly(length) if length else b''
+
+            path, _, query = target.partition(b'?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': version[5:].decode('latin-1'),
+                'method': method.decode('latin-1'),
+                'path': path.decode('latin-1'),
+                'raw_path': path,
+                'query_string': query,
+                'headers': headers,
+                'client': writer.get_extra_info('peername'),
+                'server': writer.get_extra_info('sockname'),
+            }
+            received = False
+
+            async def receive():
+                nonlocal received
+                if received:
+                    return {'type': 'http.disconnect'}
+                received = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            response: Dict[str, Any] = {}
+            chunks: List[bytes] = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response.update(message)
+                elif message['type'] == 'http.response.body':
+                    chunks.append(message.get('body', b''))
+
+            await asgi_app(scope, receive, send)
+            await _write_response(writer, response['status'], response.get('headers', []),
+                                  b''.join(chunks), keep_alive)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _write_response(
+    writer: asyncio.StreamWriter,
+    status: int,
+    headers: List[Tuple[bytes, bytes]],
+    body: bytes,
+    keep_alive: bool
+) -> None:
+    head = [b'HTTP/1.1 %d %s' % (status, _REASONS.get(status, b'')),
+            b'content-length: %d' % len(body)]
+    head.extend(name + b': ' + value for name, value in headers)
+    if not keep_alive:
+        head.append(b'connection: close')
+    writer.write(b'\r\n'.join(head) + b'\r\n\r\n' + body)
+    await writer.drain()
+
+
+async def serve(host: str = '0.0.0.0', port: int = 5001, asgi_app=app, started: Optional[Callable] = None) -> None:
+    """
+    Serve an ASGI app with the built-in HTTP/1.1 server until cancelled.
+
+    Args:
+        host: Interface to listen on
+        port: Port to listen on (0 picks a free port)
+        asgi_app: ASGI application to serve
+        started: Called with the asyncio server once it is listening
+    """
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(reader, writer, asgi_app),
+        host, port, limit=MAX_HEADER_BYTES, backlog=4096
+    )
+    if started is not None:
+        started(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the asyncio implementation of the mock service.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args(argv)
+
+    mock_service.configure_from_env()
+    print(f"listening on {args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock_service.disable_persistence()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
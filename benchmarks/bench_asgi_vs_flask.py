@@ -0,0 +1,126 @@
+"""
+Compare the Flask and asyncio (ASGI) services at high connection counts.
+
+Starts each service in its own process, seeds one offer and one user
+segment, then sends apply_offer requests from --connections concurrent clients,
+over keep-alive connections where the server supports them, for --seconds. Reports
+throughput and latency percentiles for each service.
+
+Usage:
+    python3 benchmarks/bench_asgi_vs_flask.py [--connections 1000] [--seconds 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds to wait for a connection or a response before counting it as failed
+TIMEOUT = 10.0
+
+SERVERS = {
+    'flask': "import mock_service; mock_service.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'asgi': "import sys, asgi_service; sys.exit(asgi_service.main(['--host', '127.0.0.1', '--port', '{port}']))",
+}
+
+BODY = json.dumps({"cart_value": 200, "user_id": 1, "restaurant_id": 1}).encode()
+REQUEST = (b'POST /api/v1/cart/apply_offer HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n'
+           b'Content-Length: %d\r\n\r\n%s' % (len(BODY), BODY))
+
+
+def post(port: int, path: str, body: dict) -> None:
+    request = urllib.request.Request(f'http://127.0.0.1:{port}{path}', json.dumps(body).encode(),
+                                     {'Content-Type': 'application/json'})
+    urllib.request.urlopen(request).read()
+
+
+def wait_ready(port: int) -> None:
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health').read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+async def connection(port: int, deadline: float, latencies: list) -> None:
+    """
+    Send requests on one connection until the deadline.
+
+    The connection is kept alive unless the server closes it (the Flask
+    development server closes after every response), in which case the
+    next request reconnects and the reconnect counts towards its latency.
+    """
+    writer = None
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), TIMEOUT)
+            writer.write(REQUEST)
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), TIMEOUT)
+            headers = dict(line.lower().split(b':', 1) for line in head.split(b'\r\n')[1:] if b':' in line)
+            await reader.readexactly(int(headers[b'content-length']))
+            latencies.append(time.perf_counter() - start)
+            if headers.get(b'connection', b'').strip() == b'close':
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def load(port: int, connections: int, seconds: float) -> list:
+    latencies: list = []
+    deadline = time.monotonic() + seconds
+    results = await asyncio.gather(*(connection(port, deadline, latencies) for _ in range(connections)),
+                                   return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        print(f"  {len(errors)} connections failed, e.g. {errors[0]!r}")
+    return latencies
+
+
+def run(name: str, port: int, connections: int, seconds: float) -> None:
+    server = subprocess.Popen([sys.executable, '-c', SERVERS[name].format(port=port)], cwd=ROOT,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        post(port, '/api/v1/offer', {"restaurant_id": 1, "offer_type": "FLATX", "offer_value": 10,
+                                     "customer_segment": ["p1"]})
+        post(port, '/api/v1/user_segment', {"user_id": 1, "segment": "p1"})
+        latencies = sorted(asyncio.run(load(port, connections, seconds)))
+        if not latencies:
+            print(f"{name:>5}: no requests completed")
+            return
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        print(f"{name:>5}: {len(latencies) / seconds:>8.0f} req/s   p50 {percentile(0.5):7.1f} ms   "
+              f"p99 {percentile(0.99):7.1f} ms   ({connections} connections)")
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--port', type=int, default=5101)
+    args = parser.parse_args()
+
+    for offset, name in enumerate(SERVERS):
+        run(name, args.port + offset, args.connections, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
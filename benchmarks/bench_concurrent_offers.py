@@ -0,0 +1,109 @@
+"""
+Measure apply-path lookups while offer updates stream in.
+
+Runs a reader thread doing OfferTable lookups, first with no writer and then
+with a writer thread continuously re-publishing multi-segment offers. Reports
+apply-path lookup latency percentiles and the number of torn reads (a restaurant whose
+segments disagree mid-update), alongside the same workload on the original
+nested dicts mutated in place.
+
+Usage:
+    python3 benchmarks/bench_concurrent_offers.py [--restaurants 10000] [--seconds 2]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from offer_store import OfferTable  # noqa: E402
+
+SEGMENTS = ('p1', 'p2', 'p3')
+
+
+class NestedDicts:
+    """The original offers_db layout, updated in place segment by segment."""
+
+    def __init__(self):
+        self.offers_db = {}
+
+    def set_offer(self, restaurant_id, segments, offer_type, offer_value):
+        if restaurant_id not in self.offers_db:
+            self.offers_db[restaurant_id] = {}
+        for segment in segments:
+            self.offers_db[restaurant_id][segment] = {'offer_type': offer_type, 'offer_value': offer_value}
+
+    def lookup(self, restaurant_id, segment):
+        return self.offers_db.get(restaurant_id, {}).get(segment)
+
+    def get_offers(self, restaurant_id):
+        return dict(self.offers_db.get(restaurant_id, {}))
+
+
+def percentile(samples, fraction):
+    """Value at the given fraction of the sorted samples."""
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(store, restaurants: int, seconds: float, with_writer: bool):
+    """Run readers (and optionally a writer) and return latencies, torn reads, writes."""
+    for restaurant_id in range(restaurants):
+        store.set_offer(restaurant_id, SEGMENTS, 'FLATX', 0.0)
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        rng = random.Random(7)
+        value = 0.0
+        while not stop.is_set():
+            value += 1
+            store.set_offer(rng.randrange(restaurants), SEGMENTS, 'FLATX', value)
+            writes[0] += 1
+
+    latencies = []
+    torn = [0]
+
+    def reader():
+        rng = random.Random()
+        clock = time.perf_counter_ns
+        while not stop.is_set():
+            restaurant_id = rng.randrange(restaurants)
+            start = clock()
+            store.lookup(restaurant_id, 'p2')
+            latencies.append(clock() - start)
+            offers = store.get_offers(restaurant_id)
+            if len({offer['offer_value'] for offer in offers.values()}) != 1:
+                torn[0] += 1
+
+    threads = [threading.Thread(target=reader)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return latencies, torn[0], writes[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{'store':<14}{'writer':>8}{'p50 ns':>10}{'p99 ns':>10}{'torn reads':>12}{'writes':>10}")
+    for name, factory in (('nested dicts', NestedDicts), ('OfferTable', OfferTable)):
+        for with_writer in (False, True):
+            latencies, torn, writes = run(factory(), args.restaurants, args.seconds, with_writer)
+            print(f"{name:<14}{'yes' if with_writer else 'no':>8}"
+                  f"{percentile(latencies, 0.5):>10}{percentile(latencies, 0.99):>10}{torn:>12}{writes:>10}")
+
+
+if __name__ == '__main__':
+    main()
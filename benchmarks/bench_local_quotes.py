@@ -0,0 +1,91 @@
+"""
+Compare CartAPI price quotes over HTTP with local evaluation.
+
+Starts the Flask service in a background thread, loads offers for
+--restaurants restaurants and segments for --users users, then times
+CartAPI.quote() with local evaluation disabled (one HTTP round trip per
+quote) and enabled (local replicas, refreshed on demand). Also reports how
+long the initial snapshot sync and an incremental refresh take.
+
+Usage:
+    python3 benchmarks/bench_local_quotes.py [--restaurants 10000] [--users 100000] [--port 5055]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_service  # noqa: E402
+from api.cart_api import CartAPI  # noqa: E402
+
+SEGMENTS = ('p1', 'p2', 'p3')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--restaurants', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    rng = random.Random(1)
+    mock_service.offers_db.set_offers(
+        (restaurant_id, rng.choice(('FLATX', 'FLAT%')), rng.randrange(1, 50), rng.sample(SEGMENTS, 2))
+        for restaurant_id in range(args.restaurants)
+    )
+    mock_service.apply_record({"op": "segments", "rows": [
+        [user_id, rng.choice(SEGMENTS)] for user_id in range(args.users)
+    ]})
+    threading.Thread(
+        target=mock_service.app.run, kwargs={'port': args.port, 'threaded': True}, daemon=True
+    ).start()
+    client = CartAPI(f'http://localhost:{args.port}')
+    for _ in range(50):
+        try:
+            client.health_check()
+            break
+        except Exception:
+            time.sleep(0.1)
+
+    carts = [(round(rng.uniform(0, 2000), 2), rng.randrange(args.users), rng.randrange(args.restaurants))
+             for _ in range(1000)]
+
+    def quote_all():
+        for cart_value, user_id, restaurant_id in carts:
+            client.quote(cart_value, user_id, restaurant_id)
+
+    http = min(timeit.repeat(quote_all, number=1, repeat=3)) / len(carts)
+
+    start = time.perf_counter()
+    client.enable_local_evaluation()
+    snapshot_sync = time.perf_counter() - start
+    local = min(timeit.repeat(quote_all, number=200, repeat=5)) / (200 * len(carts))
+    mismatches = sum(
+        client.quote(*cart) != client._post_apply_offer(*cart)['data']['cart_value'] for cart in carts[:200]
+    )
+
+    mock_service.offers_db.set_offers(
+        (rng.randrange(args.restaurants), 'FLAT%', 10.0, SEGMENTS) for _ in range(100)
+    )
+    start = time.perf_counter()
+    result = client.refresh_local()
+    refresh = time.perf_counter() - start
+
+    print(f"HTTP quote:              {http * 1e6:10.1f} us")
+    print(f"local quote:             {local * 1e6:10.3f} us ({http / local:,.0f}x faster)")
+    print(f"local vs HTTP mismatches: {mismatches} of 200")
+    print(f"initial snapshot sync:   {snapshot_sync * 1e3:10.1f} ms "
+          f"({args.restaurants:,} restaurants, {args.users:,} users)")
+    print(f"refresh after 100 writes:{refresh * 1e3:10.1f} ms "
+          f"({result['data']['offers']['changes']} restaurants changed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure the cost of recording request metrics.
+
+Times (a) recording one request with RequestMetrics.start/finish, (b) full
+WSGI requests to apply_offer through the Flask app with and without the
+metrics middleware, and (c) rendering /metrics after many threads have
+recorded requests on many routes. No network is involved; each request is a direct
+WSGI call.
+
+Usage:
+    python3 benchmarks/bench_metrics.py [--iterations 20000] [--threads 8] [--routes 20]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_service  # noqa: E402
+from metrics import RequestMetrics  # noqa: E402
+from mock_service import app  # noqa: E402
+
+
+def wsgi_call(method: str, path: str, body: bytes = b'') -> bytes:
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'bench',
+        'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.multithread': False, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    return b''.join(app(environ, lambda status, headers, exc_info=None: None))
+
+
+def per_call_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--routes', type=int, default=20)
+    args = parser.parse_args()
+
+    recorder = RequestMetrics()
+    route = ('POST', '/api/v1/cart/apply_offer')
+    record_us = per_call_us(lambda: recorder.finish(route, 200, recorder.start(route)), args.iterations * 10)
+    print(f"start + finish:                {record_us * 1000:8.0f} ns/request")
+
+    mock_service.offers_db.set_offer(1, ['p1'], 'FLAT%', 12.5)
+    mock_service.user_segments_db[1] = 'p1'
+    cart = json.dumps({"cart_value": 100.5, "user_id": 1, "restaurant_id": 1}).encode()
+
+    def call():
+        return wsgi_call('POST', '/api/v1/cart/apply_offer', cart)
+
+    # Alternate short runs with and without the middleware, so load changes
+    # on the machine affect both
+    middleware = app.wsgi_app
+    with_metrics = without_metrics = float('inf')
+    for _ in range(20):
+        app.wsgi_app = middleware.wsgi_app
+        without_metrics = min(without_metrics, per_call_us(call, args.iterations // 20))
+        app.wsgi_app = middleware
+        with_metrics = min(with_metrics, per_call_us(call, args.iterations // 20))
+    print(f"apply_offer without metrics:   {without_metrics:8.2f} us/request")
+    print(f"apply_offer with metrics:      {with_metrics:8.2f} us/request "
+          f"(+{with_metrics - without_metrics:.2f} us, {(with_metrics - without_metrics) / without_metrics:.1%})")
+
+    # Threads that stay alive keep their own shards until the scrape
+    recorder = RequestMetrics()
+    routes = [('GET', f'/route/{index}') for index in range(args.routes)]
+    recorded = threading.Barrier(args.threads + 1)
+    scraped = threading.Event()
+
+    def worker():
+        for index in range(args.iterations):
+            shard_route = routes[index % len(routes)]
+            recorder.finish(shard_route, 200, recorder.start(shard_route))
+        recorded.wait()
+        scraped.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    recorded.wait()
+    render_ms = min(timeit.repeat(recorder.render, number=1, repeat=5)) * 1000
+    print(f"render, {args.threads} threads x {args.routes} routes: {render_ms:8.2f} ms per scrape")
+    scraped.set()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()
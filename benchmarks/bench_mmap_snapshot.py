@@ -0,0 +1,104 @@
+"""
+Measure startup time and memory of memory-mapped snapshots.
+
+Builds a state of offers and user segments, then compares bringing it up
+(a) by recovering the NDJSON snapshot written by persistence.py and (b) by
+mapping the binary snapshot from mmap_snapshot.py. Also reports lookup
+latency against the mapped snapshot and the private memory each of several
+worker processes uses after mapping the same file.
+
+Usage:
+    python3 benchmarks/bench_mmap_snapshot.py [--offers 100000] [--users 1000000] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_service  # noqa: E402
+from mmap_snapshot import MappedSnapshot, write_snapshot  # noqa: E402
+from offer_store import OfferTable  # noqa: E402
+from segment_store import SEGMENTS  # noqa: E402
+
+LOOKUPS = 200000
+
+
+def private_kib() -> int:
+    """Private (unshared) memory of this process, in KiB (Linux only)."""
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean', 'Private_Dirty')):
+                total += int(line.split()[1])
+    return total
+
+
+def worker(path: str, users: int, queue) -> None:
+    """Map the snapshot, touch every page through lookups, report private memory."""
+    before = private_kib()
+    snapshot = MappedSnapshot(path)
+    for user_id in range(0, users, 512):
+        snapshot.get_code(user_id)
+    queue.put(private_kib() - before)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--offers', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    table = OfferTable()
+    table.set_offers((rid, 'FLATX', 10.0, ['p1', 'p2']) for rid in range(1, args.offers + 1))
+    segments = {uid: SEGMENTS[uid % 3 + 1] for uid in range(1, args.users + 1)}
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        mock_service.enable_persistence(data_dir, snapshot_interval=0)
+        mock_service.offers_db.set_offers((rid, 'FLATX', 10.0, ['p1', 'p2']) for rid in range(1, args.offers + 1))
+        mock_service.user_segments_db.update(segments)
+        mock_service.persistence.snapshot()
+        mock_service.disable_persistence()
+        mock_service.offers_db.clear()
+        mock_service.user_segments_db.clear()
+        stats = mock_service.enable_persistence(data_dir, snapshot_interval=0)
+        mock_service.disable_persistence()
+        mock_service.offers_db.clear()
+        mock_service.user_segments_db.clear()
+        print(f"NDJSON snapshot recovery:  {stats['total_seconds'] * 1000:8.1f} ms")
+
+        path = os.path.join(data_dir, 'state.snap')
+        start = time.perf_counter()
+        write_snapshot(path, table.items(), segments.items())
+        print(f"binary snapshot written:   {(time.perf_counter() - start) * 1000:8.1f} ms "
+              f"({os.path.getsize(path) / 1024 / 1024:.1f} MiB)")
+
+        start = time.perf_counter()
+        snapshot = MappedSnapshot(path)
+        print(f"binary snapshot mapped:    {(time.perf_counter() - start) * 1000:8.3f} ms")
+
+        user_ids = [uid * 7919 % args.users + 1 for uid in range(LOOKUPS)]
+        rids = [uid % args.offers + 1 for uid in user_ids]
+        start = time.perf_counter()
+        for user_id, rid in zip(user_ids, rids):
+            snapshot.lookup(rid, snapshot.get(user_id) or 'p1')
+        print(f"mapped segment + offer:    {(time.perf_counter() - start) / LOOKUPS * 1e9:8.0f} ns/lookup")
+
+        if os.path.exists('/proc/self/smaps_rollup'):
+            queue = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=worker, args=(path, args.users, queue))
+                         for _ in range(args.workers)]
+            for process in processes:
+                process.start()
+            private = [queue.get() for _ in processes]
+            for process in processes:
+                process.join()
+            print(f"private memory per worker: {max(private):8d} KiB (file is shared through the page cache)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare the OfferTable layout against the original nested-dict offers_db.
+
+Measures memory per restaurant (tracemalloc) and the latency of the apply
+path: look up the offer for (restaurant, segment) and compute the discount.
+
+Usage:
+    python3 benchmarks/bench_offer_table.py [--restaurants 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from offer_store import OfferTable  # noqa: E402
+from pricing import DISCOUNTS  # noqa: E402
+
+SEGMENTS = ('p1', 'p2', 'p3')
+
+
+def build_nested(restaurants: int) -> dict:
+    """Build offers in the original {restaurant_id: {segment: {...}}} layout."""
+    offers_db = {}
+    for restaurant_id in range(1, restaurants + 1):
+        offer_type = 'FLATX' if restaurant_id % 2 else 'FLAT%'
+        offers_db[restaurant_id] = {}
+        for segment in SEGMENTS:
+            offers_db[restaurant_id][segment] = {
+                'offer_type': offer_type,
+                'offer_value': float(restaurant_id % 50 + 1)
+            }
+    return offers_db
+
+
+def build_table(restaurants: int) -> OfferTable:
+    """Build the same offers in an OfferTable."""
+    table = OfferTable()
+    for restaurant_id in range(1, restaurants + 1):
+        offer_type = 'FLATX' if restaurant_id % 2 else 'FLAT%'
+        table.set_offer(restaurant_id, SEGMENTS, offer_type, float(restaurant_id % 50 + 1))
+    return table
+
+
+def apply_nested(offers_db: dict, restaurant_id: int, segment: str, cart_value: float) -> float:
+    """The original apply_offer lookup and string-compared discount branch."""
+    if restaurant_id not in offers_db:
+        return cart_value
+    restaurant_offers = offers_db[restaurant_id]
+    if segment not in restaurant_offers:
+        return cart_value
+    offer = restaurant_offers[segment]
+    offer_type = offer['offer_type']
+    offer_value = offer['offer_value']
+    if offer_type == 'FLATX':
+        final_cart_value = max(0, cart_value - offer_value)
+    elif offer_type == 'FLAT%':
+        discount_amount = (cart_value * offer_value) / 100
+        final_cart_value = max(0, cart_value - discount_amount)
+    return round(final_cart_value, 2)
+
+
+def apply_table(table: OfferTable, restaurant_id: int, segment: str, cart_value: float) -> float:
+    """The OfferTable lookup and code-indexed discount dispatch."""
+    offer = table.lookup(restaurant_id, segment)
+    if offer is None:
+        return cart_value
+    return DISCOUNTS[offer.type_code](cart_value, offer.value)
+
+
+def measure_memory(build, restaurants: int) -> float:
+    """Bytes allocated per restaurant by build()."""
+    tracemalloc.start()
+    store = build(restaurants)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    return current / restaurants
+
+
+def measure_latency(apply, store, restaurants: int, lookups: int = 200000) -> float:
+    """Mean nanoseconds per apply call over random (restaurant, segment) pairs."""
+    rng = random.Random(42)
+    queries = [(rng.randint(1, restaurants), rng.choice(SEGMENTS), 200.0) for _ in range(lookups)]
+
+    def run():
+        for restaurant_id, segment, cart_value in queries:
+            apply(store, restaurant_id, segment, cart_value)
+
+    best = min(timeit.repeat(run, number=1, repeat=9))
+    return best / lookups * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--restaurants', type=int, default=100000)
+    args = parser.parse_args()
+
+    nested = build_nested(args.restaurants)
+    table = build_table(args.restaurants)
+    for restaurant_id in range(1, args.restaurants + 1, 997):
+        for segment in SEGMENTS:
+            assert apply_nested(nested, restaurant_id, segment, 123.45) == \
+                apply_table(table, restaurant_id, segment, 123.45)
+
+    print(f"{args.restaurants} restaurants, offers for {len(SEGMENTS)} segments each")
+    print(f"{'layout':<14}{'bytes/restaurant':>18}{'ns/apply':>12}")
+    for name, build, apply, store in (('nested dicts', build_nested, apply_nested, nested),
+                                      ('OfferTable', build_table, apply_table, table)):
+        memory = measure_memory(build, args.restaurants)
+        latency = measure_latency(apply, store, args.restaurants)
+        print(f"{name:<14}{memory:>18.0f}{latency:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
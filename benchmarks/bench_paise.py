@@ -0,0 +1,57 @@
+"""
+Compare the float and integer-paise pricing engines.
+
+Times FLAT% over --carts random cart values: the float batch function from
+pricing, the paise batch over array('q') of paise, the paise table the
+service uses (rupees in and out), and single-cart calls of both engines.
+Also counts carts whose results differ (by one paisa, at half-paisa ties).
+
+Usage:
+    python3 benchmarks/bench_paise.py [--carts 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import paise  # noqa: E402
+from pricing import BATCH_DISCOUNTS, DISCOUNTS, FLAT_PERCENT_CODE  # noqa: E402
+
+OFFER_VALUE = 12.5
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--carts', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    cart_values = [round(rng.uniform(0, 2000), 2) for _ in range(args.carts)]
+    cart_paise = array('q', [paise.to_paise(value) for value in cart_values])
+    basis_points = paise.to_basis_points(OFFER_VALUE)
+    discounts, batch_discounts = paise.discount_tables('paise')
+    float_single, paise_single = DISCOUNTS[FLAT_PERCENT_CODE], discounts[FLAT_PERCENT_CODE]
+
+    cases = (
+        ('float batch', lambda: BATCH_DISCOUNTS[FLAT_PERCENT_CODE](cart_values, OFFER_VALUE)),
+        ('paise array batch', lambda: paise.flat_percent_batch(cart_paise, basis_points)),
+        ('paise rupee batch', lambda: batch_discounts[FLAT_PERCENT_CODE](cart_values, OFFER_VALUE)),
+        ('float single', lambda: [float_single(value, OFFER_VALUE) for value in cart_values]),
+        ('paise single', lambda: [paise_single(value, OFFER_VALUE) for value in cart_values]),
+    )
+    print(f"{args.carts} carts, FLAT% {OFFER_VALUE}")
+    print(f"{'engine':<20}{'ns/cart':>10}")
+    for name, run in cases:
+        best = min(timeit.repeat(run, number=1, repeat=7))
+        print(f"{name:<20}{best / args.carts * 1e9:>10.0f}")
+
+    differing = sum(float_single(value, OFFER_VALUE) != paise_single(value, OFFER_VALUE) for value in cart_values)
+    print(f"results differing by a paisa: {differing} of {args.carts}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Measure apply_offer throughput of the pre-forking server by worker count.
+
+Starts prefork.py with 1, 2, 4, ... workers, seeds one offer and one user
+segment, then drives apply_offer from several client processes over
+keep-alive connections and reports requests per second.
+
+Usage:
+    python3 benchmarks/bench_prefork.py [--workers 1 2 4] [--clients 8] [--seconds 5]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BODY = json.dumps({"cart_value": 200, "user_id": 1, "restaurant_id": 1})
+
+
+def client(port: int, seconds: float, queue) -> None:
+    """Send apply_offer requests on one connection until time is up."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Content-Type': 'application/json'}
+    count = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        connection.request('POST', '/api/v1/cart/apply_offer', BODY, headers)
+        connection.getresponse().read()
+        count += 1
+    queue.put(count)
+
+
+def run(workers: int, clients: int, seconds: float) -> float:
+    server = subprocess.Popen(
+        [sys.executable, '-u', 'prefork.py', '--workers', str(workers), '--host', '127.0.0.1', '--port', '0'],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        port = int(server.stdout.readline().split()[2].rsplit(':', 1)[1])
+        for _ in range(workers):
+            server.stdout.readline()
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        for path, body in (('/api/v1/offer', {"restaurant_id": 1, "offer_type": "FLATX", "offer_value": 10,
+                                              "customer_segment": ["p1"]}),
+                           ('/api/v1/user_segment', {"user_id": 1, "segment": "p1"})):
+            connection.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+            connection.getresponse().read()
+
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=client, args=(port, seconds, queue)) for _ in range(clients)]
+        for process in processes:
+            process.start()
+        total = sum(queue.get() for _ in processes)
+        for process in processes:
+            process.join()
+        return total / seconds
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        rate = run(workers, args.clients, args.seconds)
+        print(f"{workers:>3} workers: {rate:>8.0f} apply_offer requests/s")
+
+
+if __name__ == '__main__':
+    main()
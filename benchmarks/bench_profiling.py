@@ -0,0 +1,74 @@
+"""
+Measure the cost of request profiling.
+
+Times full WSGI requests to apply_offer through the Flask app (a) with
+profiling disabled, (b) with profiling enabled for X-Profile requests only,
+sending requests without the header, and (c) with every request profiled.
+Then prints the heaviest stacks recorded. No network is involved; each
+request is a direct WSGI call.
+
+Usage:
+    python3 benchmarks/bench_profiling.py [--iterations 20000]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_service  # noqa: E402
+from mock_service import app  # noqa: E402
+
+
+def wsgi_call(method: str, path: str, body: bytes = b'') -> bytes:
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'bench',
+        'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.multithread': False, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    return b''.join(app(environ, lambda status, headers, exc_info=None: None))
+
+
+def per_call_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    mock_service.offers_db.set_offer(1, ['p1'], 'FLAT%', 12.5)
+    mock_service.user_segments_db[1] = 'p1'
+    cart = json.dumps({"cart_value": 100.5, "user_id": 1, "restaurant_id": 1}).encode()
+
+    def call():
+        return wsgi_call('POST', '/api/v1/cart/apply_offer', cart)
+
+    # Alternate short runs, so load changes on the machine affect every mode
+    disabled = header_only = float('inf')
+    for _ in range(20):
+        mock_service.disable_profiling()
+        disabled = min(disabled, per_call_us(call, args.iterations // 20))
+        mock_service.enable_profiling(sample_rate=0.0, allow_header=True)
+        header_only = min(header_only, per_call_us(call, args.iterations // 20))
+    profiler = mock_service.enable_profiling(sample_rate=1.0)
+    profiled = per_call_us(call, max(1, args.iterations // 20))
+    mock_service.disable_profiling()
+
+    print(f"profiling disabled:            {disabled:8.2f} us/request")
+    print(f"enabled, request not selected: {header_only:8.2f} us/request (+{header_only - disabled:.2f} us)")
+    print(f"enabled, request profiled:     {profiled:8.2f} us/request")
+    print(f"\nheaviest stacks over {profiler.requests} profiled requests (us):")
+    stacks = [line.rsplit(' ', 1) for line in profiler.collapsed().splitlines()]
+    for stack, microseconds in sorted(stacks, key=lambda item: -int(item[1]))[:5]:
+        print(f"{int(microseconds):10d}  ...{stack[-100:]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measure the cost of rate-limiting decisions.
+
+Times RateLimiter.admit for a client within budget, a client being shed,
+an exempt route and an unlimited one, a new client when the table is full
+and no bucket has refilled, and a whole pass through RateLimitMiddleware
+for a shed request, over --clients clients.
+
+Usage:
+    python3 benchmarks/bench_rate_limit.py [--clients 10000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import RateLimiter, RateLimitMiddleware  # noqa: E402
+
+ROUTE = '/api/v1/cart/apply_offer'
+NUMBER = 200000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=10000)
+    args = parser.parse_args()
+
+    clients = [f'10.0.{index // 256}.{index % 256}' for index in range(args.clients)]
+    admitting = RateLimiter(routes={ROUTE: (1e9, 1e9)})
+    shedding = RateLimiter(routes={ROUTE: (1e-9, 1)}, max_clients=args.clients)
+    for client in clients:
+        admitting.admit(client, ROUTE)
+        shedding.admit(client, ROUTE)
+    middleware = RateLimitMiddleware(lambda environ, start_response: [], shedding)
+    environ = {'REMOTE_ADDR': clients[-1], 'PATH_INFO': ROUTE, 'REQUEST_METHOD': 'POST'}
+
+    def start_response(status, headers, exc_info=None):
+        return None
+
+    client = clients[len(clients) // 2]
+    new_clients = (f'spoofed-{index}' for index in range(10 ** 9))
+    cases = (
+        ('admit (within budget)', lambda: admitting.admit(client, ROUTE)),
+        ('admit (shed)', lambda: shedding.admit(client, ROUTE)),
+        ('admit (exempt route)', lambda: admitting.admit(client, '/health')),
+        ('admit (unlimited route)', lambda: admitting.admit(client, '/api/v1/offer')),
+        ('admit (new client, full)', lambda: shedding.admit(next(new_clients), ROUTE)),
+        ('middleware (shed, 429)', lambda: middleware(environ, start_response)),
+    )
+    print(f"{args.clients} clients")
+    print(f"{'case':<26}{'ns/request':>12}")
+    for name, run in cases:
+        best = min(timeit.repeat(run, number=NUMBER, repeat=5))
+        print(f"{name:<26}{best / NUMBER * 1e9:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Measure hot reloads of offers and user segments.
+
+Writes a file of --offers restaurants and --users user segments in the
+snapshot format, then reloads it into a running state while reader threads
+look up offers and a writer thread commits an offer every millisecond.
+Reports the build time and swap pause from reload_data, and the slowest
+lookup and commit seen during the reload compared with before it.
+
+Usage:
+    python3 benchmarks/bench_reload.py [--offers 100000] [--users 1000000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_service  # noqa: E402
+
+CHUNK = 1000
+READERS = 2
+# Seconds between the writer's commits
+WRITE_PAUSE = 0.001
+
+
+def write_file(path: str, offers: int, users: int) -> None:
+    """Write offer and segment records, one per line."""
+    with open(path, 'w') as f:
+        for start in range(1, offers + 1, CHUNK):
+            rows = [[rid, 'FLAT%', 10.0, ['p1', 'p2']] for rid in range(start, min(start + CHUNK, offers + 1))]
+            f.write(json.dumps({"op": "offers", "rows": rows}) + '\n')
+        for start in range(1, users + 1, CHUNK):
+            rows = [[uid, 'p%d' % (uid % 3 + 1)] for uid in range(start, min(start + CHUNK, users + 1))]
+            f.write(json.dumps({"op": "segments", "rows": rows}) + '\n')
+
+
+def slowest(operation, stop: threading.Event, results: list, pause: float = 0.0) -> None:
+    """Run operation until stop is set, pause seconds apart, and record the slowest call in seconds."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        operation()
+        worst = max(worst, time.perf_counter() - start)
+        if pause:
+            time.sleep(pause)
+    results.append(worst)
+
+
+def measure(offers: int, reload_path=None) -> tuple:
+    """Slowest lookup and commit while reloading reload_path (or for 1 s without a reload)."""
+    stop = threading.Event()
+    lookups: list = []
+    commits: list = []
+    threads = [
+        threading.Thread(target=slowest, args=(lambda: mock_service.offers_db.lookup(offers // 2, 'p1'), stop, lookups))
+        for _ in range(READERS)
+    ]
+    threads.append(threading.Thread(target=slowest, args=(
+        lambda: mock_service._commit({"op": "offers", "rows": [[offers + 1, 'FLATX', 5.0, ['p3']]]}), stop, commits,
+        WRITE_PAUSE
+    )))
+    for thread in threads:
+        thread.start()
+    report = None
+    if reload_path is None:
+        time.sleep(1)
+    else:
+        report = mock_service.reload_data(reload_path)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return report, max(lookups), max(commits)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--offers', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'data.ndjson')
+        write_file(path, args.offers, args.users)
+        # Start from the same data, so lookups hit before and after the swap
+        mock_service.reload_data(path)
+
+        _, lookup_before, commit_before = measure(args.offers)
+        report, lookup_during, commit_during = measure(args.offers, path)
+
+    print(f"{args.offers} restaurants, {args.users} users, {report['records']} records")
+    print(f"build:       {report['build_seconds'] * 1e3:10.1f} ms")
+    print(f"swap pause:  {report['swap_pause_seconds'] * 1e3:10.3f} ms ({report['replayed_writes']} writes replayed)")
+    print(f"{'':<20}{'before':>12}{'during':>12}")
+    print(f"{'slowest lookup ms':<20}{lookup_before * 1e3:>12.3f}{lookup_during * 1e3:>12.3f}")
+    print(f"{'slowest commit ms':<20}{commit_before * 1e3:>12.3f}{commit_during * 1e3:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Measure the CPU saved by pre-encoded responses on the hot endpoints.
+
+Times (a) building just the response object with jsonify versus the
+pre-encoded path, and (b) full WSGI requests through the Flask app for
+health and apply_offer, against copies of the routes that still use
+jsonify. No network is involved; each request is a direct WSGI call.
+
+Usage:
+    python3 benchmarks/bench_responses.py [--iterations 50000]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify, request  # noqa: E402
+import mock_service  # noqa: E402
+from mock_service import app  # noqa: E402
+from pricing import DISCOUNTS  # noqa: E402
+from responses import HEALTHY_BODY  # noqa: E402
+from validation import validate_cart  # noqa: E402
+
+
+@app.route('/bench/health_jsonify', methods=['GET'])
+def health_jsonify():
+    return jsonify({"status": "healthy"}), 200
+
+
+@app.route('/bench/apply_offer_jsonify', methods=['POST'])
+def apply_offer_jsonify():
+    data = request.json
+    cart, error = validate_cart(data)
+    cart_value, user_id, restaurant_id = cart
+    segment = mock_service._get_segment(user_id)
+    offer = mock_service.offers_db.lookup(restaurant_id, segment)
+    return jsonify({"cart_value": DISCOUNTS[offer.type_code](cart_value, offer.value)}), 200
+
+
+def wsgi_call(method: str, path: str, body: bytes = b'') -> bytes:
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': 'bench',
+        'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.multithread': False, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    return b''.join(app(environ, lambda status, headers, exc_info=None: None))
+
+
+def report(name: str, old, new, iterations: int) -> None:
+    old_us = min(timeit.repeat(old, number=iterations, repeat=3)) / iterations * 1e6
+    new_us = min(timeit.repeat(new, number=iterations, repeat=3)) / iterations * 1e6
+    print(f"{name:<28} jsonify {old_us:6.2f} us   pre-encoded {new_us:6.2f} us   saved {old_us - new_us:5.2f} us "
+          f"({(old_us - new_us) / old_us:.0%})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=50000)
+    args = parser.parse_args()
+
+    mock_service.offers_db.set_offer(1, ['p1'], 'FLAT%', 12.5)
+    mock_service.user_segments_db[1] = 'p1'
+    cart = json.dumps({"cart_value": 100.5, "user_id": 1, "restaurant_id": 1}).encode()
+    assert wsgi_call('POST', '/api/v1/cart/apply_offer', cart) == wsgi_call('POST', '/bench/apply_offer_jsonify', cart)
+
+    with app.app_context():
+        report("health body only", lambda: jsonify({"status": "healthy"}),
+               lambda: mock_service._raw_json(HEALTHY_BODY), args.iterations)
+        report("cart_value body only", lambda: jsonify({"cart_value": 87.94}),
+               lambda: mock_service._cart_value_response(87.94), args.iterations)
+    iterations = args.iterations // 5
+    report("GET /health (WSGI)", lambda: wsgi_call('GET', '/bench/health_jsonify'),
+           lambda: wsgi_call('GET', '/health'), iterations)
+    report("POST apply_offer (WSGI)", lambda: wsgi_call('POST', '/bench/apply_offer_jsonify', cart),
+           lambda: wsgi_call('POST', '/api/v1/cart/apply_offer', cart), iterations)
+
+
+if __name__ == '__main__':
+    main()
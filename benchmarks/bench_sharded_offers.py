@@ -0,0 +1,111 @@
+"""
+Measure OfferTable throughput with concurrent writer and reader threads.
+
+Runs writer threads publishing small batches of offers to random
+restaurants and reader threads doing apply-path lookups, against a table
+with one shard (a single write lock) and with DEFAULT_SHARDS shards, for
+increasing numbers of writers. Reports writes and lookups per second and
+the p99 time writers spend waiting for shard locks.
+
+On CPython with the GIL, threads do not run Python code in parallel, so
+throughput cannot grow with cores; what sharding removes is writers queuing
+behind a lock held by a writer that has been switched out. On a free-threaded
+build the writers also run on separate cores.
+
+Usage:
+    python3 benchmarks/bench_sharded_offers.py [--restaurants 100000] [--seconds 2] [--readers 2]
+"""
+import argparse
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from offer_store import DEFAULT_SHARDS, OfferTable  # noqa: E402
+
+SEGMENTS = ('p1', 'p2', 'p3')
+BATCH = 8
+
+
+class TimedLock:
+    """Wraps a shard lock to record how long acquiring it takes."""
+
+    def __init__(self, lock, waits):
+        self.lock = lock
+        self.waits = waits
+
+    def __enter__(self):
+        start = time.perf_counter_ns()
+        self.lock.acquire()
+        self.waits.append(time.perf_counter_ns() - start)
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+
+def run(shards: int, writers: int, readers: int, restaurants: int, seconds: float):
+    table = OfferTable(shards=shards)
+    table.set_offers((restaurant_id, 'FLATX', 0.0, SEGMENTS) for restaurant_id in range(restaurants))
+    waits = []
+    for shard in table._shards:
+        shard.lock = TimedLock(shard.lock, waits)
+    stop = threading.Event()
+    counts = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        writes = 0
+        value = 0.0
+        while not stop.is_set():
+            value += 1
+            table.set_offers([(rng.randrange(restaurants), 'FLAT%', value, SEGMENTS) for _ in range(BATCH)])
+            writes += BATCH
+        counts.append(('write', writes))
+
+    def reader(seed):
+        rng = random.Random(seed)
+        lookups = 0
+        lookup = table.lookup
+        while not stop.is_set():
+            for _ in range(100):
+                lookup(rng.randrange(restaurants), 'p2')
+            lookups += 100
+        counts.append(('read', lookups))
+
+    threads = [threading.Thread(target=writer, args=(index,)) for index in range(writers)]
+    threads += [threading.Thread(target=reader, args=(1000 + index,)) for index in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    writes = sum(count for kind, count in counts if kind == 'write')
+    reads = sum(count for kind, count in counts if kind == 'read')
+    waits.sort()
+    p99_wait = waits[int(len(waits) * 0.99)] if waits else 0
+    return writes / seconds, reads / seconds, p99_wait
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--restaurants', type=int, default=100000)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+
+    gil = 'disabled' if sysconfig.get_config_var('Py_GIL_DISABLED') else 'enabled'
+    print(f"{os.cpu_count()} CPUs, GIL {gil}, {args.readers} reader threads\n")
+    print(f"{'shards':>6}{'writers':>9}{'writes/s':>12}{'lookups/s':>12}{'p99 lock wait':>15}")
+    for writers in (1, 2, 4, 8):
+        for shards in (1, DEFAULT_SHARDS):
+            writes, reads, p99_wait = run(shards, writers, args.readers, args.restaurants, args.seconds)
+            print(f"{shards:>6}{writers:>9}{writes:>12,.0f}{reads:>12,.0f}{p99_wait / 1000:>12.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure the throughput of the compiled request validators.
+
+Compares the validators compiled from schemas in validation.py with the
+hand-written validators they replaced (all([...]) presence checks and list
+membership tests), on valid and invalid offer and cart payloads.
+
+Usage:
+    python3 benchmarks/bench_validation.py [--iterations 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import validate_cart, validate_offer  # noqa: E402
+
+
+def legacy_validate_offer(data):
+    restaurant_id = data.get('restaurant_id')
+    offer_type = data.get('offer_type')
+    offer_value = data.get('offer_value')
+    customer_segments = data.get('customer_segment', [])
+    if not all([restaurant_id, offer_type, offer_value, customer_segments]):
+        return None, ("Missing required fields", 400)
+    if offer_type not in ['FLATX', 'FLAT%']:
+        return None, ("Invalid offer_type. Must be 'FLATX' or 'FLAT%'", 400)
+    try:
+        offer_value = float(offer_value)
+        if offer_value < 0:
+            return None, ("offer_value must be non-negative", 400)
+    except (ValueError, TypeError):
+        return None, ("offer_value must be a number", 400)
+    valid_segments = ['p1', 'p2', 'p3']
+    for segment in customer_segments:
+        if segment not in valid_segments:
+            return None, (f"Invalid segment: {segment}. Must be one of {valid_segments}", 400)
+    return (restaurant_id, offer_type, offer_value, customer_segments), None
+
+
+def legacy_validate_cart(data):
+    cart_value = data.get('cart_value')
+    user_id = data.get('user_id')
+    restaurant_id = data.get('restaurant_id')
+    if not all([cart_value, user_id, restaurant_id]):
+        return None, ("Missing required fields", 400)
+    try:
+        cart_value = float(cart_value)
+        if cart_value < 0:
+            return None, ("cart_value must be non-negative", 400)
+    except (ValueError, TypeError):
+        return None, ("cart_value must be a number", 400)
+    return (cart_value, user_id, restaurant_id), None
+
+
+CASES = [
+    ('offer, valid', legacy_validate_offer, validate_offer,
+     {'restaurant_id': 1, 'offer_type': 'FLAT%', 'offer_value': 10, 'customer_segment': ['p1', 'p2', 'p3']}),
+    ('offer, bad segment', legacy_validate_offer, validate_offer,
+     {'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': ['p1', 'p7']}),
+    ('cart, valid', legacy_validate_cart, validate_cart,
+     {'cart_value': 200, 'user_id': 1, 'restaurant_id': 1}),
+    ('cart, missing field', legacy_validate_cart, validate_cart,
+     {'cart_value': 200, 'restaurant_id': 1}),
+]
+
+
+def per_call_ns(validator, data, iterations: int) -> float:
+    """Best of five runs, in nanoseconds per call."""
+    return min(timeit.repeat(lambda: validator(data), number=iterations, repeat=5)) / iterations * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<22}{'hand-written':>14}{'compiled':>12}{'speedup':>10}")
+    for name, legacy, compiled, data in CASES:
+        assert legacy(data) == compiled(data)
+        legacy_ns = per_call_ns(legacy, data, args.iterations)
+        compiled_ns = per_call_ns(compiled, data, args.iterations)
+        print(f"{name:<22}{legacy_ns:>11.0f} ns{compiled_ns:>9.0f} ns{legacy_ns / compiled_ns:>9.2f}x")
+
+    carts = [{'cart_value': 100 + i % 50, 'user_id': i, 'restaurant_id': i % 10 + 1} for i in range(10000)]
+    for label, validator in (('hand-written', legacy_validate_cart), ('compiled', validate_cart)):
+        seconds = min(timeit.repeat(lambda: [validator(cart) for cart in carts], number=1, repeat=20))
+        print(f"batch of 10000 carts, {label:<13} {len(carts) / seconds / 1e6:6.2f} M carts/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Command-line bulk import for the Zomato cart offer mock service.
+
+Streams an NDJSON or CSV file to the service's bulk endpoints without
+loading it into memory.
+
+Usage:
+    python3 bulk_import.py offers offers.ndjson --base-url http://localhost:5001
+    python3 bulk_import.py segments segments.csv
+"""
+import argparse
+import json
+import sys
+import time
+
+from api.cart_api import CartAPI
+
+
+def main(argv=None) -> int:
+    """Run the bulk import CLI and return the process exit code."""
+    parser = argparse.ArgumentParser(description="Bulk-import data into the mock service.")
+    parser.add_argument('kind', choices=['offers', 'segments'], help="Type of records in the file")
+    parser.add_argument('path', help="File to import ('-' for stdin)")
+    parser.add_argument('--format', choices=['ndjson', 'csv'],
+                        help="File format for segments (default: from the file extension)")
+    parser.add_argument('--base-url', default='http://localhost:5001', help="Base URL for the API server")
+    args = parser.parse_args(argv)
+    
+    api_client = CartAPI(base_url=args.base_url)
+    source = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    start = time.perf_counter()
+    try:
+        if args.kind == 'offers':
+            response = api_client.add_offers_bulk(source)
+        else:
+            fmt = args.format or ('csv' if args.path.endswith('.csv') else 'ndjson')
+            response = api_client.set_user_segments_bulk(source, fmt=fmt)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    elapsed = time.perf_counter() - start
+    
+    print(json.dumps(response['data'], indent=2))
+    if response['status_code'] != 200:
+        return 1
+    data = response['data']
+    imported = data['accepted'] if args.kind == 'offers' else data['inserted'] + data['updated']
+    print(f"Imported {imported} {args.kind} in {elapsed:.2f}s", file=sys.stderr)
+    return 0 if data['rejected'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Bounded change feed for incremental client sync.
+
+A ChangeFeed numbers changes with a monotonically increasing version and
+remembers which key (here, a restaurant_id) each of the last `capacity`
+changes touched, in a fixed-size ring. Clients that last synced at version v
+ask for the keys changed after v; when v has aged out of the ring, or the
+feed was reset, they have to start again from a full snapshot.
+
+Versions are assigned and stored under one small lock, so the ring is
+always in version order even when writers hold different shard locks.
+"""
+import threading
+from typing import Any, List, Optional, Tuple
+
+
+# Number of changes remembered by default
+DEFAULT_CAPACITY = 100000
+
+
+class ChangeFeed:
+    """Ring of the keys touched by the most recent changes."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._ring: List[Any] = [None] * capacity
+        self._lock = threading.Lock()
+        # Version of the latest change
+        self.version = 0
+        # Changes up to and including this version are not in the ring
+        self._reset_version = 0
+
+    @property
+    def oldest(self) -> int:
+        """Smallest version a client may sync from without a snapshot."""
+        return max(self._reset_version, self.version - self.capacity)
+
+    @property
+    def reset_version(self) -> int:
+        """Version of the latest reset, or 0."""
+        return self._reset_version
+
+    def record(self, key: Any) -> int:
+        """
+        Record a change to a key.
+
+        Returns:
+            The version of the change
+        """
+        with self._lock:
+            version = self.version + 1
+            self._ring[version % self.capacity] = key
+            self.version = version
+        return version
+
+    def reset(self) -> int:
+        """
+        Forget every change, e.g. after the whole table was cleared.
+
+        Clients at any earlier version have to resync from a snapshot.
+
+        Returns:
+            The version of the reset
+        """
+        with self._lock:
+            self.version += 1
+            self._reset_version = self.version
+            return self.version
+
+    def since(self, version: int, limit: int) -> Optional[Tuple[List[Tuple[int, Any]], int]]:
+        """
+        Get the changes after a version.
+
+        Args:
+            version: Version the client has synced up to
+            limit: Largest number of changes to return
+
+        Returns:
+            ([(version, key), ...], latest_version) with at most limit
+            changes in version order, or None when changes after version are
+            no longer all in the ring (or version is from the future, e.g.
+            from before a restart)
+        """
+        with self._lock:
+            latest = self.version
+            if version < max(self._reset_version, latest - self.capacity) or version > latest:
+                return None
+            end = min(latest, version + limit)
+            ring = self._ring
+            capacity = self.capacity
+            return [(change, ring[change % capacity]) for change in range(version + 1, end + 1)], latest
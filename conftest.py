@@ -6,7 +6,8 @@ import subprocess
 import time
 import requests
 import threading
-from mock_service import app, offers_db, user_segments_db
+import mock_service
+from mock_service import app, offer_scheduler, offers_db, segment_changes
 from api.cart_api import CartAPI
 
 
@@ -17,7 +18,7 @@ def mock_server():
     """
     # Clear databases before starting
     offers_db.clear()
-    user_segments_db.clear()
+    mock_service.user_segments_db.clear()
     
     # Use port 5001 to avoid conflicts with AirPlay Receiver on macOS
     port = 5001
@@ -60,7 +61,10 @@ def cleanup_before_test():
     Clean up offers and user segments before each test.
     """
     offers_db.clear()
-    user_segments_db.clear()
+    # Looked up on the module: a reload replaces the store
+    mock_service.user_segments_db.clear()
+    segment_changes.reset()
+    offer_scheduler.clear()
     yield
     # Optional: cleanup after test if needed
 
@@ -0,0 +1,303 @@
+"""
+Request metrics for the Zomato cart offer mock service.
+
+RequestMetrics counts requests by route and status code, tracks requests in
+flight and records latencies in log-bucketed histograms, and renders them in
+the Prometheus text exposition format. MetricsMiddleware records every
+request a WSGI application handles.
+
+Recording is lock-free: every thread records into its own shard, and shards
+are only merged when the metrics are scraped. A thread's shard is folded
+into a retired total when the thread exits, so thread-per-request servers do
+not accumulate shards. Scrapes read shards while other threads write them,
+so a scrape may miss requests that finish during it; they show up in the
+next one.
+
+Latency buckets are spaced SUB_BUCKETS per power of two from 2**MIN_SHIFT ns
+(about 1 us) to 2**MAX_SHIFT ns (about 69 s), so quantiles computed from them
+are within 25% of the true value. Prometheus histogram buckets are exported
+at powers of two only, to keep the output small.
+"""
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+
+# Latency histogram layout
+SUB_BUCKETS = 4
+MIN_SHIFT = 10
+MAX_SHIFT = 36
+# Bucket 0 holds latencies below 2**MIN_SHIFT ns and the last bucket those
+# of 2**MAX_SHIFT ns and above
+NUM_BUCKETS = (MAX_SHIFT - MIN_SHIFT) * SUB_BUCKETS + 2
+
+# Quantiles reported for each route
+QUANTILES = (0.5, 0.99, 0.999)
+
+# Prefix of every exported metric name
+METRIC_PREFIX = 'cart_offers'
+
+# (method, route) label values
+Route = Tuple[str, str]
+
+# Label for requests that match no route, so unknown paths cannot create
+# new label values
+UNMATCHED_ROUTE: Route = ('OTHER', 'unmatched')
+
+
+def bucket_index(nanoseconds: int) -> int:
+    """Get the histogram bucket for a latency in nanoseconds."""
+    if nanoseconds < 1 << MIN_SHIFT:
+        return 0
+    shift = nanoseconds.bit_length() - 1
+    if shift >= MAX_SHIFT:
+        return NUM_BUCKETS - 1
+    # The two bits below the leading one select the sub-bucket
+    return (shift - MIN_SHIFT) * SUB_BUCKETS + ((nanoseconds >> (shift - 2)) & 3) + 1
+
+
+def bucket_upper_bound(index: int) -> float:
+    """Get the exclusive upper bound of a bucket in nanoseconds (inf for the last one)."""
+    if index == 0:
+        return float(1 << MIN_SHIFT)
+    if index >= NUM_BUCKETS - 1:
+        return float('inf')
+    shift, sub = divmod(index - 1, SUB_BUCKETS)
+    shift += MIN_SHIFT
+    return float((1 << shift) + ((sub + 1) << (shift - 2)))
+
+
+class RouteStats:
+    """Counters and latency histogram of one route, in one shard."""
+
+    __slots__ = ('in_flight', 'statuses', 'buckets', 'count', 'sum_ns')
+
+    def __init__(self):
+        self.in_flight = 0
+        self.statuses: Dict[int, int] = {}
+        self.buckets = [0] * NUM_BUCKETS
+        self.count = 0
+        self.sum_ns = 0
+
+    def merge(self, other: 'RouteStats') -> None:
+        """Add another shard's counters to these."""
+        self.in_flight += other.in_flight
+        for status, count in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        buckets = self.buckets
+        for index, count in enumerate(other.buckets):
+            if count:
+                buckets[index] += count
+        self.count += other.count
+        self.sum_ns += other.sum_ns
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a latency quantile in seconds (a bucket upper bound), or None without data."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return bucket_upper_bound(index) / 1e9
+        return float('inf')
+
+
+class _ShardOwner:
+    """Kept in a thread's local storage; its collection means the thread has exited."""
+
+    __slots__ = ('__weakref__',)
+
+
+class RequestMetrics:
+    """Per-route request counters and latency histograms, recorded per thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Shards of live threads
+        self._shards: List[Dict[Route, RouteStats]] = []
+        # Totals folded in from threads that have exited
+        self._retired: Dict[Route, RouteStats] = {}
+
+    def _shard(self) -> Dict[Route, RouteStats]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard: Dict[Route, RouteStats] = {}
+        owner = _ShardOwner()
+        weakref.finalize(owner, self._retire, shard)
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        self._local.owner = owner
+        return shard
+
+    def _retire(self, shard: Dict[Route, RouteStats]) -> None:
+        with self._lock:
+            self._shards.remove(shard)
+            _merge_into(self._retired, shard)
+
+    def start(self, route: Route) -> int:
+        """
+        Record that a request started.
+
+        Returns:
+            A start timestamp to pass to finish() from the same thread
+        """
+        shard = self._shard()
+        stats = shard.get(route)
+        if stats is None:
+            stats = shard[route] = RouteStats()
+        stats.in_flight += 1
+        return time.perf_counter_ns()
+
+    def finish(self, route: Route, status: int, started_ns: int) -> None:
+        """Record that a request started with start() finished with a status code."""
+        elapsed = time.perf_counter_ns() - started_ns
+        stats = self._shard()[route]
+        stats.in_flight -= 1
+        stats.buckets[bucket_index(elapsed)] += 1
+        stats.count += 1
+        stats.sum_ns += elapsed
+        statuses = stats.statuses
+        statuses[status] = statuses.get(status, 0) + 1
+
+    def collect(self) -> Dict[Route, RouteStats]:
+        """Merge every shard into one set of per-route stats."""
+        merged: Dict[Route, RouteStats] = {}
+        with self._lock:
+            _merge_into(merged, self._retired)
+            for shard in self._shards:
+                _merge_into(merged, shard)
+        return merged
+
+    def render(self, gauges: Iterable[Tuple[str, str, float]] = ()) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Args:
+            gauges: Extra (name, help, value) gauges to include, such as
+                store sizes
+        """
+        routes = sorted(self.collect().items())
+        lines: List[str] = []
+
+        name = f'{METRIC_PREFIX}_http_requests_total'
+        lines += [f'# HELP {name} Requests handled, by route and status code.', f'# TYPE {name} counter']
+        for route, stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'{name}{{{_labels(route)},status="{status}"}} {count}')
+
+        name = f'{METRIC_PREFIX}_http_requests_in_flight'
+        lines += [f'# HELP {name} Requests being handled, by route.', f'# TYPE {name} gauge']
+        for route, stats in routes:
+            lines.append(f'{name}{{{_labels(route)}}} {stats.in_flight}')
+
+        name = f'{METRIC_PREFIX}_http_request_duration_seconds'
+        lines += [f'# HELP {name} Request latency, by route.', f'# TYPE {name} histogram']
+        for route, stats in routes:
+            labels = _labels(route)
+            cumulative = 0
+            for index, count in enumerate(stats.buckets[:-1]):
+                cumulative += count
+                # Export the buckets that end on a power of two
+                if index % SUB_BUCKETS == 0:
+                    lines.append(f'{name}_bucket{{{labels},le="{bucket_upper_bound(index) / 1e9!r}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f'{name}_sum{{{labels}}} {stats.sum_ns / 1e9!r}')
+            lines.append(f'{name}_count{{{labels}}} {stats.count}')
+
+        name = f'{METRIC_PREFIX}_http_request_duration_quantile_seconds'
+        lines += [f'# HELP {name} Estimated request latency quantiles, by route.', f'# TYPE {name} gauge']
+        for route, stats in routes:
+            for q in QUANTILES:
+                value = stats.quantile(q)
+                if value is not None:
+                    lines.append(f'{name}{{{_labels(route)},quantile="{q}"}} {value!r}')
+
+        for gauge_name, help_text, value in gauges:
+            name = f'{METRIC_PREFIX}_{gauge_name}'
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """
+    WSGI middleware that records every request in a RequestMetrics.
+
+    Requests are labelled with their method and path when the pair is one of
+    the application's routes, and with UNMATCHED_ROUTE otherwise. Latency is
+    measured until the application returns its response iterable.
+    """
+
+    def __init__(
+        self,
+        wsgi_app,
+        recorder: RequestMetrics,
+        routes: Callable[[], Iterable[Route]],
+        routes_version: Optional[Callable[[], Any]] = None
+    ):
+        """
+        Wrap a WSGI application.
+
+        Args:
+            wsgi_app: Application to wrap
+            recorder: Where requests are recorded
+            routes: Returns the application's (method, path) routes
+            routes_version: Returns a cheap value that changes whenever
+                routes are added, e.g. the number of endpoints. Routes are
+                listed again for a request that matches none of them only
+                when it has changed (or always, without it), so routes added
+                later are picked up while unmatched requests stay cheap
+        """
+        self.wsgi_app = wsgi_app
+        self.recorder = recorder
+        self._routes_source = routes
+        self._routes_version = routes_version
+        self._version = routes_version() if routes_version is not None else None
+        self._routes: FrozenSet[Route] = frozenset(routes())
+
+    def __call__(self, environ, start_response):
+        route = (environ['REQUEST_METHOD'], environ.get('PATH_INFO', ''))
+        if route not in self._routes:
+            version = self._routes_version() if self._routes_version is not None else None
+            if version is None or version != self._version:
+                self._routes = frozenset(self._routes_source())
+                self._version = version
+            if route not in self._routes:
+                route = UNMATCHED_ROUTE
+        recorder = self.recorder
+        started = recorder.start(route)
+        status = 500
+
+        def capture_status(status_line, headers, exc_info=None):
+            nonlocal status
+            status = int(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, capture_status)
+        finally:
+            recorder.finish(route, status, started)
+
+
+def _merge_into(target: Dict[Route, RouteStats], shard: Dict[Route, RouteStats]) -> None:
+    for route, stats in list(shard.items()):
+        merged = target.get(route)
+        if merged is None:
+            merged = target[route] = RouteStats()
+        merged.merge(stats)
+
+
+def _labels(route: Route) -> str:
+    method, path = route
+    return f'method="{_escape(method)}",route="{_escape(path)}"'
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,323 @@
+"""
+Memory-mapped, read-only binary snapshots of offers and user segments.
+
+A snapshot file holds the segment and offer tables as flat typed arrays, so
+it can be mapped with mmap and read in place: opening one deserializes
+nothing, and every process that maps the same file shares one physical copy
+through the page cache. A new snapshot is written to a temporary file and
+renamed over the old one, so readers either see the old file or the new one.
+
+File layout (little-endian, each section padded to 8 bytes):
+
+    header          magic, version, dense_slots, sparse_users, restaurants, created_ns
+    dense codes     uint8[dense_slots]          segment code indexed by user_id
+    sparse ids      int64[sparse_users]         sorted ids outside the dense range
+    sparse codes    uint8[sparse_users]
+    restaurant ids  int64[restaurants]          sorted
+    offer types     int8[restaurants * 3]       offer type code per p1/p2/p3, -1 = none
+    offer values    float64[restaurants * 3]
+
+Segment codes and offer type codes are those of segment_store and pricing.
+Only integer user and restaurant ids can be stored; other ids are skipped and
+counted by write_snapshot. Offers with a valid_until are left out as well,
+and so are segments with several concurrent offers or with a min_cart_value
+or max_discount, which the one-offer slots cannot hold.
+
+Usage:
+    python3 mmap_snapshot.py export ./data state.snap    # from a DATA_DIR
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from offer_store import Offer
+from pricing import OFFER_TYPE_CODES
+from segment_store import MAX_SLOTS_PER_USER, MIN_DENSE_SLOTS, SEGMENTS, SEGMENT_CODES
+
+
+MAGIC = b'ZCSN'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQQQ')
+
+# Offer slots per restaurant row, one per segment p1/p2/p3
+SLOTS = len(SEGMENTS) - 1
+
+NO_OFFER = -1
+
+
+def _padding(size: int) -> bytes:
+    """Zero bytes needed to align size to 8 bytes."""
+    return bytes(-size % 8)
+
+
+def write_snapshot(
+    path: str,
+    offers: Iterable[Tuple[Any, Dict[str, Dict[str, Any]]]],
+    segments: Iterable[Tuple[Any, str]]
+) -> Dict[str, int]:
+    """
+    Write a binary snapshot and atomically replace path with it.
+
+    Args:
+        path: Destination file
+        offers: (restaurant_id, {segment: {'offer_type', 'offer_value'}})
+            pairs, e.g. OfferTable.items()
+        segments: (user_id, segment) pairs, e.g. user_segments_db.items()
+
+    Returns:
+        Counts of users, restaurants, skipped non-integer ids, left-out
+        expiring offers and left-out segments with several offers or
+        conditions
+    """
+    skipped = 0
+    expiring = 0
+    multiple = 0
+    users: Dict[int, int] = {}
+    for user_id, segment in segments:
+        if type(user_id) is not int:
+            skipped += 1
+            continue
+        users[user_id] = SEGMENT_CODES[segment]
+
+    # Dense range: ids from 0 up to where the array would get too sparse
+    dense_limit = max(MIN_DENSE_SLOTS, len(users) * MAX_SLOTS_PER_USER)
+    dense_ids = [user_id for user_id in users if 0 <= user_id < dense_limit]
+    dense_codes = bytearray(max(dense_ids) + 1 if dense_ids else 0)
+    for user_id in dense_ids:
+        dense_codes[user_id] = users[user_id]
+    sparse_ids = array('q', sorted(user_id for user_id in users if not 0 <= user_id < dense_limit))
+    sparse_codes = bytearray(users[user_id] for user_id in sparse_ids)
+
+    rows: Dict[int, Dict[str, Dict[str, Any]]] = {}
+    for restaurant_id, restaurant_offers in offers:
+        if type(restaurant_id) is not int:
+            skipped += 1
+            continue
+        rows[restaurant_id] = restaurant_offers
+    restaurant_ids = array('q', sorted(rows))
+    offer_types = array('b', [NO_OFFER]) * (len(restaurant_ids) * SLOTS)
+    offer_values = array('d', [0.0]) * (len(restaurant_ids) * SLOTS)
+    for index, restaurant_id in enumerate(restaurant_ids):
+        for segment, offer in rows[restaurant_id].items():
+            if isinstance(offer, list) or 'min_cart_value' in offer or 'max_discount' in offer:
+                multiple += 1
+                continue
+            if offer.get('valid_until') is not None:
+                # The format has no validity window, and a snapshot may be
+                # mapped long after the offer expired
+                expiring += 1
+                continue
+            slot = index * SLOTS + SEGMENT_CODES[segment] - 1
+            offer_types[slot] = OFFER_TYPE_CODES[offer['offer_type']]
+            offer_values[slot] = offer['offer_value']
+
+    tmp_path = f'{path}.tmp.{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(dense_codes), len(sparse_ids),
+                            len(restaurant_ids), time.time_ns()))
+        for section in (dense_codes, sparse_ids.tobytes(), sparse_codes, restaurant_ids.tobytes(),
+                        offer_types.tobytes(), offer_values.tobytes()):
+            f.write(section)
+            f.write(_padding(len(section)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return {"users": len(users), "restaurants": len(restaurant_ids), "skipped": skipped, "expiring": expiring,
+            "multiple": multiple}
+
+
+class MappedSnapshot:
+    """Read-only view of a snapshot file, read in place through mmap."""
+
+    def __init__(self, path: str):
+        """
+        Map a snapshot file.
+
+        Raises:
+            ValueError: If the file is not a snapshot of a supported version
+        """
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, dense_slots, sparse_users, restaurants, self.created_ns = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} snapshot: {path}")
+        self.path = path
+        self.version_tag = f'snapshot-{self.created_ns:x}'
+
+        view = memoryview(self._map)
+        offset = HEADER.size
+
+        def section(count: int, fmt: str) -> memoryview:
+            nonlocal offset
+            size = count * struct.calcsize(fmt)
+            data = view[offset:offset + size].cast(fmt)
+            offset += size + len(_padding(size))
+            return data
+
+        self._dense_codes = section(dense_slots, 'B')
+        self._sparse_ids = section(sparse_users, 'q')
+        self._sparse_codes = section(sparse_users, 'B')
+        self._restaurant_ids = section(restaurants, 'q')
+        self._offer_types = section(restaurants * SLOTS, 'b')
+        self._offer_values = section(restaurants * SLOTS, 'd')
+
+    def get_code(self, user_id: Any) -> int:
+        """Segment code for a user, or 0 if the snapshot has no segment for it."""
+        if type(user_id) is not int:
+            return 0
+        if 0 <= user_id < len(self._dense_codes):
+            return self._dense_codes[user_id]
+        index = bisect_left(self._sparse_ids, user_id)
+        if index < len(self._sparse_ids) and self._sparse_ids[index] == user_id:
+            return self._sparse_codes[index]
+        return 0
+
+    def get(self, user_id: Any, default: Optional[str] = None) -> Optional[str]:
+        """Segment for a user ('p1', 'p2' or 'p3'), or default."""
+        return SEGMENTS[self.get_code(user_id)] or default
+
+    def _row(self, restaurant_id: Any) -> int:
+        """Index of a restaurant's row, or -1."""
+        if type(restaurant_id) is not int:
+            return -1
+        index = bisect_left(self._restaurant_ids, restaurant_id)
+        if index < len(self._restaurant_ids) and self._restaurant_ids[index] == restaurant_id:
+            return index
+        return -1
+
+    def lookup(self, restaurant_id: Any, segment: str) -> Optional[Offer]:
+        """Offer for a restaurant and segment, or None."""
+        index = self._row(restaurant_id)
+        if index < 0:
+            return None
+        slot = index * SLOTS + SEGMENT_CODES[segment] - 1
+        type_code = self._offer_types[slot]
+        if type_code == NO_OFFER:
+            return None
+        return Offer(type_code, self._offer_values[slot])
+
+    def get_row(self, restaurant_id: Any) -> Optional[Tuple[Optional[Offer], ...]]:
+        """
+        A restaurant's offers as an OfferTable row, or None.
+
+        The row version (slot 0) identifies this snapshot file.
+        """
+        index = self._row(restaurant_id)
+        if index < 0:
+            return None
+        row: List[Any] = [self.version_tag]
+        for slot in range(index * SLOTS, (index + 1) * SLOTS):
+            type_code = self._offer_types[slot]
+            row.append(None if type_code == NO_OFFER else Offer(type_code, self._offer_values[slot]))
+        return tuple(row)
+
+    def stats(self) -> Dict[str, Any]:
+        """Sizes of the mapped tables."""
+        return {
+            "path": self.path,
+            "bytes": len(self._map),
+            "dense_slots": len(self._dense_codes),
+            "sparse_users": len(self._sparse_ids),
+            "restaurants": len(self._restaurant_ids),
+            "created_ns": self.created_ns
+        }
+
+
+class SnapshotSource:
+    """The current MappedSnapshot for a path, remapped when the file is replaced."""
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        """
+        Map the snapshot at path and, if poll_interval > 0, watch it for swaps.
+
+        Args:
+            path: Snapshot file
+            poll_interval: Seconds between checks for a replaced file
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.current = MappedSnapshot(path)
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        if poll_interval > 0:
+            self._watcher = threading.Thread(target=self._watch, name='snapshot-watcher', daemon=True)
+            self._watcher.start()
+
+    def refresh(self) -> bool:
+        """
+        Map the file again if it was replaced since it was last mapped.
+
+        The new mapping is published with one reference assignment. The old
+        mapping is released once no reader holds it any more.
+
+        Returns:
+            True if a new snapshot was mapped
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_dev, stat.st_ino, stat.st_mtime_ns) == self.current.identity:
+            return False
+        self.current = MappedSnapshot(self.path)
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except (OSError, ValueError):
+                # Keep serving the current mapping if the new file is unreadable
+                pass
+
+    def close(self) -> None:
+        """Stop watching for new snapshots."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def get_code(self, user_id: Any) -> int:
+        return self.current.get_code(user_id)
+
+    def get(self, user_id: Any, default: Optional[str] = None) -> Optional[str]:
+        return self.current.get(user_id, default)
+
+    def lookup(self, restaurant_id: Any, segment: str) -> Optional[Offer]:
+        return self.current.lookup(restaurant_id, segment)
+
+    def get_row(self, restaurant_id: Any) -> Optional[Tuple[Optional[Offer], ...]]:
+        return self.current.get_row(restaurant_id)
+
+
+def main(argv=None) -> int:
+    """Export a DATA_DIR (snapshot + write-ahead log) to a binary snapshot."""
+    parser = argparse.ArgumentParser(description="Build memory-mappable state snapshots.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help="Export a persistence DATA_DIR")
+    export.add_argument('data_dir', help="Directory written by the service with DATA_DIR set")
+    export.add_argument('path', help="Snapshot file to write (replaced atomically)")
+    args = parser.parse_args(argv)
+
+    import mock_service
+    mock_service.enable_persistence(args.data_dir, snapshot_interval=0)
+    mock_service.disable_persistence()
+    start = time.perf_counter()
+    stats = write_snapshot(args.path, mock_service.offers_db.items(), mock_service.user_segments_db.items())
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
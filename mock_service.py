@@ -2,18 +2,932 @@
 Mock service for Zomato cart offer testing.
 This service simulates the API endpoints for offers and cart operations.
 """
+import csv
+import io
+import json
+import math
+import os
+import signal
+import threading
+import time
+from bisect import bisect_right
+from contextlib import nullcontext
 from flask import Flask, request, jsonify
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from change_feed import ChangeFeed
+from metrics import MetricsMiddleware, RequestMetrics
+from mmap_snapshot import SnapshotSource
+from offer_store import Offer, OfferTable
+from persistence import FSYNC_INTERVAL, Persistence
+from profiling import ProfilingMiddleware, RequestProfiler
+from ratelimit import (
+    DEFAULT_EXEMPT,
+    Budget,
+    RateLimiter,
+    RateLimitMiddleware,
+    parse_budget,
+    parse_route_budgets
+)
+from paise import ENGINE_FLOAT, ROUND_HALF_UP, discount_tables
+from pricing import BATCH_DISCOUNTS, DISCOUNTS, FLATX_CODE, offer_type_code
+from responses import HEALTHY_BODY, SUCCESS_BODY, USER_SEGMENT_NOT_FOUND_BODY, encode_cart_value
+from scheduler import Scheduler
+from segment_store import SegmentStore
+from validation import (
+    validate_bulk_user_segment,
+    validate_cart,
+    validate_chain_id_param,
+    validate_chain_offer,
+    validate_chain_outlets,
+    validate_changes_param,
+    validate_offer,
+    validate_restaurant_id_param,
+    validate_user_id_param,
+    validate_user_segment
+)
 
 app = Flask(__name__)
 
+# Maximum number of carts accepted by the batch apply endpoint
+MAX_BATCH_SIZE = 10000
+
+# Number of validated lines applied at a time by the bulk import endpoints
+BULK_CHUNK_SIZE = 1000
+
+# Read buffer size used when parsing streamed request bodies
+STREAM_BUFFER_BYTES = 64 * 1024
+
+# Columns of a headerless user segment CSV upload
+CSV_SEGMENT_FIELDS = ('user_id', 'segment')
+
+# Maximum number of per-line errors included in a bulk import report
+MAX_BULK_ERRORS = 1000
+
+# Maximum number of changes returned by one page of the offer change feed
+MAX_CHANGES_PAGE = 10000
+
 # In-memory storage for offers
-# Structure: {restaurant_id: {segment: {offer_type, offer_value}}}
-offers_db: Dict[int, Dict[str, Dict[str, any]]] = {}
+# Structure: restaurant_id x segment table of compact Offer records
+offers_db = OfferTable()
 
 # In-memory storage for user segments
 # Structure: {user_id: segment}
-user_segments_db: Dict[int, str] = {}
+# Set SEGMENT_STORE=compact to keep segments in a SegmentStore, which uses
+# about 1 byte per user instead of ~74 bytes for a dict
+user_segments_db: Union[Dict[int, str], SegmentStore] = (
+    SegmentStore() if os.environ.get('SEGMENT_STORE') == 'compact' else {}
+)
+
+# Discount functions used by apply_offer, indexed by offer type code; see
+# set_pricing_engine() to compute in integer paise instead of float rupees
+pricing_engine = ENGINE_FLOAT
+discounts, batch_discounts = DISCOUNTS, BATCH_DISCOUNTS
+
+# User ids changed by recent segment writes, served by
+# /api/v1/user_segments/changes (offer changes are kept by offers_db)
+segment_changes = ChangeFeed()
+
+# (id of the store, segment_changes reset version, user ids in insertion
+# order) of the dict segment store, shared by snapshot pages of
+# /api/v1/user_segments/changes. Users are never removed short of a reset
+# (which a reload does too), so positions in it stay valid when it is listed
+# again for a larger store
+_segment_keys: Tuple[int, int, List[Any]] = (0, 0, [])
+
+# Per-route request counts and latency histograms, served at /metrics
+request_metrics = RequestMetrics()
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+app.wsgi_app = MetricsMiddleware(
+    app.wsgi_app, request_metrics,
+    lambda: [(method, rule.rule) for rule in app.url_map.iter_rules() for method in rule.methods],
+    lambda: len(app.view_functions)
+)
+
+# Number of rows per record when dumping state for a snapshot
+DUMP_CHUNK_SIZE = 1000
+
+# Serializes writes, so listeners see records in the order they were applied
+_commit_lock = threading.Lock()
+
+# Callables notified with every committed write record, in commit order
+write_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+# WAL and snapshot persistence, set up by enable_persistence()
+persistence: Optional[Persistence] = None
+
+# Read-only memory-mapped base state, set up by attach_snapshot()
+mapped_snapshot: Optional[SnapshotSource] = None
+
+# Request profiler, set up by enable_profiling()
+profiler: Optional[RequestProfiler] = None
+
+# Per-client token buckets, set up by enable_rate_limiting()
+rate_limiter: Optional[RateLimiter] = None
+
+# Background reload started by start_reload(), and the outcome of the last one
+_reload_lock = threading.Lock()
+_reload_thread: Optional[threading.Thread] = None
+last_reload: Dict[str, Any] = {}
+
+# A reload replays writes committed during its build in rounds until at most
+# RELOAD_CATCH_UP_WRITES are left, which it applies while holding writers
+RELOAD_CATCH_UP_WRITES = 100
+RELOAD_CATCH_UP_ROUNDS = 10
+
+# File reloaded on SIGUSR1 and by POST /admin/reload (RELOAD_PATH)
+reload_path: Optional[str] = None
+
+# Callables notified with the statistics of every completed reload
+reload_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+# When set, reload_data takes it before each time it takes the commit lock.
+# The pre-fork parent sets it to the lock it forks workers under, so no worker
+# starts with the commit lock held (see prefork.py)
+fork_lock: Optional[threading.Lock] = None
+
+# Activates offers at valid_from and expires them at valid_until, by
+# committing records (see _apply_offer_rows)
+offer_scheduler = Scheduler()
+
+# When set, _commit hands records to it instead of applying them. Pre-forked
+# workers use this to send writes to the parent process, which applies them
+# and broadcasts them to every worker in one order (see prefork.py)
+commit_forwarder: Optional[Callable[[Dict[str, Any]], None]] = None
+
+# When set, records committed by offer_scheduler's actions are handed to it
+# instead of _commit. The pre-fork parent uses this to broadcast them to its
+# workers as well (see prefork.py)
+scheduled_commit: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def apply_record(record: Dict[str, Any]) -> None:
+    """
+    Apply a write record to the in-memory state.
+    
+    Records:
+        {"op": "offers", "rows": [[restaurant_id, offer_type, offer_value, [segment, ...]], ...]}
+        {"op": "add_offers", "rows": [[restaurant_id, offer_type, offer_value, [segment, ...]], ...]}
+        {"op": "segments", "rows": [[user_id, segment], ...]}
+        {"op": "expire", "rows": [[restaurant_id, offer_type, offer_value, [segment, ...], valid_until], ...]}
+        {"op": "chains", "rows": [[restaurant_id, chain_id], ...]}
+        {"op": "chain_offers", "rows": [[chain_id, offer_type, offer_value, [segment, ...]], ...]}
+        {"op": "add_chain_offers", "rows": [[chain_id, offer_type, offer_value, [segment, ...]], ...]}
+        {"op": "expire_chain", "rows": [[chain_id, offer_type, offer_value, [segment, ...], valid_until], ...]}
+    
+    "offers" rows replace the segments' offers and "add_offers" rows run
+    alongside them. Offer rows may end with valid_from and valid_until
+    (either may be null), and then with min_cart_value and max_discount; see
+    _apply_offer_rows. Expire rows may end with min_cart_value and
+    max_discount too. The chain ops take the same rows for a chain's offers,
+    and "chains" rows make restaurants outlets of a chain (or of none, when
+    chain_id is null).
+    """
+    _apply_record(record, offers_db, user_segments_db, segment_changes,
+                  offer_scheduler.schedule if commit_forwarder is None else None)
+
+
+def _apply_record(
+    record: Dict[str, Any],
+    offers: OfferTable,
+    segment_store: Union[Dict[int, str], SegmentStore],
+    changes: Optional[ChangeFeed],
+    schedule: Optional[Callable[..., None]]
+) -> None:
+    """
+    Apply a write record to a set of tables, e.g. ones being built by reload_data.
+    
+    Args:
+        record: Write record
+        offers: Offer table to apply it to
+        segment_store: User segment store to apply it to
+        changes: Feed that records changed user ids, if any
+        schedule: Called as schedule(due, action, *args) for timed actions
+            of offer windows, or None to leave them to another process
+    """
+    op = record['op']
+    if op in _OFFER_OPS:
+        rows = record['rows']
+        add, chain = _OFFER_OPS[op]
+        if chain or any(len(row) > 4 for row in rows):
+            _apply_offer_rows(offers, rows, op, schedule)
+        else:
+            offers.set_offers(rows, add)
+    elif op == 'expire' or op == 'expire_chain':
+        expire = offers.expire_chain if op == 'expire_chain' else offers.expire
+        for row in record['rows']:
+            target_id, offer_type, offer_value, segments, valid_until, min_cart_value, max_discount = (
+                row + _OFFER_ROW_DEFAULTS[len(row) - 3:]
+            )
+            expire(target_id, segments, Offer(
+                offer_type_code(offer_type), offer_value, valid_until, min_cart_value, max_discount
+            ))
+    elif op == 'segments':
+        for user_id, segment in record['rows']:
+            segment_store[user_id] = segment
+            if changes is not None:
+                changes.record(user_id)
+    elif op == 'chains':
+        for restaurant_id, chain_id in record['rows']:
+            offers.set_chain(restaurant_id, chain_id)
+    else:
+        raise ValueError(f"Unknown record op: {op}")
+
+
+# Offer record ops: whether their rows add offers, and whether they set a chain's
+_OFFER_OPS = {
+    "offers": (False, False),
+    "add_offers": (True, False),
+    "chain_offers": (False, True),
+    "add_chain_offers": (True, True),
+}
+
+# Values of the optional trailing offer row fields: valid_from, valid_until,
+# min_cart_value and max_discount
+_OFFER_ROW_DEFAULTS = [None, None, 0, None]
+
+
+def _apply_offer_rows(
+    offers: OfferTable,
+    rows: List[list],
+    op: str,
+    schedule: Optional[Callable[..., None]]
+) -> None:
+    """
+    Apply the rows of an offer record, some of which have a validity window or conditions.
+    
+    Windows are compared with the clock once, here. An offer whose
+    valid_from is still ahead is only scheduled: at valid_from the scheduler
+    commits it again without valid_from. An offer that is active is set
+    along with its valid_until, and at valid_until the scheduler commits an
+    "expire" (or "expire_chain") record for it. Expired offers are skipped,
+    e.g. when the log is replayed after a restart.
+    
+    Only the process that commits records schedules them (schedule is None
+    elsewhere). Pre-forked workers receive the activation and expiry records
+    from the parent instead.
+    """
+    add, chain = _OFFER_OPS[op]
+    set_offer = offers.set_chain_offer if chain else offers.set_offer
+    now = time.time()
+    for row in rows:
+        if len(row) == 4:
+            set_offer(row[0], row[3], row[1], row[2], add=add)
+            continue
+        target_id, offer_type, offer_value, segments, valid_from, valid_until, min_cart_value, max_discount = (
+            row + _OFFER_ROW_DEFAULTS[len(row) - 4:]
+        )
+        if valid_until is not None and valid_until <= now:
+            continue
+        if valid_from is not None and valid_from > now:
+            if schedule is not None:
+                schedule(valid_from, _activate_offer, row, op)
+            continue
+        set_offer(target_id, segments, offer_type, offer_value, valid_until, add, min_cart_value, max_discount)
+        if valid_until is not None and schedule is not None:
+            expire_row = [target_id, offer_type, offer_value, segments, valid_until]
+            if len(row) > 6:
+                expire_row += row[6:]
+            schedule(valid_until, _commit_scheduled, {
+                "op": "expire_chain" if chain else "expire", "rows": [expire_row]
+            })
+
+
+def _activate_offer(row: list, op: str = "offers") -> None:
+    """Commit a scheduled offer whose valid_from has come."""
+    _commit_scheduled({"op": op, "rows": [row[:4] + [None] + row[5:]]})
+
+
+def _commit_scheduled(record: Dict[str, Any]) -> None:
+    """Commit a record for a scheduled action, through scheduled_commit when it is set."""
+    (scheduled_commit or _commit)(record)
+
+
+def _offer_row(offer: tuple, chain: bool = False) -> Tuple[Optional[list], Optional[str], str]:
+    """
+    Build the record row for a validated offer.
+    
+    Args:
+        offer: Values validated by validate_offer, or by validate_chain_offer
+            when chain is set
+        chain: Whether the offer is set for a chain
+    
+    Returns:
+        (row, None, op), or (None, error, op) when the validity window or the
+        conditions are not usable; op is the record op for the offer's mode
+    """
+    (target_id, offer_type, offer_value, segments, valid_from, valid_until, mode,
+     min_cart_value, max_discount) = offer
+    if chain:
+        op = "add_chain_offers" if mode == 'add' else "chain_offers"
+    else:
+        op = "add_offers" if mode == 'add' else "offers"
+    if not all(math.isfinite(value) for value in (valid_from, valid_until) if value is not None):
+        return None, "valid_from and valid_until must be finite", op
+    if valid_until is not None:
+        if valid_from is not None and valid_until <= valid_from:
+            return None, "valid_until must be after valid_from", op
+        if valid_until <= time.time():
+            return None, "valid_until must be in the future", op
+    if not all(math.isfinite(value) for value in (min_cart_value, max_discount) if value is not None):
+        return None, "min_cart_value and max_discount must be finite", op
+    if max_discount is not None and offer_type_code(offer_type) == FLATX_CODE:
+        return None, "max_discount applies to FLAT% offers only", op
+    row = [target_id, offer_type, offer_value, segments]
+    if min_cart_value or max_discount is not None:
+        row += [valid_from, valid_until, min_cart_value, max_discount]
+    elif valid_from is not None or valid_until is not None:
+        row += [valid_from, valid_until]
+    return row, None, op
+
+
+def _dumped_offer_rows(target_id: Any, offers: Dict[str, Any]) -> Iterator[Tuple[bool, list]]:
+    """
+    Yield (added, row) for the rows that rebuild a restaurant's or chain's
+    offers: one row per distinct offer, listing every segment it applies to.
+    Rows with added set hold further offers of segments with several, to be
+    added once the first is set.
+    """
+    segments_by_offer: Dict[tuple, List[str]] = {}
+    for segment, offer in offers.items():
+        members = offer if isinstance(offer, list) else [offer]
+        for position, member in enumerate(members):
+            key = (position > 0, member['offer_type'], member['offer_value'], member.get('valid_until'),
+                   member.get('min_cart_value', 0), member.get('max_discount'))
+            segments_by_offer.setdefault(key, []).append(segment)
+    for (added, offer_type, offer_value, valid_until, min_cart_value, max_discount), segments in (
+        segments_by_offer.items()
+    ):
+        row = [target_id, offer_type, offer_value, segments]
+        if min_cart_value or max_discount is not None:
+            row += [None, valid_until, min_cart_value, max_discount]
+        elif valid_until is not None:
+            row += [None, valid_until]
+        yield added, row
+
+
+def dump_records() -> Iterator[Dict[str, Any]]:
+    """Yield records that rebuild the current offers, chains and user segments."""
+    return _dump_records(offers_db, user_segments_db, offer_scheduler.pending())
+
+
+def _dump_records(
+    offers_db: OfferTable,
+    user_segments_db: Union[Dict[int, str], SegmentStore],
+    scheduled: Iterable[tuple]
+) -> Iterator[Dict[str, Any]]:
+    """Yield records that rebuild offer and segment tables and (due, action, args) scheduled actions."""
+    memberships = [[restaurant_id, chain_id] for restaurant_id, chain_id in offers_db.memberships()]
+    for start in range(0, len(memberships), DUMP_CHUNK_SIZE):
+        yield {"op": "chains", "rows": memberships[start:start + DUMP_CHUNK_SIZE]}
+    
+    rows: List[list] = []
+    # Rows of the other offer ops, yielded after the restaurants' offers
+    later_rows: Dict[str, List[list]] = {"add_offers": [], "chain_offers": [], "add_chain_offers": []}
+    # Chain outlets' own offers only; they inherit the rest again
+    for restaurant_id, offers in offers_db.items(inherited=False):
+        for added, row in _dumped_offer_rows(restaurant_id, offers):
+            (later_rows["add_offers"] if added else rows).append(row)
+        if len(rows) >= DUMP_CHUNK_SIZE:
+            yield {"op": "offers", "rows": rows}
+            rows = []
+    for chain_id, offers in offers_db.chain_items():
+        for added, row in _dumped_offer_rows(chain_id, offers):
+            later_rows["add_chain_offers" if added else "chain_offers"].append(row)
+    # Offers waiting for their valid_from
+    for _, action, args in scheduled:
+        if action is _activate_offer:
+            row, op = args
+            (rows if op == "offers" else later_rows[op]).append(row)
+    if rows:
+        yield {"op": "offers", "rows": rows}
+    for op, op_rows in later_rows.items():
+        for start in range(0, len(op_rows), DUMP_CHUNK_SIZE):
+            yield {"op": op, "rows": op_rows[start:start + DUMP_CHUNK_SIZE]}
+    
+    rows = []
+    for user_id, segment in list(user_segments_db.items()):
+        rows.append([user_id, segment])
+        if len(rows) >= DUMP_CHUNK_SIZE:
+            yield {"op": "segments", "rows": rows}
+            rows = []
+    if rows:
+        yield {"op": "segments", "rows": rows}
+
+
+def _commit(record: Dict[str, Any]) -> None:
+    """Apply a write record and pass it to the write listeners."""
+    if commit_forwarder is not None:
+        commit_forwarder(record)
+        return
+    with _commit_lock:
+        apply_record(record)
+        for listener in write_listeners:
+            listener(record)
+    if persistence is not None:
+        persistence.sync()
+
+
+def enable_persistence(
+    data_dir: str,
+    fsync_policy: str = FSYNC_INTERVAL,
+    fsync_interval: float = 0.05,
+    snapshot_interval: float = 300.0
+) -> Dict[str, Any]:
+    """
+    Recover state from data_dir and log every later write to it.
+    
+    Args:
+        data_dir: Directory for the snapshot and write-ahead log
+        fsync_policy: 'always', 'interval' or 'never'
+        fsync_interval: Seconds between fsyncs for the 'interval' policy
+        snapshot_interval: Seconds between compacted snapshots (0 disables)
+    
+    Returns:
+        Recovery statistics
+    """
+    global persistence
+    manager = Persistence(data_dir, apply_record, dump_records,
+                          fsync_policy, fsync_interval, snapshot_interval)
+    stats = manager.recover()
+    with _commit_lock:
+        write_listeners.append(manager.log)
+        persistence = manager
+    manager.start()
+    return stats
+
+
+def disable_persistence() -> None:
+    """Stop logging writes and close the write-ahead log."""
+    global persistence
+    with _commit_lock:
+        manager, persistence = persistence, None
+        if manager is not None:
+            write_listeners.remove(manager.log)
+    if manager is not None:
+        manager.close()
+
+
+def attach_snapshot(path: str, poll_interval: float = 1.0) -> Dict[str, Any]:
+    """
+    Serve a memory-mapped snapshot as read-only base state.
+    
+    Offers and segments written to this process take precedence over the
+    snapshot. Worker processes that attach the same file share one copy of
+    it, and replacing the file (see mmap_snapshot.write_snapshot) is picked
+    up within poll_interval seconds.
+    
+    Args:
+        path: Snapshot file written by mmap_snapshot
+        poll_interval: Seconds between checks for a replaced file (0 disables)
+    
+    Returns:
+        Sizes of the mapped snapshot
+    """
+    global mapped_snapshot
+    source = SnapshotSource(path, poll_interval)
+    previous, mapped_snapshot = mapped_snapshot, source
+    offers_db.base = source
+    if previous is not None:
+        previous.close()
+    return source.current.stats()
+
+
+def detach_snapshot() -> None:
+    """Stop serving the memory-mapped snapshot."""
+    global mapped_snapshot
+    source, mapped_snapshot = mapped_snapshot, None
+    offers_db.base = None
+    if source is not None:
+        source.close()
+
+
+def reload_data(path: str) -> Dict[str, Any]:
+    """
+    Replace the offers, chains and user segments with those of a file, while serving requests.
+    
+    The file holds write records, one JSON object per line, as written by
+    dump_records, e.g. the snapshot.ndjson of a DATA_DIR; lines without an
+    "op", such as a snapshot header, are skipped. New tables are built from
+    it in the calling thread while requests are served from the current
+    ones. Writes committed meanwhile are applied to the current tables and
+    kept aside, and once the file is read they are applied to the new tables
+    too. The last few of them are applied under the commit lock, and the new
+    tables are switched in. Readers never wait; writers wait for that last
+    step only (the swap pause).
+    
+    Scheduled offer activations and expiries are replaced by those of the
+    new data, and change feed clients resync from a snapshot. With
+    persistence the new state is written as the snapshot before it is
+    switched in, so it is durable by the time the reload returns.
+    
+    Args:
+        path: File of write records
+    
+    Returns:
+        Reload statistics: record counts, table sizes, build time and swap pause
+    
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If a line is not a valid record; the current tables are
+            left as they are
+    """
+    global user_segments_db
+    start = time.perf_counter()
+    offers = OfferTable(base=offers_db.base, shards=offers_db.shard_count)
+    segment_store: Union[Dict[int, str], SegmentStore] = (
+        SegmentStore(dense_limit=user_segments_db.dense_limit) if isinstance(user_segments_db, SegmentStore) else {}
+    )
+    scheduled: List[tuple] = []
+    schedule = None
+    if commit_forwarder is None:
+        def schedule(due: float, action: Callable[..., Any], *args: Any) -> None:
+            scheduled.append((due, action, args))
+    # Writes committed during the build
+    pending: List[Dict[str, Any]] = []
+    listener = pending.append
+    with fork_lock or nullcontext(), _commit_lock:
+        write_listeners.append(listener)
+    
+    def catch_up(replayed: int) -> int:
+        """Apply pending writes after the first replayed ones to the new tables, in rounds until few are left."""
+        for _ in range(RELOAD_CATCH_UP_ROUNDS):
+            end = len(pending)
+            if end - replayed <= RELOAD_CATCH_UP_WRITES:
+                break
+            for record in pending[replayed:end]:
+                _apply_record(record, offers, segment_store, None, schedule)
+            replayed = end
+        return replayed
+    
+    manager = persistence
+    try:
+        records = 0
+        with open(path, 'rb') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if 'op' not in record:
+                        continue
+                    _apply_record(record, offers, segment_store, None, schedule)
+                except (ValueError, TypeError, KeyError) as e:
+                    raise ValueError(f"{path} line {number}: {e}") from None
+                records += 1
+        # Catch up with the writes committed meanwhile before taking the
+        # lock, so only the last few are applied during the swap pause
+        replayed = catch_up(0)
+        
+        # No other snapshot may be written until the new tables are in place
+        with manager.snapshot_lock if manager is not None else nullcontext():
+            if manager is not None:
+                # Write the new state as the snapshot before it is served, so a
+                # crash never brings back the old state once writes were made
+                # to the new one. The WAL is cut where the pending writes are:
+                # those before it are in the snapshot, and those after it are
+                # replayed on recovery as they are here
+                with fork_lock or nullcontext(), _commit_lock:
+                    cut = len(pending)
+                    lsn = manager.wal.rotate()
+                for record in pending[replayed:cut]:
+                    _apply_record(record, offers, segment_store, None, schedule)
+                manager.snapshot(_dump_records(offers, segment_store, scheduled), lsn)
+                replayed = catch_up(cut)
+            build_seconds = time.perf_counter() - start
+            
+            with fork_lock or nullcontext(), _commit_lock:
+                pause_start = time.perf_counter()
+                write_listeners.remove(listener)
+                for record in pending[replayed:]:
+                    _apply_record(record, offers, segment_store, None, schedule)
+                offers_db.replace_contents(offers)
+                user_segments_db = segment_store
+                segment_changes.reset()
+                if schedule is not None:
+                    offer_scheduler.clear()
+                    for due, action, args in scheduled:
+                        offer_scheduler.schedule(due, action, *args)
+                swap_pause = time.perf_counter() - pause_start
+    finally:
+        with fork_lock or nullcontext(), _commit_lock:
+            if listener in write_listeners:
+                write_listeners.remove(listener)
+    stats = {
+        "path": path,
+        "records": records,
+        "replayed_writes": len(pending),
+        "restaurants": len(offers_db),
+        "users": len(segment_store),
+        "build_seconds": round(build_seconds, 6),
+        "swap_pause_seconds": round(swap_pause, 6)
+    }
+    for reload_listener in reload_listeners:
+        reload_listener(stats)
+    return stats
+
+
+def start_reload(path: str) -> bool:
+    """
+    Run reload_data in a background thread.
+    
+    The outcome is kept in last_reload: the statistics of reload_data, or
+    {"path": ..., "error": ...} if it failed.
+    
+    Returns:
+        False if a reload is already running, True otherwise
+    """
+    global _reload_thread
+    with _reload_lock:
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return False
+        
+        def run():
+            global last_reload
+            try:
+                last_reload = reload_data(path)
+            except Exception as e:
+                last_reload = {"path": path, "error": str(e)}
+            print(f"Reload: {json.dumps(last_reload)}", flush=True)
+        
+        _reload_thread = threading.Thread(target=run, name='reload', daemon=True)
+        _reload_thread.start()
+        return True
+
+
+def reload_running() -> bool:
+    """Whether a reload started by start_reload is still running."""
+    thread = _reload_thread
+    return thread is not None and thread.is_alive()
+
+
+def set_pricing_engine(engine: str, rounding: str = ROUND_HALF_UP) -> None:
+    """
+    Choose how apply_offer computes discounts.
+    
+    Args:
+        engine: 'float' (pricing.py, rounds results with round(..., 2)) or
+            'paise' (paise.py, exact integer paise)
+        rounding: Rounding mode of FLAT% discounts for the paise engine
+    
+    Raises:
+        ValueError: If engine or rounding is not known
+    """
+    global pricing_engine, discounts, batch_discounts
+    discounts, batch_discounts = discount_tables(engine, rounding)
+    pricing_engine = engine
+
+
+def enable_profiling(sample_rate: float = 0.0, allow_header: bool = True) -> RequestProfiler:
+    """
+    Start profiling selected requests.
+    
+    Until this is called no request pays for profiling. Profiled stacks are
+    downloaded from GET /admin/profile.
+    
+    Args:
+        sample_rate: Fraction of requests profiled at random (0 to 1)
+        allow_header: Also profile requests sent with an X-Profile header
+    
+    Returns:
+        The new profiler (stacks from a previous one are discarded)
+    """
+    global profiler
+    new_profiler = RequestProfiler(sample_rate, allow_header)
+    disable_profiling()
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app, new_profiler)
+    profiler = new_profiler
+    return new_profiler
+
+
+def disable_profiling() -> None:
+    """Stop profiling requests and discard the profiled stacks."""
+    global profiler
+    _remove_middleware(ProfilingMiddleware)
+    profiler = None
+
+
+def enable_rate_limiting(
+    default: Optional[Budget] = None,
+    routes: Optional[Dict[str, Budget]] = None,
+    exempt: Iterable[str] = DEFAULT_EXEMPT,
+    client_header: Optional[str] = None
+) -> RateLimiter:
+    """
+    Shed requests over per-client, per-route token-bucket budgets.
+    
+    The limiter is installed outside the other middleware, so a shed request
+    gets its 429 before anything else looks at it. Shed requests are counted
+    in the requests_shed gauge of /metrics rather than by route.
+    
+    Args:
+        default: (rate, burst) of each client on routes without a budget of
+            their own, or None to leave those routes unlimited
+        routes: {path: (rate, burst)} budgets of particular routes
+        exempt: Paths that are never limited
+        client_header: Trusted request header that identifies a client
+            (set by a gateway, e.g. 'X-Client-Id'), or None to identify
+            clients by their address
+    
+    Returns:
+        The new limiter (buckets of a previous one are discarded)
+    """
+    global rate_limiter
+    new_limiter = RateLimiter(default, routes, exempt)
+    disable_rate_limiting()
+    app.wsgi_app = RateLimitMiddleware(app.wsgi_app, new_limiter, client_header)
+    rate_limiter = new_limiter
+    return new_limiter
+
+
+def disable_rate_limiting() -> None:
+    """Stop limiting requests."""
+    global rate_limiter
+    _remove_middleware(RateLimitMiddleware)
+    rate_limiter = None
+
+
+def _remove_middleware(middleware_type: type) -> None:
+    """Take the middleware of a type out of the app's chain, wherever it is."""
+    parent = None
+    current = app.wsgi_app
+    while isinstance(current, (MetricsMiddleware, ProfilingMiddleware, RateLimitMiddleware)):
+        if isinstance(current, middleware_type):
+            if parent is None:
+                app.wsgi_app = current.wsgi_app
+            else:
+                parent.wsgi_app = current.wsgi_app
+            return
+        parent = current
+        current = current.wsgi_app
+
+
+def _get_segment(user_id: Any) -> Optional[str]:
+    """Segment for a user, falling back to the mapped snapshot."""
+    segment = user_segments_db.get(user_id)
+    if segment is None and mapped_snapshot is not None:
+        segment = mapped_snapshot.get(user_id)
+    return segment
+
+
+def _segment_etag(segment: str) -> str:
+    """ETag of a user segment response; it depends only on the segment."""
+    return f'segment-{segment}'
+
+
+def _offers_etag(row_version: Any) -> str:
+    """ETag of a restaurant's offers, from the version of its OfferTable row."""
+    if isinstance(row_version, int):
+        return f'offers-{offers_db.epoch}-{row_version}'
+    return f'offers-{row_version}'
+
+
+def _raw_json(body: bytes, status: int = 200):
+    """Response for a body that is already encoded JSON (see responses.py)."""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+
+def _cart_value_response(cart_value: Any):
+    """Response for an apply_offer result, rendered without the JSON encoder when possible."""
+    body = encode_cart_value(cart_value)
+    if body is None:
+        return jsonify({"cart_value": cart_value}), 200
+    return _raw_json(body)
+
+
+def _conditional_response(body: Dict[str, Any], etag: str):
+    """
+    Build a 200 response carrying an ETag, or a bodiless 304 when the
+    request's If-None-Match already names that ETag.
+    """
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(body)
+    response.set_etag(etag)
+    return response
+
+
+def _changes_response(
+    feed: ChangeFeed,
+    since: int,
+    limit: int,
+    cursor: Optional[int],
+    current: Callable[[Any], Dict[str, Any]],
+    snapshot_page: Callable[[int, int], Optional[Tuple[List[Dict[str, Any]], Optional[int]]]]
+):
+    """
+    Build one page of a change feed endpoint.
+    
+    Args:
+        feed: ChangeFeed of the data set
+        since: Version the client has synced up to
+        limit: Largest number of changes in a delta page
+        cursor: Position of the snapshot page to serve, or None
+        current: Maps a changed key to its change entry with the current value
+        snapshot_page: Maps (cursor, limit) to (entries, next_cursor), with
+            next_cursor None on the last page, or to None when cursor is out
+            of range
+    """
+    result = feed.since(since, limit) if cursor is None else None
+    if result is not None:
+        changes, latest = result
+        version = changes[-1][0] if changes else since
+        # A key changed several times in the page is sent once
+        keys = dict.fromkeys(key for _, key in changes)
+        return jsonify({
+            "epoch": offers_db.epoch,
+            "version": version,
+            "snapshot": False,
+            "has_more": version < latest,
+            "changes": [current(key) for key in keys]
+        }), 200
+    
+    if cursor is None:
+        # Writes made while the pages are fetched are also in the deltas
+        # after this version, so the client catches up on them
+        cursor = 0
+        since = feed.version
+    page = snapshot_page(cursor, limit)
+    if page is None:
+        return jsonify({"error": "cursor is out of range"}), 400
+    changes, next_cursor = page
+    return jsonify({
+        "epoch": offers_db.epoch,
+        "version": since,
+        "snapshot": True,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+        "changes": changes
+    }), 200
+
+
+def _buffered(stream) -> io.BufferedIOBase:
+    """
+    Wrap a request stream in a read buffer.
+    
+    WSGI input streams are unbuffered, so iterating them directly would read
+    the body one byte at a time while looking for newlines.
+    """
+    if isinstance(stream, io.BufferedIOBase):
+        return stream
+    return io.BufferedReader(stream, buffer_size=STREAM_BUFFER_BYTES)
+
+
+def _iter_ndjson(stream) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """
+    Parse an NDJSON stream one line at a time without buffering the body.
+    
+    Blank lines are skipped but still counted, so line numbers match the
+    uploaded file.
+    
+    Yields:
+        (line_number, parsed_object, None) for lines that parse, otherwise
+        (line_number, None, error_message)
+    """
+    for line_number, raw_line in enumerate(_buffered(stream), start=1):
+        if not raw_line.strip():
+            continue
+        try:
+            yield line_number, json.loads(raw_line), None
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+
+
+def _iter_csv(stream) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """
+    Parse a headerless or headed CSV stream one row at a time.
+    
+    Rows are returned as dicts keyed by the header, or by CSV_SEGMENT_FIELDS
+    when the first row is not a header. Values are left as strings.
+    
+    Yields:
+        (line_number, row_dict, None) for well-formed rows, otherwise
+        (line_number, None, error_message)
+    """
+    text_stream = io.TextIOWrapper(_buffered(stream), encoding='utf-8', newline='')
+    fields = CSV_SEGMENT_FIELDS
+    for line_number, row in enumerate(csv.reader(text_stream), start=1):
+        if not row or not any(value.strip() for value in row):
+            continue
+        if line_number == 1 and set(value.strip() for value in row) >= set(CSV_SEGMENT_FIELDS):
+            fields = tuple(value.strip() for value in row)
+            continue
+        if len(row) != len(fields):
+            yield line_number, None, f"Expected {len(fields)} columns, got {len(row)}"
+            continue
+        yield line_number, dict(zip(fields, (value.strip() for value in row))), None
+
+
+def _bulk_report(accepted: int, rejected: int, errors: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the per-line report returned by bulk endpoints."""
+    return {
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "errors_truncated": rejected > len(errors)
+    }
 
 
 @app.route('/api/v1/offer', methods=['POST'])
@@ -26,51 +940,297 @@ def add_offer():
         "restaurant_id": 1,
         "offer_type": "FLATX",  # or "FLAT%"
         "offer_value": 10,
-        "customer_segment": ["p1"]
+        "customer_segment": ["p1"],
+        "valid_from": 1767254400,    # optional, Unix seconds
+        "valid_until": 1767261600,   # optional, Unix seconds
+        "mode": "replace",           # optional, or "add"
+        "min_cart_value": 300,       # optional, smallest cart the offer applies to
+        "max_discount": 100          # optional, cap on a FLAT% discount
+    }
+    
+    An offer with valid_from in the future is stored but applies only from
+    then on; an offer with valid_until is removed then.
+    
+    By default the offer replaces the segments' offers. With mode "add" it
+    runs alongside them, and each cart gets whichever offer is best for it,
+    e.g. the highest tier of a campaign of offers with min_cart_value.
+    """
+    try:
+        data = request.json
+        
+        offer, error = validate_offer(data)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        row, error, op = _offer_row(offer)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        # Add offers for each segment
+        _commit({"op": op, "rows": [row]})
+        
+        return _raw_json(SUCCESS_BODY)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/offer', methods=['GET'])
+def get_offers():
+    """
+    Get the offers a restaurant has for each customer segment.
+    
+    Query params:
+    - restaurant_id: integer
+    
+    Response body:
+    {
+        "restaurant_id": 1,
+        "offers": {"p1": {"offer_type": "FLATX", "offer_value": 10.0}}
+    }
+    
+    The response carries an ETag that changes whenever the restaurant's
+    offers change; send it back in If-None-Match to get a 304 instead.
+    """
+    try:
+        params, error = validate_restaurant_id_param(request.args)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        restaurant_id = params[0]
+        
+        versioned = offers_db.get_versioned_offers(restaurant_id)
+        if versioned is None:
+            return jsonify({"error": "No offers found"}), 404
+        row_version, offers = versioned
+        
+        return _conditional_response({"restaurant_id": restaurant_id, "offers": offers}, _offers_etag(row_version))
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/offers/changes', methods=['GET'])
+def get_offer_changes():
+    """
+    Get the restaurants whose offers changed after a catalog version.
+    
+    Query params:
+    - since: catalog version the client has synced up to (0 for everything)
+    - limit: optional, largest number of changes in one page (default 1000)
+    - cursor: optional, next_cursor of the previous snapshot page
+    
+    Response body:
+    {
+        "epoch": "17f0c3a2b4d5e6f7",
+        "version": 42,
+        "snapshot": false,
+        "has_more": false,
+        "changes": [{"restaurant_id": 1, "offers": {"p1": {...}}}]
+    }
+    
+    Delta pages list each restaurant changed after since, with its current
+    offers; version is the catalog version the client is synced to after
+    applying the page. While has_more is true, ask again with since=version.
+    
+    When since has aged out of the change ring, is ahead of the catalog
+    (e.g. from before a restart) or the catalog was cleared, the response is
+    a snapshot instead: pages of every restaurant, one table shard per page.
+    The client replaces its mirror with the union of the pages, fetching
+    next pages with since=version&cursor=next_cursor, and then continues with
+    delta pages from version. Restaurants served from an attached mmap
+    snapshot are not part of the feed.
+    """
+    try:
+        params, error = validate_changes_param(request.args)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        since, limit, cursor = params
+        limit = min(limit, MAX_CHANGES_PAGE)
+        
+        def snapshot_page(cursor: int, limit: int):
+            if cursor >= offers_db.shard_count:
+                return None
+            changes = [
+                {"restaurant_id": restaurant_id, "offers": offers}
+                for restaurant_id, offers in offers_db.items(shard=cursor)
+            ]
+            return changes, cursor + 1 if cursor + 1 < offers_db.shard_count else None
+        
+        return _changes_response(
+            offers_db.changes, since, limit, cursor,
+            lambda restaurant_id: {"restaurant_id": restaurant_id, "offers": offers_db.get_offers(restaurant_id)},
+            snapshot_page
+        )
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/offer/bulk', methods=['POST'])
+def add_offers_bulk():
+    """
+    Bulk-import offers from an NDJSON request body.
+    
+    Each line is an add_offer payload. The body is read incrementally, lines
+    are validated and applied in chunks of BULK_CHUNK_SIZE, and invalid lines
+    are reported instead of aborting the import.
+    
+    Request body (application/x-ndjson):
+        {"restaurant_id": 1, "offer_type": "FLATX", "offer_value": 10, "customer_segment": ["p1"]}
+        {"restaurant_id": 2, "offer_type": "FLAT%", "offer_value": 5, "customer_segment": ["p2", "p3"]}
+    
+    Response body:
+    {
+        "accepted": 2,
+        "rejected": 0,
+        "errors": [],          # [{"line": 3, "error": "..."}], capped at MAX_BULK_ERRORS
+        "errors_truncated": false
+    }
+    """
+    try:
+        accepted = 0
+        rejected = 0
+        errors: List[Dict[str, Any]] = []
+        chunk: List[tuple] = []
+        chunk_op = "offers"
+        
+        for line_number, data, error in _iter_ndjson(request.stream):
+            if error is None:
+                if not isinstance(data, dict):
+                    error = "Line must be a JSON object"
+                else:
+                    offer, validation_error = validate_offer(data)
+                    if validation_error:
+                        error = validation_error[0]
+                    else:
+                        try:
+                            hash(offer[0])
+                        except TypeError:
+                            error = "restaurant_id must be a scalar value"
+                        else:
+                            row, error, op = _offer_row(offer)
+            if error is not None:
+                rejected += 1
+                if len(errors) < MAX_BULK_ERRORS:
+                    errors.append({"line": line_number, "error": error})
+                continue
+            
+            # Lines are applied in order, so a change of mode ends the chunk
+            if op != chunk_op and chunk:
+                _commit({"op": chunk_op, "rows": chunk})
+                accepted += len(chunk)
+                chunk = []
+            chunk_op = op
+            chunk.append(row)
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                _commit({"op": chunk_op, "rows": chunk})
+                accepted += len(chunk)
+                chunk = []
+        
+        if chunk:
+            _commit({"op": chunk_op, "rows": chunk})
+            accepted += len(chunk)
+        
+        return jsonify(_bulk_report(accepted, rejected, errors)), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/chain/offer', methods=['POST'])
+def add_chain_offer():
+    """
+    Add offer to a chain for customer segments.
+    
+    Request body: an add_offer payload with "chain_id" in place of
+    "restaurant_id", e.g.
+    {
+        "chain_id": 7,
+        "offer_type": "FLAT%",
+        "offer_value": 10,
+        "customer_segment": ["p1", "p2"]
     }
+    
+    The offer applies to every outlet of the chain, except for segments
+    where the outlet has an offer of its own.
     """
     try:
         data = request.json
         
-        restaurant_id = data.get('restaurant_id')
-        offer_type = data.get('offer_type')
-        offer_value = data.get('offer_value')
-        customer_segments = data.get('customer_segment', [])
+        offer, error = validate_chain_offer(data)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        row, error, op = _offer_row(offer, chain=True)
+        if error:
+            return jsonify({"error": error}), 400
         
-        # Validate required fields
-        if not all([restaurant_id, offer_type, offer_value, customer_segments]):
-            return jsonify({"error": "Missing required fields"}), 400
+        _commit({"op": op, "rows": [row]})
         
-        # Validate offer_type
-        if offer_type not in ['FLATX', 'FLAT%']:
-            return jsonify({"error": "Invalid offer_type. Must be 'FLATX' or 'FLAT%'"}), 400
+        return _raw_json(SUCCESS_BODY)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/chain/outlets', methods=['POST'])
+def set_chain_outlets():
+    """
+    Make restaurants outlets of a chain.
+    
+    Request body:
+    {
+        "chain_id": 7,             # omit or null to leave their chains
+        "restaurant_ids": [1, 2, 3]
+    }
+    
+    An outlet keeps its own offers, which win over the chain's.
+    """
+    try:
+        data = request.json
         
-        # Validate offer_value
-        try:
-            offer_value = float(offer_value)
-            if offer_value < 0:
-                return jsonify({"error": "offer_value must be non-negative"}), 400
-        except (ValueError, TypeError):
-            return jsonify({"error": "offer_value must be a number"}), 400
+        params, error = validate_chain_outlets(data)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        restaurant_ids, chain_id = params
+        if type(restaurant_ids) is not list or any(type(value) in (list, dict) for value in restaurant_ids):
+            return jsonify({"error": "restaurant_ids must be a list of restaurant ids"}), 400
+        if type(chain_id) in (list, dict):
+            return jsonify({"error": "chain_id must be a single id"}), 400
         
-        # Validate customer segments
-        valid_segments = ['p1', 'p2', 'p3']
-        for segment in customer_segments:
-            if segment not in valid_segments:
-                return jsonify({"error": f"Invalid segment: {segment}. Must be one of {valid_segments}"}), 400
+        _commit({"op": "chains", "rows": [[restaurant_id, chain_id] for restaurant_id in restaurant_ids]})
         
-        # Initialize restaurant offers if not exists
-        if restaurant_id not in offers_db:
-            offers_db[restaurant_id] = {}
+        return _raw_json(SUCCESS_BODY)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/chain', methods=['GET'])
+def get_chain():
+    """
+    Get a chain's offers and outlets.
+    
+    Query params:
+    - chain_id: integer
+    
+    Response body:
+    {
+        "chain_id": 7,
+        "offers": {"p1": {"offer_type": "FLAT%", "offer_value": 10.0}},
+        "restaurant_ids": [1, 2, 3]
+    }
+    """
+    try:
+        params, error = validate_chain_id_param(request.args)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        chain_id = params[0]
         
-        # Add offers for each segment
-        for segment in customer_segments:
-            offers_db[restaurant_id][segment] = {
-                'offer_type': offer_type,
-                'offer_value': offer_value
-            }
+        offers = offers_db.get_chain_offers(chain_id)
+        restaurant_ids = offers_db.chain_outlets(chain_id)
+        if offers is None and not restaurant_ids:
+            return jsonify({"error": "Chain not found"}), 404
         
-        return jsonify({"response_msg": "success"}), 200
+        return jsonify({"chain_id": chain_id, "offers": offers or {}, "restaurant_ids": restaurant_ids})
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -91,58 +1251,111 @@ def apply_offer():
     try:
         data = request.json
         
-        cart_value = data.get('cart_value')
-        user_id = data.get('user_id')
-        restaurant_id = data.get('restaurant_id')
-        
-        # Validate required fields
-        if not all([cart_value, user_id, restaurant_id]):
-            return jsonify({"error": "Missing required fields"}), 400
-        
-        # Validate cart_value
-        try:
-            cart_value = float(cart_value)
-            if cart_value < 0:
-                return jsonify({"error": "cart_value must be non-negative"}), 400
-        except (ValueError, TypeError):
-            return jsonify({"error": "cart_value must be a number"}), 400
+        cart, error = validate_cart(data)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        cart_value, user_id, restaurant_id = cart
         
         # Get user segment
-        segment = user_segments_db.get(user_id)
+        segment = _get_segment(user_id)
         if not segment:
-            return jsonify({"error": "User segment not found"}), 404
+            return _raw_json(USER_SEGMENT_NOT_FOUND_BODY, 404)
         
-        # Check if restaurant has offers
-        if restaurant_id not in offers_db:
+        # Get offer for this restaurant and segment
+        offer = offers_db.lookup(restaurant_id, segment)
+        if offer is not None and offer.choices is not None:
+            # Several offers or conditions: find the best one for this cart
+            offer = offer.choices[bisect_right(offer.thresholds, cart_value)]
+        if offer is None:
             # No offer available, return original cart value
-            return jsonify({"cart_value": cart_value}), 200
+            return _cart_value_response(cart_value)
         
-        # Check if segment has offer for this restaurant
-        restaurant_offers = offers_db[restaurant_id]
-        if segment not in restaurant_offers:
-            # No offer for this segment, return original cart value
-            return jsonify({"cart_value": cart_value}), 200
+        # Calculate discounted cart value
+        final_cart_value = discounts[offer.type_code](cart_value, offer.value, offer.max_discount)
         
-        # Get offer details
-        offer = restaurant_offers[segment]
-        offer_type = offer['offer_type']
-        offer_value = offer['offer_value']
+        return _cart_value_response(final_cart_value)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/cart/apply_offer/batch', methods=['POST'])
+def apply_offer_batch():
+    """
+    Apply offers to many carts in a single request.
+    
+    Carts are grouped by (restaurant_id, segment) so each offer is looked up
+    once and applied to the whole group in bulk. Results match the
+    single-cart endpoint exactly.
+    
+    Request body:
+    {
+        "carts": [
+            {"cart_value": 200, "user_id": 1, "restaurant_id": 1},
+            {"cart_value": 150, "user_id": 2, "restaurant_id": 1}
+        ]
+    }
+    
+    Response body has one entry per cart, in request order. Each entry is
+    either {"cart_value": ...} or {"error": ..., "status_code": ...} carrying
+    the status the single-cart endpoint would have returned.
+    """
+    try:
+        data = request.json
         
-        # Calculate discounted cart value
-        if offer_type == 'FLATX':
-            # Flat amount off
-            final_cart_value = max(0, cart_value - offer_value)
-        elif offer_type == 'FLAT%':
-            # Flat percentage off
-            discount_amount = (cart_value * offer_value) / 100
-            final_cart_value = max(0, cart_value - discount_amount)
-        else:
-            return jsonify({"error": "Invalid offer type"}), 500
+        carts = data.get('carts')
+        if not isinstance(carts, list) or not carts:
+            return jsonify({"error": "carts must be a non-empty list"}), 400
+        if len(carts) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"carts must contain at most {MAX_BATCH_SIZE} entries"}), 400
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(carts)
+        
+        # Group valid carts by (restaurant_id, segment)
+        groups: Dict[tuple, Tuple[List[int], List[float]]] = {}
+        for index, cart_data in enumerate(carts):
+            if not isinstance(cart_data, dict):
+                results[index] = {"error": "cart must be an object", "status_code": 400}
+                continue
+            cart, error = validate_cart(cart_data)
+            if error:
+                results[index] = {"error": error[0], "status_code": error[1]}
+                continue
+            cart_value, user_id, restaurant_id = cart
+            try:
+                segment = _get_segment(user_id)
+                if not segment:
+                    results[index] = {"error": "User segment not found", "status_code": 404}
+                    continue
+                indices, values = groups.setdefault((restaurant_id, segment), ([], []))
+            except TypeError as e:
+                # Unhashable ids fail the same way they do on the single-cart endpoint
+                results[index] = {"error": str(e), "status_code": 500}
+                continue
+            indices.append(index)
+            values.append(cart_value)
         
-        # Round to 2 decimal places
-        final_cart_value = round(final_cart_value, 2)
+        # Apply each group's offer over its cart values in bulk
+        for (restaurant_id, segment), (indices, values) in groups.items():
+            offer = offers_db.lookup(restaurant_id, segment)
+            if offer is None:
+                # No offer available, return original cart values
+                final_values = values
+            elif offer.choices is None:
+                final_values = batch_discounts[offer.type_code](values, offer.value, offer.max_discount)
+            else:
+                # Several offers or conditions: find the best one for each cart
+                thresholds, choices = offer.thresholds, offer.choices
+                single = discounts
+                final_values = [
+                    value if best is None else single[best.type_code](value, best.value, best.max_discount)
+                    for value in values
+                    for best in (choices[bisect_right(thresholds, value)],)
+                ]
+            for index, final_cart_value in zip(indices, final_values):
+                results[index] = {"cart_value": final_cart_value}
         
-        return jsonify({"cart_value": final_cart_value}), 200
+        return jsonify({"results": results}), 200
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -155,23 +1368,21 @@ def get_user_segment():
     
     Query params:
     - user_id: integer
+    
+    The response carries an ETag; send it back in If-None-Match to get a
+    304 while the segment is unchanged.
     """
     try:
-        user_id = request.args.get('user_id')
-        
-        if not user_id:
-            return jsonify({"error": "Missing user_id parameter"}), 400
-        
-        try:
-            user_id = int(user_id)
-        except ValueError:
-            return jsonify({"error": "user_id must be an integer"}), 400
+        params, error = validate_user_id_param(request.args)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        user_id = params[0]
         
-        segment = user_segments_db.get(user_id)
+        segment = _get_segment(user_id)
         if not segment:
             return jsonify({"error": "User segment not found"}), 404
         
-        return jsonify({"segment": segment}), 200
+        return _conditional_response({"segment": segment}, _segment_etag(segment))
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -191,30 +1402,340 @@ def set_user_segment():
     try:
         data = request.json
         
-        user_id = data.get('user_id')
-        segment = data.get('segment')
+        user_segment, error = validate_user_segment(data)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        user_id, segment = user_segment
+        
+        _commit({"op": "segments", "rows": [[user_id, segment]]})
+        
+        return _raw_json(SUCCESS_BODY)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/user_segments/changes', methods=['GET'])
+def get_user_segment_changes():
+    """
+    Get the users whose segment changed after a version.
+    
+    Query params and paging are the same as for /api/v1/offers/changes.
+    Each change is {"user_id": 1, "segment": "p1"}, and snapshot pages list
+    up to limit users each. Users served from an attached mmap snapshot are
+    not part of the feed.
+    """
+    try:
+        params, error = validate_changes_param(request.args)
+        if error:
+            return jsonify({"error": error[0]}), error[1]
+        since, limit, cursor = params
+        limit = min(limit, MAX_CHANGES_PAGE)
+        
+        def snapshot_page(cursor: int, limit: int):
+            # Pages resume at the cursor in O(limit) and hold no lock
+            store = user_segments_db
+            if isinstance(store, SegmentStore):
+                rows, next_cursor = store.page(cursor, limit)
+            else:
+                keys = _segment_keys_of(store, refresh=cursor == 0)
+                rows = [(user_id, store.get(user_id)) for user_id in keys[cursor:cursor + limit]]
+                next_cursor = cursor + limit if cursor + limit < len(keys) else None
+            changes = [{"user_id": user_id, "segment": segment} for user_id, segment in rows if segment is not None]
+            return changes, next_cursor
+        
+        return _changes_response(
+            segment_changes, since, limit, cursor,
+            lambda user_id: {"user_id": user_id, "segment": user_segments_db.get(user_id)},
+            snapshot_page
+        )
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _segment_keys_of(store: Dict[int, str], refresh: bool) -> List[Any]:
+    """
+    Get the user ids of a dict segment store in insertion order.
+    
+    The shared list is reused while it belongs to the store, and listed again
+    when it does not, or when refresh is set (at the first page of a
+    snapshot) and the store has grown. Later pages of a snapshot thus cost
+    O(limit) even while users are added.
+    """
+    global _segment_keys
+    store_id, reset_version, keys = _segment_keys
+    if store_id != id(store) or reset_version != segment_changes.reset_version or (refresh and len(keys) != len(store)):
+        # One C-level call, so writers cannot change the dict while it runs
+        keys = list(store)
+        _segment_keys = (id(store), segment_changes.reset_version, keys)
+    return keys
+
+
+def _upsert_segments(rows: List[tuple], errors: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+    """
+    Validate and upsert a batch of (line_number, data) rows.
+    
+    Rejected rows are appended to errors (up to MAX_BULK_ERRORS).
+    
+    Returns:
+        (inserted, updated, rejected) counts for the batch
+    """
+    inserted = updated = rejected = 0
+    upserts: List[list] = []
+    seen = set()
+    for line_number, data in rows:
+        user_segment, error = validate_bulk_user_segment(data)
+        if error is None:
+            user_id = user_segment[0]
+            if user_id in seen or user_id in user_segments_db:
+                updated += 1
+            else:
+                inserted += 1
+            seen.add(user_id)
+            upserts.append(list(user_segment))
+            continue
+        rejected += 1
+        if len(errors) < MAX_BULK_ERRORS:
+            errors.append({"line": line_number, "error": error[0]})
+    if upserts:
+        _commit({"op": "segments", "rows": upserts})
+    return inserted, updated, rejected
+
+
+@app.route('/api/v1/user_segment/bulk', methods=['POST'])
+def set_user_segments_bulk():
+    """
+    Bulk upsert user segments from a CSV or NDJSON request body.
+    
+    The body is read incrementally and rows are validated and upserted in
+    batches of BULK_CHUNK_SIZE. Invalid rows are reported, not fatal.
+    
+    Request body (text/csv, header row optional):
+        user_id,segment
+        1,p1
+        2,p2
+    
+    Request body (application/x-ndjson):
+        {"user_id": 1, "segment": "p1"}
+        {"user_id": 2, "segment": "p2"}
+    
+    Response body:
+    {
+        "inserted": 2,
+        "updated": 0,
+        "rejected": 0,
+        "errors": [],          # [{"line": 3, "error": "..."}], capped at MAX_BULK_ERRORS
+        "errors_truncated": false
+    }
+    """
+    try:
+        is_csv = request.mimetype == 'text/csv'
+        rows = _iter_csv(request.stream) if is_csv else _iter_ndjson(request.stream)
+        
+        inserted = updated = rejected = 0
+        errors: List[Dict[str, Any]] = []
+        batch: List[tuple] = []
+        
+        for line_number, data, error in rows:
+            if error is None and not isinstance(data, dict):
+                error = "Line must be a JSON object"
+            if error is not None:
+                rejected += 1
+                if len(errors) < MAX_BULK_ERRORS:
+                    errors.append({"line": line_number, "error": error})
+                continue
+            
+            if is_csv:
+                try:
+                    data['user_id'] = int(data.get('user_id'))
+                except (ValueError, TypeError):
+                    pass
+            batch.append((line_number, data))
+            if len(batch) >= BULK_CHUNK_SIZE:
+                counts = _upsert_segments(batch, errors)
+                inserted, updated, rejected = inserted + counts[0], updated + counts[1], rejected + counts[2]
+                batch = []
+        
+        if batch:
+            counts = _upsert_segments(batch, errors)
+            inserted, updated, rejected = inserted + counts[0], updated + counts[1], rejected + counts[2]
         
-        if not all([user_id, segment]):
-            return jsonify({"error": "Missing required fields"}), 400
+        # Parse errors are reported as they stream in, validation errors per batch
+        errors.sort(key=lambda error: error["line"])
+        return jsonify({
+            "inserted": inserted,
+            "updated": updated,
+            "rejected": rejected,
+            "errors": errors,
+            "errors_truncated": rejected > len(errors)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Request and store metrics in the Prometheus text format.
+    
+    Includes per-route request counts by status code, requests in flight,
+    latency histograms with estimated p50/p99/p999, and the number of
+    restaurants and users held in memory. Each process reports its own
+    requests.
+    """
+    gauges = [
+        ('restaurants', 'Restaurants with offers held in memory.', len(offers_db)),
+        ('user_segments', 'Users with a segment held in memory.', len(user_segments_db)),
+    ]
+    limiter = rate_limiter
+    if limiter is not None:
+        gauges.append(('requests_shed', 'Requests shed by rate limiting.', limiter.shed))
+    source = mapped_snapshot
+    if source is not None:
+        gauges.append(('snapshot_restaurants', 'Restaurants in the mapped snapshot.',
+                       source.current.stats()['restaurants']))
+    return app.response_class(request_metrics.render(gauges), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profiling():
+    """
+    Start profiling requests (admin endpoint).
+    
+    Request body (optional):
+    {
+        "sample_rate": 0.01,   # fraction of requests profiled at random, default 0
+        "allow_header": true   # also profile requests sent with X-Profile: 1, default true
+    }
+    """
+    try:
+        data = request.get_json(silent=True) or {}
         
-        valid_segments = ['p1', 'p2', 'p3']
-        if segment not in valid_segments:
-            return jsonify({"error": f"Invalid segment. Must be one of {valid_segments}"}), 400
+        try:
+            sample_rate = float(data.get('sample_rate', 0))
+        except (ValueError, TypeError):
+            return jsonify({"error": "sample_rate must be a number"}), 400
+        if not 0 <= sample_rate <= 1:
+            return jsonify({"error": "sample_rate must be between 0 and 1"}), 400
+        allow_header = data.get('allow_header', True)
+        if not isinstance(allow_header, bool):
+            return jsonify({"error": "allow_header must be a boolean"}), 400
         
-        user_segments_db[user_id] = segment
+        enable_profiling(sample_rate, allow_header)
+        return jsonify({"sample_rate": sample_rate, "allow_header": allow_header}), 200
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/admin/profile', methods=['GET'])
+def download_profile():
+    """
+    Download the profiled stacks (admin endpoint).
+    
+    The body is in the collapsed-stack format read by flamegraph.pl and
+    speedscope, one "frame;frame;frame microseconds" line per call stack.
+    The X-Profiled-Requests header holds the number of requests included.
+    """
+    current = profiler
+    if current is None:
+        return jsonify({"error": "Profiling is not enabled"}), 404
+    response = app.response_class(current.collapsed(), mimetype='text/plain')
+    response.headers['Content-Disposition'] = 'attachment; filename=profile.collapsed'
+    response.headers['X-Profiled-Requests'] = str(current.requests)
+    return response
+
+
+@app.route('/admin/profile', methods=['DELETE'])
+def stop_profiling():
+    """Stop profiling requests and discard the profiled stacks (admin endpoint)."""
+    disable_profiling()
+    return _raw_json(SUCCESS_BODY)
+
+
+@app.route('/admin/reload', methods=['POST'])
+def start_reload_endpoint():
+    """
+    Start replacing the offers and user segments with those of RELOAD_PATH (admin endpoint).
+    
+    The file is the one configured at startup; requests cannot name
+    another, so callers cannot make the service read arbitrary files.
+    
+    Responds 202 once the build has started in the background; GET
+    /admin/reload reports the outcome.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
         
-        return jsonify({"response_msg": "success"}), 200
+        if 'path' in data:
+            return jsonify({"error": "path cannot be set by a request; reloads read RELOAD_PATH"}), 400
+        if not reload_path:
+            return jsonify({"error": "RELOAD_PATH is not set"}), 400
+        if commit_forwarder is not None:
+            return jsonify({"error": "Pre-forked workers reload with the parent: send it SIGUSR1"}), 400
+        if not start_reload(reload_path):
+            return jsonify({"error": "A reload is already running"}), 409
+        return jsonify({"status": "started", "path": reload_path}), 202
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/admin/reload', methods=['GET'])
+def get_reload_status():
+    """Report whether a reload is running and how the last one went (admin endpoint)."""
+    return jsonify({"running": reload_running(), "last": last_reload})
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
-    return jsonify({"status": "healthy"}), 200
+    return _raw_json(HEALTHY_BODY)
+
+
+def configure_from_env() -> None:
+    """Set up persistence, the mapped snapshot, profiling, pricing, rate limiting and reloads from environment variables."""
+    global reload_path
+    # Set DATA_DIR to persist offers and segments across restarts
+    if os.environ.get('DATA_DIR'):
+        recovery = enable_persistence(
+            os.environ['DATA_DIR'],
+            fsync_policy=os.environ.get('FSYNC_POLICY', FSYNC_INTERVAL),
+            fsync_interval=float(os.environ.get('FSYNC_INTERVAL', '0.05')),
+            snapshot_interval=float(os.environ.get('SNAPSHOT_INTERVAL', '300'))
+        )
+        print(f"Recovered state from {os.environ['DATA_DIR']}: {json.dumps(recovery)}")
+    # Set PROFILE_SAMPLE_RATE and/or PROFILE_HEADER=1 to profile requests
+    sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    allow_header = os.environ.get('PROFILE_HEADER') == '1'
+    if sample_rate or allow_header:
+        enable_profiling(sample_rate, allow_header)
+    # Set MMAP_SNAPSHOT to serve a snapshot built with mmap_snapshot.py
+    if os.environ.get('MMAP_SNAPSHOT'):
+        mapped = attach_snapshot(os.environ['MMAP_SNAPSHOT'],
+                                 poll_interval=float(os.environ.get('SNAPSHOT_POLL_INTERVAL', '1')))
+        print(f"Mapped snapshot: {json.dumps(mapped)}")
+    # Set PRICING_ENGINE=paise to compute discounts in integer paise
+    if os.environ.get('PRICING_ENGINE'):
+        set_pricing_engine(os.environ['PRICING_ENGINE'], os.environ.get('PRICING_ROUNDING', ROUND_HALF_UP))
+    # Set RATE_LIMIT=rate:burst and/or RATE_LIMIT_ROUTES=path=rate:burst,... to shed requests over budget,
+    # and RATE_LIMIT_CLIENT_HEADER to identify clients by a header a gateway sets instead of their address
+    if os.environ.get('RATE_LIMIT') or os.environ.get('RATE_LIMIT_ROUTES'):
+        enable_rate_limiting(
+            parse_budget(os.environ['RATE_LIMIT']) if os.environ.get('RATE_LIMIT') else None,
+            parse_route_budgets(os.environ.get('RATE_LIMIT_ROUTES', '')),
+            client_header=os.environ.get('RATE_LIMIT_CLIENT_HEADER') or None
+        )
+    # Set RELOAD_PATH to reload offers and segments from that file on SIGUSR1
+    if os.environ.get('RELOAD_PATH'):
+        reload_path = os.environ['RELOAD_PATH']
+        signal.signal(signal.SIGUSR1, lambda signum, frame: start_reload(reload_path))
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    configure_from_env()
+    # The reloader would run a second process against the same data directory
+    app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=persistence is None)
 
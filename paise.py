@@ -0,0 +1,235 @@
+"""
+Integer-paise discount computation for Zomato cart offers.
+
+The float functions in pricing compute in rupees and round the result with
+round(..., 2), which works on the binary value: 0.045 is stored as
+0.04499..., so it rounds down. This module holds money as integer paise
+(minor units) and FLAT% values as integer basis points (hundredths of a
+percent), so every step is exact and the only rounding is the one the
+rounding mode defines: FLAT% discounts are cart_paise * basis_points / 10000,
+rounded with that mode. FLATX discounts and caps are already whole paise.
+
+Rounding modes, applied to the FLAT% discount amount:
+
+    HALF_UP     ties round up (the customer gets the extra paisa); default
+    HALF_EVEN   ties round to the even paisa
+    DOWN        toward zero (smaller discount)
+    UP          away from zero (larger discount)
+
+Amounts in rupees are converted with to_paise and to_basis_points, which
+round to the nearest unit; values with at most 2 decimal places convert
+exactly. Results convert back with from_paise, which gives the float
+closest to the decimal value, so 8794 paise is exactly the float 87.94.
+
+discount_tables() builds tables with the signatures of pricing.DISCOUNTS and
+pricing.BATCH_DISCOUNTS that compute in paise, which is how the service
+switches engines (PRICING_ENGINE=paise, see mock_service.set_pricing_engine).
+Amounts with no paise value (infinities and NaN) are left to the float
+functions there, and a result of zero is the int 0, as the float functions
+return it. Batch functions also exist over array('q') of paise.
+
+Compared with the float engine across the cases of test_cart_offers.py the
+results are identical. They differ by one paisa only where the exact
+discount ends in half a paisa (or more than 2 decimal places are given): the
+float engine rounds whichever way the binary value falls, this module
+rounds as its mode says. See test_paise.py.
+"""
+from array import array
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from pricing import BATCH_DISCOUNTS as FLOAT_BATCH_DISCOUNTS, DISCOUNTS as FLOAT_DISCOUNTS
+
+
+ROUND_HALF_UP = 'HALF_UP'
+ROUND_HALF_EVEN = 'HALF_EVEN'
+ROUND_DOWN = 'DOWN'
+ROUND_UP = 'UP'
+ROUNDING_MODES = (ROUND_HALF_UP, ROUND_HALF_EVEN, ROUND_DOWN, ROUND_UP)
+
+# Pricing engines the service can use
+ENGINE_FLOAT = 'float'
+ENGINE_PAISE = 'paise'
+PRICING_ENGINES = (ENGINE_FLOAT, ENGINE_PAISE)
+
+PAISE_PER_RUPEE = 100
+# A FLAT% value of 100 percent, in basis points
+FULL_PERCENT = 10000
+
+# Added to the numerator before flooring, for the modes that need no remainder
+_ROUNDING_OFFSETS = {
+    ROUND_HALF_UP: FULL_PERCENT // 2,
+    ROUND_DOWN: 0,
+    ROUND_UP: FULL_PERCENT - 1,
+}
+
+
+def to_paise(amount: float) -> int:
+    """Convert rupees to the nearest whole paise."""
+    return round(amount * PAISE_PER_RUPEE)
+
+
+def to_basis_points(percent: float) -> int:
+    """Convert a percentage to the nearest whole basis point."""
+    return round(percent * 100)
+
+
+def from_paise(paise: int) -> float:
+    """Convert paise to rupees, as the float closest to the decimal value."""
+    return paise / PAISE_PER_RUPEE
+
+
+def _check_rounding(rounding: str) -> None:
+    if rounding not in ROUNDING_MODES:
+        raise ValueError(f"Invalid rounding mode: {rounding}")
+
+
+def percent_discount(cart_paise: int, basis_points: int, rounding: str = ROUND_HALF_UP) -> int:
+    """
+    Amount a FLAT% offer takes off a cart, in paise.
+
+    Raises:
+        ValueError: If rounding is not a known rounding mode
+    """
+    numerator = cart_paise * basis_points
+    offset = _ROUNDING_OFFSETS.get(rounding)
+    if offset is not None:
+        return (numerator + offset) // FULL_PERCENT
+    _check_rounding(rounding)
+    quotient, remainder = divmod(numerator, FULL_PERCENT)
+    if 2 * remainder > FULL_PERCENT or (2 * remainder == FULL_PERCENT and quotient & 1):
+        quotient += 1
+    return quotient
+
+
+def flatx(cart_paise: int, amount_paise: int) -> int:
+    """Flat amount off, clamped at 0."""
+    return cart_paise - amount_paise if cart_paise > amount_paise else 0
+
+
+def flat_percent(
+    cart_paise: int,
+    basis_points: int,
+    max_discount_paise: Optional[int] = None,
+    rounding: str = ROUND_HALF_UP
+) -> int:
+    """Flat percentage off, at most max_discount_paise, clamped at 0."""
+    discount = percent_discount(cart_paise, basis_points, rounding)
+    if max_discount_paise is not None and discount > max_discount_paise:
+        discount = max_discount_paise
+    return cart_paise - discount if cart_paise > discount else 0
+
+
+def _flatx_values(cart_paise: Sequence[int], amount_paise: int) -> List[int]:
+    return [value - amount_paise if value > amount_paise else 0 for value in cart_paise]
+
+
+def _flat_percent_values(
+    cart_paise: Sequence[int],
+    basis_points: int,
+    max_discount_paise: Optional[int],
+    rounding: str
+) -> List[int]:
+    offset = _ROUNDING_OFFSETS.get(rounding)
+    if offset is None:
+        return [flat_percent(value, basis_points, max_discount_paise, rounding) for value in cart_paise]
+    discounts = [(value * basis_points + offset) // FULL_PERCENT for value in cart_paise]
+    if max_discount_paise is not None:
+        discounts = [discount if discount < max_discount_paise else max_discount_paise for discount in discounts]
+    return [value - discount if value > discount else 0 for value, discount in zip(cart_paise, discounts)]
+
+
+def flatx_batch(cart_paise: Sequence[int], amount_paise: int) -> array:
+    """Flat amount off for many carts, as array('q') of paise."""
+    return array('q', _flatx_values(cart_paise, amount_paise))
+
+
+def flat_percent_batch(
+    cart_paise: Sequence[int],
+    basis_points: int,
+    max_discount_paise: Optional[int] = None,
+    rounding: str = ROUND_HALF_UP
+) -> array:
+    """
+    Flat percentage off for many carts, as array('q') of paise.
+
+    Results are identical to flat_percent for each cart.
+    """
+    return array('q', _flat_percent_values(cart_paise, basis_points, max_discount_paise, rounding))
+
+
+def discount_tables(engine: str = ENGINE_PAISE, rounding: str = ROUND_HALF_UP) -> Tuple[tuple, tuple]:
+    """
+    Discount tables for an engine, indexed by offer type code.
+
+    Both engines' functions take and return rupees like pricing.DISCOUNTS
+    and pricing.BATCH_DISCOUNTS, so callers switch engines by swapping
+    tables.
+
+    Returns:
+        (discounts, batch_discounts)
+
+    Raises:
+        ValueError: If engine or rounding is not known
+    """
+    if engine == ENGINE_FLOAT:
+        return FLOAT_DISCOUNTS, FLOAT_BATCH_DISCOUNTS
+    if engine != ENGINE_PAISE:
+        raise ValueError(f"Invalid pricing engine: {engine}")
+    _check_rounding(rounding)
+
+    float_flatx, float_flat_percent = FLOAT_DISCOUNTS
+    float_flatx_batch, float_flat_percent_batch = FLOAT_BATCH_DISCOUNTS
+
+    def flatx_rupees(cart_value: float, offer_value: float, max_discount: Optional[float] = None) -> float:
+        try:
+            result = flatx(round(cart_value * PAISE_PER_RUPEE), round(offer_value * PAISE_PER_RUPEE))
+        except (OverflowError, ValueError):
+            return float_flatx(cart_value, offer_value, max_discount)
+        return result / PAISE_PER_RUPEE if result else 0
+
+    def flat_percent_rupees(cart_value: float, offer_value: float, max_discount: Optional[float] = None) -> float:
+        try:
+            result = flat_percent(
+                round(cart_value * PAISE_PER_RUPEE),
+                round(offer_value * 100),
+                None if max_discount is None else round(max_discount * PAISE_PER_RUPEE),
+                rounding
+            )
+        except (OverflowError, ValueError):
+            return float_flat_percent(cart_value, offer_value, max_discount)
+        return result / PAISE_PER_RUPEE if result else 0
+
+    def flatx_rupees_batch(
+        cart_values: Sequence[float],
+        offer_value: float,
+        max_discount: Optional[float] = None
+    ) -> List[float]:
+        try:
+            paise = _flatx_values([round(value * PAISE_PER_RUPEE) for value in cart_values], to_paise(offer_value))
+        except (OverflowError, ValueError):
+            return float_flatx_batch(cart_values, offer_value, max_discount)
+        return [value / PAISE_PER_RUPEE if value else 0 for value in paise]
+
+    def flat_percent_rupees_batch(
+        cart_values: Sequence[float],
+        offer_value: float,
+        max_discount: Optional[float] = None
+    ) -> List[float]:
+        try:
+            paise = _flat_percent_values(
+                [round(value * PAISE_PER_RUPEE) for value in cart_values],
+                to_basis_points(offer_value),
+                None if max_discount is None else to_paise(max_discount),
+                rounding
+            )
+        except (OverflowError, ValueError):
+            return float_flat_percent_batch(cart_values, offer_value, max_discount)
+        return [value / PAISE_PER_RUPEE if value else 0 for value in paise]
+
+    # In pricing.OFFER_TYPES order
+    discounts: Tuple[Callable[[float, float, Optional[float]], float], ...] = (flatx_rupees, flat_percent_rupees)
+    batch_discounts: Tuple[Callable[[Sequence[float], float, Optional[float]], List[float]], ...] = (
+        flatx_rupees_batch,
+        flat_percent_rupees_batch
+    )
+    return discounts, batch_discounts
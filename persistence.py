@@ -0,0 +1,388 @@
+"""
+Write-ahead log and snapshot persistence for the Zomato cart offer mock service.
+
+Every write the service commits is appended to a write-ahead log (WAL) as one
+JSON line tagged with a log sequence number (LSN). A background flusher
+thread writes pending records in groups, so concurrent writers share a single
+write() and fsync() (group commit). How often the log is fsynced is set by the
+fsync policy:
+
+    always    - writers wait until their record is fsynced
+    interval  - the log is fsynced every fsync_interval seconds (default)
+    never     - records are written but fsync is left to the OS
+
+Periodically the full state is written to a compacted snapshot, and WAL
+segments older than the snapshot are deleted. On startup the latest snapshot
+is loaded and only the WAL tail after it is replayed.
+
+Directory layout:
+
+    snapshot.ndjson              {"lsn": N, ...} header, then one record per line
+    wal-<first lsn>.log          {"lsn": N, "op": ..., ...} per line
+"""
+import glob
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+FSYNC_ALWAYS = 'always'
+FSYNC_INTERVAL = 'interval'
+FSYNC_NEVER = 'never'
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+SNAPSHOT_FILE = 'snapshot.ndjson'
+WAL_PATTERN = 'wal-*.log'
+
+
+def _wal_path(directory: str, first_lsn: int) -> str:
+    """Path of the WAL segment whose first record has first_lsn."""
+    return os.path.join(directory, f'wal-{first_lsn:020d}.log')
+
+
+def _wal_first_lsn(path: str) -> int:
+    """First LSN of a WAL segment, from its file name."""
+    return int(os.path.basename(path)[len('wal-'):-len('.log')])
+
+
+def _fsync_directory(directory: str) -> None:
+    """Make file creations and renames in directory durable."""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _read_records(path: str) -> Iterable[Dict[str, Any]]:
+    """
+    Read JSON records from a snapshot file.
+
+    Stops at the first line that does not parse.
+    """
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+class WriteAheadLog:
+    """Append-only, segmented record log with group commit."""
+
+    def __init__(
+        self,
+        directory: str,
+        fsync_policy: str = FSYNC_INTERVAL,
+        fsync_interval: float = 0.05,
+        last_lsn: int = 0
+    ):
+        """
+        Open a new WAL segment and start the flusher thread.
+
+        Args:
+            directory: Directory holding WAL segments
+            fsync_policy: 'always', 'interval' or 'never'
+            fsync_interval: Seconds between fsyncs for the 'interval' policy
+            last_lsn: LSN of the last record already in the log
+
+        Raises:
+            ValueError: If fsync_policy is not valid
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy: {fsync_policy}. Must be one of {list(FSYNC_POLICIES)}")
+        self.directory = directory
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._cond = threading.Condition()
+        # Held while writing to the current segment, so rotation never
+        # interleaves with a flush
+        self._io_lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self._last_lsn = last_lsn
+        self._durable_lsn = last_lsn
+        self._closed = False
+        self._file = open(_wal_path(directory, last_lsn + 1), 'ab')
+        self._flusher = threading.Thread(target=self._run, name='wal-flusher', daemon=True)
+        self._flusher.start()
+
+    @property
+    def last_lsn(self) -> int:
+        """LSN of the last appended record."""
+        return self._last_lsn
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """
+        Queue a record for the flusher.
+
+        Returns:
+            The record's LSN
+        """
+        body = json.dumps(record, separators=(',', ':'))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write-ahead log is closed")
+            self._last_lsn += 1
+            lsn = self._last_lsn
+            self._pending.append(f'{{"lsn":{lsn},{body[1:]}\n'.encode('utf-8'))
+            self._cond.notify()
+        return lsn
+
+    def wait(self, lsn: int) -> None:
+        """Block until the record with lsn has been flushed per the fsync policy."""
+        with self._cond:
+            while self._durable_lsn < lsn and not self._closed:
+                self._cond.wait()
+
+    def _flush(self, force_fsync: bool = False) -> bool:
+        """
+        Write all pending records to the current segment. Caller holds _io_lock.
+
+        Returns:
+            True if anything was written and not yet fsynced
+        """
+        with self._cond:
+            batch, self._pending = self._pending, []
+            upto = self._last_lsn
+        if batch:
+            self._file.write(b''.join(batch))
+            self._file.flush()
+            if self.fsync_policy == FSYNC_ALWAYS or force_fsync:
+                os.fsync(self._file.fileno())
+                batch = None
+        with self._cond:
+            self._durable_lsn = max(self._durable_lsn, upto)
+            self._cond.notify_all()
+        return bool(batch)
+
+    def _run(self) -> None:
+        """Flusher loop: group pending records into one write (and fsync)."""
+        last_fsync = time.monotonic()
+        unsynced = False
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._cond.wait(self.fsync_interval)
+                if self._closed and not self._pending:
+                    return
+            with self._io_lock:
+                unsynced = self._flush() or unsynced
+                if (self.fsync_policy == FSYNC_INTERVAL and unsynced
+                        and time.monotonic() - last_fsync >= self.fsync_interval):
+                    os.fsync(self._file.fileno())
+                    last_fsync = time.monotonic()
+                    unsynced = False
+
+    def rotate(self) -> int:
+        """
+        Flush and close the current segment and start a new one.
+
+        Returns:
+            LSN of the last record in the closed segment
+        """
+        with self._io_lock:
+            self._flush(force_fsync=True)
+            upto = self._durable_lsn
+            self._file.close()
+            self._file = open(_wal_path(self.directory, upto + 1), 'ab')
+        return upto
+
+    def close(self) -> None:
+        """Flush, fsync and close the log."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        with self._io_lock:
+            self._flush(force_fsync=True)
+            self._file.close()
+
+
+class Persistence:
+    """WAL plus periodic compacted snapshots for the service state."""
+
+    def __init__(
+        self,
+        directory: str,
+        apply_record: Callable[[Dict[str, Any]], None],
+        dump_records: Callable[[], Iterable[Dict[str, Any]]],
+        fsync_policy: str = FSYNC_INTERVAL,
+        fsync_interval: float = 0.05,
+        snapshot_interval: float = 300.0
+    ):
+        """
+        Initialize persistence for a data directory.
+
+        Args:
+            directory: Data directory (created if missing)
+            apply_record: Applies one record to the in-memory state
+            dump_records: Yields records that rebuild the current state
+            fsync_policy: 'always', 'interval' or 'never'
+            fsync_interval: Seconds between fsyncs for the 'interval' policy
+            snapshot_interval: Seconds between snapshots; 0 disables the
+                background snapshot thread
+
+        Raises:
+            ValueError: If fsync_policy is not valid
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy: {fsync_policy}. Must be one of {list(FSYNC_POLICIES)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.apply_record = apply_record
+        self.dump_records = dump_records
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.wal: Optional[WriteAheadLog] = None
+        self.snapshot_lsn = 0
+        self.last_recovery: Dict[str, Any] = {}
+        self.last_snapshot: Dict[str, Any] = {}
+        # Held while a snapshot is written; hold it to keep other snapshots
+        # from being written meanwhile
+        self.snapshot_lock = threading.RLock()
+        self._stop = threading.Event()
+        self._snapshotter: Optional[threading.Thread] = None
+
+    def recover(self) -> Dict[str, Any]:
+        """
+        Load the latest snapshot, replay the WAL tail and open the WAL.
+
+        Returns:
+            Recovery statistics: record counts and elapsed seconds
+        """
+        start = time.perf_counter()
+        snapshot_records = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            records = iter(_read_records(snapshot_path))
+            header = next(records, {})
+            self.snapshot_lsn = header.get('lsn', 0)
+            for record in records:
+                self.apply_record(record)
+                snapshot_records += 1
+        snapshot_seconds = time.perf_counter() - start
+
+        last_lsn = self.snapshot_lsn
+        wal_records = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, WAL_PATTERN)), key=_wal_first_lsn):
+            with open(path, 'rb+') as f:
+                valid_bytes = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_bytes += len(line)
+                    lsn = record.pop('lsn', 0)
+                    if lsn <= last_lsn:
+                        continue
+                    self.apply_record(record)
+                    last_lsn = lsn
+                    wal_records += 1
+                # Drop a record torn by a crash, so new appends stay readable
+                f.truncate(valid_bytes)
+
+        self.wal = WriteAheadLog(self.directory, self.fsync_policy, self.fsync_interval, last_lsn)
+        self.last_recovery = {
+            "snapshot_lsn": self.snapshot_lsn,
+            "snapshot_records": snapshot_records,
+            "wal_records": wal_records,
+            "last_lsn": last_lsn,
+            "snapshot_seconds": round(snapshot_seconds, 6),
+            "total_seconds": round(time.perf_counter() - start, 6)
+        }
+        return self.last_recovery
+
+    def log(self, record: Dict[str, Any]) -> int:
+        """Append a committed record to the WAL and return its LSN."""
+        return self.wal.append(record)
+
+    def sync(self) -> None:
+        """With the 'always' policy, wait until everything logged so far is fsynced."""
+        if self.fsync_policy == FSYNC_ALWAYS:
+            self.wal.wait(self.wal.last_lsn)
+
+    def snapshot(
+        self,
+        records: Optional[Iterable[Dict[str, Any]]] = None,
+        lsn: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Write a compacted snapshot and drop the WAL segments it covers.
+
+        Records up to the rotation point are already applied to memory, so
+        the dump contains at least everything up to that LSN. Later writes
+        that also make it into the dump are replayed again on recovery,
+        which is harmless because records are upserts.
+
+        Args:
+            records: Records of the state to write instead of dump_records(),
+                e.g. a state about to replace the current one
+            lsn: LSN the records include everything up to, with the WAL
+                rotated just after it (see WriteAheadLog.rotate); by default
+                the WAL is rotated now
+
+        Returns:
+            Snapshot statistics: LSN, record count and elapsed seconds
+        """
+        with self.snapshot_lock:
+            start = time.perf_counter()
+            if lsn is None:
+                lsn = self.wal.rotate()
+            if records is None:
+                records = self.dump_records()
+            path = os.path.join(self.directory, SNAPSHOT_FILE)
+            tmp_path = path + '.tmp'
+            count = 0
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps({"lsn": lsn, "created": time.time()}).encode('utf-8') + b'\n')
+                for record in records:
+                    f.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+                    count += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            _fsync_directory(self.directory)
+            self.snapshot_lsn = lsn
+
+            for wal_path in glob.glob(os.path.join(self.directory, WAL_PATTERN)):
+                if _wal_first_lsn(wal_path) <= lsn:
+                    os.remove(wal_path)
+
+            self.last_snapshot = {
+                "lsn": lsn,
+                "records": count,
+                "seconds": round(time.perf_counter() - start, 6)
+            }
+            return self.last_snapshot
+
+    def start(self) -> None:
+        """Start the background snapshot thread."""
+        if self.snapshot_interval <= 0 or self._snapshotter is not None:
+            return
+        self._snapshotter = threading.Thread(target=self._run_snapshots, name='snapshotter', daemon=True)
+        self._snapshotter.start()
+
+    def _run_snapshots(self) -> None:
+        """Take a snapshot every snapshot_interval seconds if anything changed."""
+        while not self._stop.wait(self.snapshot_interval):
+            if self.wal.last_lsn > self.snapshot_lsn:
+                self.snapshot()
+
+    def close(self) -> None:
+        """Stop the snapshot thread and close the WAL."""
+        self._stop.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        if self.wal is not None:
+            self.wal.close()
@@ -0,0 +1,296 @@
+"""
+Pre-forking multi-process server for the Zomato cart offer mock service.
+
+The parent process opens one listening socket, loads the service state and
+forks worker processes that accept connections from the shared socket, so
+request handling scales with cores instead of being bound by one process.
+
+Writes go through a single-writer channel. A worker that receives a write
+sends the record to the parent over a pipe instead of applying it. The
+parent applies records one at a time (logging them when DATA_DIR is set)
+and broadcasts each one to every worker, so all workers apply the same
+writes in the same order. The worker that sent a record answers its
+request only once the record has been applied locally, so clients read
+their own writes from any worker. Records that the parent's scheduler
+commits to activate and expire timed offers are broadcast the same way.
+
+Signals sent to the parent:
+
+    SIGHUP           graceful restart: fork a new generation of workers from
+                     the parent's current state, then let the old workers
+                     finish their in-flight requests and exit
+    SIGUSR1          with RELOAD_PATH set, reload offers and segments from
+                     it, then restart gracefully
+    SIGTERM, SIGINT  graceful shutdown
+
+Workers that die are replaced. Requires a platform with os.fork().
+
+Usage:
+    python3 prefork.py [--workers 4] [--host 0.0.0.0] [--port 5001]
+"""
+import argparse
+import itertools
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection, Pipe
+from typing import Any, Dict, List, Optional
+
+from werkzeug.serving import make_server
+
+import mock_service
+
+
+# Seconds a draining worker may spend finishing in-flight requests
+DRAIN_TIMEOUT = 30.0
+
+
+class WorkerChannel:
+    """Worker side of the single-writer channel to the parent."""
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self._send_lock = threading.Lock()
+        self._tokens = itertools.count(1)
+        # Records sent by this worker that have not been applied yet
+        self._waiting: Dict[int, List[Any]] = {}
+        self._receiver = threading.Thread(target=self._receive, name='write-receiver', daemon=True)
+
+    def start(self) -> None:
+        """Start applying records broadcast by the parent."""
+        self._receiver.start()
+
+    def commit(self, record: Dict[str, Any]) -> None:
+        """
+        Send a record to the parent and wait until it is applied locally.
+
+        Raises:
+            RuntimeError: If the parent could not apply the record
+        """
+        token = next(self._tokens)
+        done = threading.Event()
+        waiter = [done, None]
+        self._waiting[token] = waiter
+        with self._send_lock:
+            self.conn.send((token, record))
+        done.wait()
+        if waiter[1] is not None:
+            raise RuntimeError(waiter[1])
+
+    def _receive(self) -> None:
+        pid = os.getpid()
+        while True:
+            try:
+                origin, token, record, error = self.conn.recv()
+            except (EOFError, OSError):
+                # The parent is gone; nothing can be written any more
+                os._exit(1)
+            if record is not None:
+                mock_service.apply_record(record)
+            if origin == pid:
+                waiter = self._waiting.pop(token)
+                waiter[1] = error
+                waiter[0].set()
+
+
+class PreforkServer:
+    """Parent process: owns the listening socket, the state and the workers."""
+
+    def __init__(self, app, host: str = '0.0.0.0', port: int = 5001, workers: int = 4):
+        """
+        Bind the listening socket.
+
+        Args:
+            app: WSGI application served by the workers
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            workers: Number of worker processes per generation
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.app = app
+        self.host = host
+        self.workers = workers
+        self.socket = socket.create_server((host, port), backlog=1024)
+        self.socket.set_inheritable(True)
+        self.port = self.socket.getsockname()[1]
+        self.generation = 0
+        # pid -> (generation, parent end of the worker's pipe)
+        self._children: Dict[int, tuple] = {}
+        # Serializes applying and broadcasting records, and forking
+        self._dispatch_lock = threading.Lock()
+        self._restart = threading.Event()
+        self._stopping = threading.Event()
+
+    def _spawn(self) -> int:
+        """Fork one worker of the current generation."""
+        parent_conn, child_conn = Pipe()
+        # Fork under the dispatch lock, so the worker starts from a state that
+        # includes every record broadcast so far and misses none after it
+        with self._dispatch_lock:
+            pid = os.fork()
+            if pid == 0:
+                parent_conn.close()
+                for _, conn in self._children.values():
+                    conn.close()
+                self._run_worker(child_conn)
+            self._children[pid] = (self.generation, parent_conn)
+        child_conn.close()
+        threading.Thread(target=self._relay, args=(pid, parent_conn), name=f'relay-{pid}', daemon=True).start()
+        print(f"worker {pid} started (generation {self.generation})", flush=True)
+        return pid
+
+    def _relay(self, pid: int, conn: Connection) -> None:
+        """Apply records sent by one worker and broadcast them to all workers."""
+        while True:
+            try:
+                token, record = conn.recv()
+            except (EOFError, OSError):
+                return
+            with self._dispatch_lock:
+                try:
+                    mock_service._commit(record)
+                except Exception as e:
+                    self._send(pid, conn, (pid, token, None, str(e)))
+                    continue
+                for child_pid, (_, child_conn) in list(self._children.items()):
+                    self._send(child_pid, child_conn, (pid, token, record, None))
+
+    def _commit_scheduled(self, record: Dict[str, Any]) -> None:
+        """Apply a record committed by the parent's scheduler and broadcast it to all workers."""
+        with self._dispatch_lock:
+            mock_service._commit(record)
+            # No worker waits for it: origin 0 matches no worker's pid
+            for child_pid, (_, child_conn) in list(self._children.items()):
+                self._send(child_pid, child_conn, (0, 0, record, None))
+
+    def _send(self, pid: int, conn: Connection, message: tuple) -> None:
+        try:
+            conn.send(message)
+        except OSError:
+            # The worker exited; it is reaped by the main loop
+            pass
+
+    def _run_worker(self, conn: Connection) -> None:
+        """Serve requests in a forked worker. Never returns."""
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            # Reloads run in the parent; the next generation forks from it
+            signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+            # The parent logs writes; threads such as the WAL flusher and
+            # snapshot watcher do not survive fork
+            mock_service.write_listeners.clear()
+            mock_service.persistence = None
+            if mock_service.mapped_snapshot is not None:
+                source = mock_service.mapped_snapshot
+                mock_service.attach_snapshot(source.path, source.poll_interval)
+            # The parent activates and expires scheduled offers and
+            # broadcasts the records; set the forwarder before any record
+            # arrives, so workers do not schedule them as well
+            mock_service.offer_scheduler.clear()
+            mock_service.scheduled_commit = None
+            mock_service.fork_lock = None
+            mock_service.reload_listeners.clear()
+            channel = WorkerChannel(conn)
+            mock_service.commit_forwarder = channel.commit
+            channel.start()
+
+            server = make_server(self.host, self.port, self.app, threaded=True, fd=self.socket.fileno())
+            # Join request threads on close, so draining waits for in-flight requests
+            server.daemon_threads = False
+            server.block_on_close = True
+
+            def drain(signum, frame):
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                threading.Timer(DRAIN_TIMEOUT, os._exit, args=(1,)).start()
+
+            signal.signal(signal.SIGTERM, drain)
+            server.serve_forever()
+            server.server_close()
+            os._exit(0)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            os._exit(1)
+
+    def _stop_generation(self, generation: Optional[int] = None) -> None:
+        """Ask workers (of one generation, or all) to drain and exit."""
+        for pid, (worker_generation, _) in list(self._children.items()):
+            if generation is None or worker_generation == generation:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def _reap(self) -> None:
+        """Collect exited workers and replace those of the current generation."""
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            with self._dispatch_lock:
+                generation, conn = self._children.pop(pid, (None, None))
+            if conn is None:
+                continue
+            conn.close()
+            print(f"worker {pid} exited with status {os.waitstatus_to_exitcode(status)}", flush=True)
+            if generation == self.generation and not self._stopping.is_set():
+                self._spawn()
+
+    def serve_forever(self) -> None:
+        """Fork the workers and supervise them until SIGTERM or SIGINT."""
+        # Offers activated and expired by the parent's scheduler reach the
+        # workers like their own writes, and are not applied during a fork
+        mock_service.scheduled_commit = self._commit_scheduled
+        # Reloads (SIGUSR1 with RELOAD_PATH) switch tables in between forks,
+        # and a new generation of workers is forked from the reloaded state
+        mock_service.fork_lock = self._dispatch_lock
+        mock_service.reload_listeners.append(lambda stats: self._restart.set())
+        signal.signal(signal.SIGHUP, lambda signum, frame: self._restart.set())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self._stopping.set())
+        print(f"listening on {self.host}:{self.port} with {self.workers} workers", flush=True)
+        for _ in range(self.workers):
+            self._spawn()
+
+        while not self._stopping.is_set():
+            if self._restart.is_set():
+                self._restart.clear()
+                old_generation = self.generation
+                self.generation += 1
+                for _ in range(self.workers):
+                    self._spawn()
+                self._stop_generation(old_generation)
+            self._reap()
+            time.sleep(0.1)
+
+        self._stop_generation()
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while self._children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        self.socket.close()
+        mock_service.disable_persistence()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the mock service with pre-forked workers.")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args(argv)
+
+    mock_service.configure_from_env()
+    PreforkServer(mock_service.app, args.host, args.port, args.workers).serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Discount computation for Zomato cart offers.
+
+Holds the FLATX/FLAT% arithmetic used by the mock service so the single-cart
+and batch endpoints produce identical results. Offer types are identified by
+small integer codes so hot paths can dispatch with a tuple index instead of
+string comparisons.
+
+FLAT% offers may carry a max_discount, capping the amount taken off. FLATX
+offers ignore it.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+OFFER_TYPE_FLATX = 'FLATX'
+OFFER_TYPE_FLAT_PERCENT = 'FLAT%'
+
+# Offer type for each code, and the code for each offer type
+OFFER_TYPES: Tuple[str, ...] = (OFFER_TYPE_FLATX, OFFER_TYPE_FLAT_PERCENT)
+OFFER_TYPE_CODES: Dict[str, int] = {offer_type: code for code, offer_type in enumerate(OFFER_TYPES)}
+FLATX_CODE = OFFER_TYPE_CODES[OFFER_TYPE_FLATX]
+FLAT_PERCENT_CODE = OFFER_TYPE_CODES[OFFER_TYPE_FLAT_PERCENT]
+
+
+def _flatx(cart_value: float, offer_value: float, max_discount: Optional[float] = None) -> float:
+    """Flat amount off, clamped at 0 and rounded to 2 decimal places."""
+    return round(max(0, cart_value - offer_value), 2)
+
+
+def _flat_percent(cart_value: float, offer_value: float, max_discount: Optional[float] = None) -> float:
+    """Flat percentage off, at most max_discount, clamped at 0 and rounded to 2 decimal places."""
+    discount_amount = (cart_value * offer_value) / 100
+    if max_discount is not None and discount_amount > max_discount:
+        discount_amount = max_discount
+    return round(max(0, cart_value - discount_amount), 2)
+
+
+def _flatx_batch(cart_values: Sequence[float], offer_value: float, max_discount: Optional[float] = None) -> List[float]:
+    """Flat amount off for many cart values."""
+    return [round(max(0, value - offer_value), 2) for value in cart_values]
+
+
+def _flat_percent_batch(
+    cart_values: Sequence[float],
+    offer_value: float,
+    max_discount: Optional[float] = None
+) -> List[float]:
+    """Flat percentage off for many cart values."""
+    if max_discount is None:
+        return [round(max(0, value - (value * offer_value) / 100), 2) for value in cart_values]
+    return [round(max(0, value - min((value * offer_value) / 100, max_discount)), 2) for value in cart_values]
+
+
+# Discount functions indexed by offer type code
+DISCOUNTS: Tuple[Callable[[float, float, Optional[float]], float], ...] = (_flatx, _flat_percent)
+BATCH_DISCOUNTS: Tuple[Callable[[Sequence[float], float, Optional[float]], List[float]], ...] = (
+    _flatx_batch,
+    _flat_percent_batch
+)
+
+
+def offer_type_code(offer_type: str) -> int:
+    """
+    Get the integer code for an offer type.
+
+    Raises:
+        ValueError: If offer_type is not a known offer type
+    """
+    try:
+        return OFFER_TYPE_CODES[offer_type]
+    except (KeyError, TypeError):
+        raise ValueError(f"Invalid offer type: {offer_type}") from None
+
+
+def _discount_amount(cart_value: float, type_code: int, offer_value: float, max_discount: Optional[float]) -> float:
+    """Amount an offer takes off a cart, before clamping and rounding."""
+    if type_code == FLATX_CODE:
+        return offer_value
+    discount_amount = (cart_value * offer_value) / 100
+    if max_discount is not None and discount_amount > max_discount:
+        return max_discount
+    return discount_amount
+
+
+def best_offer_tiers(
+    offers: Sequence[Tuple[int, float, float, Optional[float]]]
+) -> Tuple[Tuple[float, ...], Tuple[Optional[int], ...]]:
+    """
+    Precompute which of several concurrent offers is best for any cart value.
+
+    An offer applies to carts of at least its min_cart_value and the best
+    applicable offer is the one that takes the most off. Each offer's
+    discount is constant (FLATX, or a capped FLAT% past its cap) or
+    proportional to the cart value (FLAT%), so the best offer can only
+    change at a min_cart_value, where a FLAT% offer reaches its cap, or
+    where a proportional discount crosses a constant one. Between those
+    points one offer is best throughout; it is found by comparing the offers
+    once, inside each interval. Adjacent intervals with the same best offer
+    are merged, so e.g. a FLATX and a FLAT% offer give a single threshold,
+    the crossover 100 * X / P.
+
+    Args:
+        offers: (offer type code, offer value, min_cart_value, max_discount)
+            tuples, at least one
+
+    Returns:
+        (thresholds, choices): sorted thresholds, and one more choice than
+        thresholds, so that choices[bisect_right(thresholds, cart_value)] is
+        the index of the best offer for cart_value, or None when no offer
+        applies to it
+    """
+    points = {min_cart_value for _, _, min_cart_value, _ in offers if min_cart_value > 0}
+    amounts = [offer_value if type_code == FLATX_CODE else max_discount
+               for type_code, offer_value, _, max_discount in offers]
+    amounts = [amount for amount in amounts if amount is not None]
+    percents = [offer_value for type_code, offer_value, _, _ in offers
+                if type_code != FLATX_CODE and offer_value > 0]
+    for amount in amounts:
+        for percent in percents:
+            points.add(100 * amount / percent)
+    points.discard(0)
+    boundaries = sorted(points)
+
+    def best(cart_value: float) -> Optional[int]:
+        choice = None
+        best_amount = 0.0
+        for index, (type_code, offer_value, min_cart_value, max_discount) in enumerate(offers):
+            if cart_value < min_cart_value:
+                continue
+            amount = _discount_amount(cart_value, type_code, offer_value, max_discount)
+            if choice is None or amount > best_amount:
+                choice = index
+                best_amount = amount
+        return choice
+
+    # One representative cart value inside each interval
+    probes = [(low + high) / 2 for low, high in zip([0.0] + boundaries, boundaries)]
+    probes.append(boundaries[-1] + 1 if boundaries else 1.0)
+
+    thresholds: List[float] = []
+    choices: List[Optional[int]] = [best(probes[0])]
+    for boundary, probe in zip(boundaries, probes[1:]):
+        choice = best(probe)
+        if choice != choices[-1]:
+            thresholds.append(boundary)
+            choices.append(choice)
+    return tuple(thresholds), tuple(choices)
+
+
+def apply_discount(
+    cart_value: float,
+    offer_type: str,
+    offer_value: float,
+    max_discount: Optional[float] = None
+) -> float:
+    """
+    Apply an offer to a single cart value.
+
+    Args:
+        cart_value: Original cart value
+        offer_type: Type of offer ('FLATX' or 'FLAT%')
+        offer_value: Offer value (amount or percentage)
+        max_discount: Optional cap on the amount a FLAT% offer takes off
+
+    Returns:
+        Discounted cart value, clamped at 0 and rounded to 2 decimal places
+
+    Raises:
+        ValueError: If offer_type is not a known offer type
+    """
+    return DISCOUNTS[offer_type_code(offer_type)](cart_value, offer_value, max_discount)
+
+
+def apply_discount_batch(
+    cart_values: Sequence[float],
+    offer_type: str,
+    offer_value: float,
+    max_discount: Optional[float] = None
+) -> List[float]:
+    """
+    Apply one offer to many cart values.
+
+    The offer type is branched on once for the whole batch instead of once
+    per cart. Each result is computed with the same expression as
+    apply_discount, so results are bit-for-bit identical.
+
+    Args:
+        cart_values: Original cart values
+        offer_type: Type of offer ('FLATX' or 'FLAT%')
+        offer_value: Offer value (amount or percentage)
+        max_discount: Optional cap on the amount a FLAT% offer takes off
+
+    Returns:
+        Discounted cart values, in input order
+
+    Raises:
+        ValueError: If offer_type is not a known offer type
+    """
+    return BATCH_DISCOUNTS[offer_type_code(offer_type)](cart_values, offer_value, max_discount)
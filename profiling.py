@@ -0,0 +1,144 @@
+"""
+On-demand request profiling for the Zomato cart offer mock service.
+
+ProfilingMiddleware profiles selected requests: those sent with an
+X-Profile header (when allowed) and a random sample of SAMPLE_RATE of the
+rest. A profiled request runs with a profile hook (sys.setprofile) installed
+on its own thread only, which attributes the time between consecutive call
+and return events to the current call stack, C functions included. Other
+requests, and other threads, run without any hook.
+
+RequestProfiler aggregates the stacks of every profiled request. collapsed()
+renders them in the collapsed-stack format read by flamegraph.pl and
+speedscope, one "frame;frame;frame microseconds" line per stack.
+
+Profiling is off unless the middleware is installed; see enable_profiling()
+in mock_service.py.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Request header that asks for a request to be profiled
+PROFILE_HEADER = 'X-Profile'
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(code) -> str:
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+
+def _builtin_label(function: Any) -> str:
+    module = getattr(function, '__module__', None) or ''
+    name = getattr(function, '__qualname__', None) or repr(function)
+    return (f'{module}.{name}' if module else name).replace(';', ':')
+
+
+class _StackTimer:
+    """Profile hook for one request: time spent per call stack, in nanoseconds."""
+
+    def __init__(self):
+        self.stack: List[str] = []
+        self.times: Dict[Stack, int] = {}
+        self.last = time.perf_counter_ns()
+
+    def __call__(self, frame, event: str, arg: Any) -> None:
+        now = time.perf_counter_ns()
+        stack = self.stack
+        if stack:
+            key = tuple(stack)
+            self.times[key] = self.times.get(key, 0) + now - self.last
+        if event == 'call':
+            stack.append(_frame_label(frame.f_code))
+        elif event == 'c_call':
+            stack.append(_builtin_label(arg))
+        elif stack:
+            # return, c_return and c_exception. Returns from frames entered
+            # before profiling started find the stack empty and are ignored
+            stack.pop()
+        self.last = time.perf_counter_ns()
+
+
+class RequestProfiler:
+    """Aggregated call stacks of profiled requests."""
+
+    def __init__(self, sample_rate: float = 0.0, allow_header: bool = True):
+        """
+        Args:
+            sample_rate: Fraction of requests profiled at random (0 to 1)
+            allow_header: Also profile requests sent with the X-Profile header
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.sample_rate = sample_rate
+        self.allow_header = allow_header
+        self._lock = threading.Lock()
+        self._times: Dict[Stack, int] = {}
+        self.requests = 0
+
+    def should_profile(self, environ: Dict[str, Any]) -> bool:
+        """Decide whether to profile a request."""
+        if self.allow_header and environ.get('HTTP_X_PROFILE', '') not in ('', '0'):
+            return True
+        return self.sample_rate > 0.0 and random.random() < self.sample_rate
+
+    def start(self) -> Optional[_StackTimer]:
+        """
+        Start profiling the current thread.
+
+        Returns:
+            The timer to pass to stop(), or None when another profiler or
+            tracer already owns the thread's profile hook
+        """
+        if sys.getprofile() is not None:
+            return None
+        timer = _StackTimer()
+        sys.setprofile(timer)
+        return timer
+
+    def stop(self, timer: _StackTimer) -> None:
+        """Stop profiling the current thread and add its stacks to the totals."""
+        sys.setprofile(None)
+        with self._lock:
+            times = self._times
+            for stack, nanoseconds in timer.times.items():
+                times[stack] = times.get(stack, 0) + nanoseconds
+            self.requests += 1
+
+    def collapsed(self) -> str:
+        """Render the aggregated stacks as collapsed stacks weighted in microseconds."""
+        with self._lock:
+            items = sorted(self._times.items())
+        lines = [f"{';'.join(stack)} {nanoseconds // 1000}" for stack, nanoseconds in items if nanoseconds >= 1000]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def reset(self) -> None:
+        """Discard the aggregated stacks."""
+        with self._lock:
+            self._times = {}
+            self.requests = 0
+
+
+class ProfilingMiddleware:
+    """WSGI middleware that profiles the requests a RequestProfiler selects."""
+
+    def __init__(self, wsgi_app, profiler: RequestProfiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        profiler = self.profiler
+        if not profiler.should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+        timer = profiler.start()
+        if timer is None:
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            profiler.stop(timer)
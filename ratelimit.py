@@ -0,0 +1,266 @@
+"""
+Token-bucket admission control for the Zomato cart offer mock service.
+
+RateLimiter gives every client a token bucket per route: a budget of rate
+requests per second with bursts of up to burst requests. Routes can have
+budgets of their own and the others share a default budget, or are not
+limited when there is none. Exempt routes such as /health are never
+limited, so health checks keep answering while callers are being shed.
+
+Each bucket is kept in its GCRA form (the generic cell rate algorithm, an
+exact equivalent of a token bucket): one float per client, the time at which
+the client's bucket is full again. A request is admitted when that time is
+at most burst intervals ahead, and moves it one interval later. Deciding
+takes a dict probe, a clock read and a few float operations, about 0.4 us
+on CPython 3.11 and 0.15 us for exempt or unlimited routes (see
+benchmarks/bench_rate_limit.py), and no lock: threads racing on one
+client's bucket may let a request over budget through, but never shed one
+within it.
+
+Each budget tracks at most max_clients clients, in least recently seen
+order. A client not yet tracked takes the place of the least recently seen
+one if that client's bucket is full again, which changes nothing for it;
+otherwise that client moves to the back and the newcomer is charged to one
+bucket shared by every client that could not be tracked. So memory stays
+bounded and a caller that keeps changing identities gets one shared budget,
+not a fresh bucket per identity, and every decision stays O(1).
+
+RateLimitMiddleware decides before the request reaches the application, so
+requests over budget are answered with 429 Too Many Requests and a
+Retry-After header without reading or parsing their body. Clients are told
+apart by their address. Callers choose the value of a header, so a client
+header such as X-Client-Id is trusted only when the middleware is given
+one, e.g. behind a gateway that sets it.
+
+Budgets are kept per process: behind prefork.py each worker has its own.
+Rate limiting is off unless the middleware is installed; see
+enable_rate_limiting() in mock_service.py.
+"""
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from responses import TOO_MANY_REQUESTS_BODY
+
+
+# Request header that identifies a client, when one is trusted
+CLIENT_HEADER = 'X-Client-Id'
+
+# Routes that are never limited
+DEFAULT_EXEMPT = ('/health',)
+
+# Clients tracked per budget before full buckets are dropped
+DEFAULT_MAX_CLIENTS = 100000
+
+# Headers of a shed request's response, before Retry-After
+_SHED_HEADERS = [
+    ('Content-Type', 'application/json'),
+    ('Content-Length', str(len(TOO_MANY_REQUESTS_BODY))),
+]
+
+# (rate in requests per second, burst in requests)
+Budget = Tuple[float, float]
+
+
+class _Bucket:
+    """One budget and the buckets of the clients using it."""
+
+    __slots__ = ('rate', 'burst', 'interval', 'limit', 'tats', 'overflow', 'shed')
+
+    def __init__(self, rate: float, burst: float):
+        if not (rate > 0 and math.isfinite(rate)):
+            raise ValueError("rate must be a positive number")
+        if not (burst >= 1 and math.isfinite(burst)):
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        # Seconds per token, and how far ahead of now a bucket may run; a
+        # millionth of a token of slack absorbs float rounding, so a burst
+        # is never cut short
+        self.interval = 1.0 / rate
+        self.limit = (burst + 1e-6) / rate
+        # Structure: {client: time the client's bucket is full again}, least
+        # recently seen client first
+        self.tats: 'OrderedDict[Any, float]' = OrderedDict()
+        # Structure: {None: time the bucket shared by untracked clients is
+        # full again}
+        self.overflow: Dict[None, float] = {}
+        # Requests shed by this budget
+        self.shed = 0
+
+
+class RateLimiter:
+    """Per-client, per-route token buckets."""
+
+    def __init__(
+        self,
+        default: Optional[Budget] = None,
+        routes: Optional[Dict[str, Budget]] = None,
+        exempt: Iterable[str] = DEFAULT_EXEMPT,
+        max_clients: int = DEFAULT_MAX_CLIENTS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Set up budgets.
+
+        Args:
+            default: (rate, burst) of every route without a budget of its
+                own, or None to leave those routes unlimited
+            routes: {path: (rate, burst)} budgets of particular routes
+            exempt: Paths that are never limited
+            max_clients: Clients tracked per budget; beyond it clients whose
+                buckets are full are forgotten, which changes nothing for
+                them, and clients that cannot be tracked share one bucket
+            clock: Monotonic clock in seconds
+
+        Raises:
+            ValueError: If a rate is not positive, a burst is below 1 or
+                max_clients is below 1
+        """
+        if max_clients < 1:
+            raise ValueError("max_clients must be at least 1")
+        self._default = None if default is None else _Bucket(*default)
+        self._routes: Dict[str, Optional[_Bucket]] = {
+            path: _Bucket(rate, burst) for path, (rate, burst) in (routes or {}).items()
+        }
+        for path in exempt:
+            self._routes[path] = None
+        self.max_clients = max_clients
+        self._clock = clock
+
+    def admit(self, client: Any, route: str) -> float:
+        """
+        Decide whether a client's request to a route is within budget, and charge it if so.
+
+        Returns:
+            0.0 when the request is admitted, otherwise the number of
+            seconds until the client's next request to the route would be
+        """
+        bucket = self._routes.get(route, self._default)
+        if bucket is None:
+            return 0.0
+        now = self._clock()
+        tats = bucket.tats
+        tat = tats.get(client)
+        if tat is not None:
+            try:
+                tats.move_to_end(client)
+            except KeyError:
+                # Forgotten by another thread meanwhile; stored again below
+                pass
+        elif len(tats) >= self.max_clients and not self._evict(tats, now):
+            tats = bucket.overflow
+            client = None
+            tat = tats.get(None)
+        if tat is None or tat < now:
+            tat = now
+        tat += bucket.interval
+        if tat - now > bucket.limit:
+            bucket.shed += 1
+            return tat - now - bucket.limit
+        tats[client] = tat
+        return 0.0
+
+    @staticmethod
+    def _evict(tats: 'OrderedDict[Any, float]', now: float) -> bool:
+        """
+        Forget the least recently seen client if its bucket is full again.
+
+        Otherwise the client moves to the back, so the next call looks at
+        another one.
+
+        Returns:
+            Whether a client was forgotten
+        """
+        try:
+            client, tat = tats.popitem(last=False)
+        except KeyError:
+            return True
+        if tat <= now:
+            return True
+        tats[client] = tat
+        return False
+
+    @property
+    def shed(self) -> int:
+        """Requests shed so far, over all budgets."""
+        buckets = [bucket for bucket in self._routes.values() if bucket is not None]
+        if self._default is not None:
+            buckets.append(self._default)
+        return sum(bucket.shed for bucket in buckets)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get the rate, burst, tracked clients and shed requests of each budget, by route ('*' for the default)."""
+        budgets = {path: bucket for path, bucket in self._routes.items() if bucket is not None}
+        if self._default is not None:
+            budgets['*'] = self._default
+        return {
+            path: {
+                'rate': bucket.rate, 'burst': bucket.burst, 'clients': len(bucket.tats),
+                'overflowing': bool(bucket.overflow), 'shed': bucket.shed
+            }
+            for path, bucket in budgets.items()
+        }
+
+
+class RateLimitMiddleware:
+    """WSGI middleware that sheds requests a RateLimiter does not admit."""
+
+    def __init__(self, wsgi_app, limiter: RateLimiter, client_header: Optional[str] = None):
+        """
+        Wrap a WSGI application.
+
+        Args:
+            wsgi_app: Application to wrap
+            limiter: Decides which requests are admitted
+            client_header: Trusted request header that identifies a client,
+                e.g. CLIENT_HEADER when a gateway sets it; requests without
+                it, and all requests when it is None, are identified by their
+                remote address
+        """
+        self.wsgi_app = wsgi_app
+        self.limiter = limiter
+        self._client_key = None if client_header is None else 'HTTP_' + client_header.upper().replace('-', '_')
+
+    def __call__(self, environ, start_response):
+        client = environ.get(self._client_key) if self._client_key is not None else None
+        retry_after = self.limiter.admit(
+            client or environ.get('REMOTE_ADDR'),
+            environ.get('PATH_INFO', '')
+        )
+        if not retry_after:
+            return self.wsgi_app(environ, start_response)
+        # Whole seconds, rounded up so the retry is admitted
+        start_response('429 Too Many Requests', _SHED_HEADERS + [('Retry-After', str(math.ceil(retry_after)))])
+        return [TOO_MANY_REQUESTS_BODY]
+
+
+def parse_budget(spec: str) -> Budget:
+    """
+    Parse a "rate:burst" budget, e.g. "100:20"; a bare rate allows bursts of one second's worth.
+
+    Raises:
+        ValueError: If spec is not a budget
+    """
+    rate, _, burst = spec.partition(':')
+    rate_value = float(rate)
+    return rate_value, float(burst) if burst else max(1.0, rate_value)
+
+
+def parse_route_budgets(spec: str) -> Dict[str, Budget]:
+    """
+    Parse comma-separated "path=rate:burst" route budgets.
+
+    Raises:
+        ValueError: If an entry is not a path with a budget
+    """
+    budgets = {}
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        path, separator, budget = entry.strip().partition('=')
+        if not separator or not path.startswith('/'):
+            raise ValueError(f"Invalid route budget: {entry}")
+        budgets[path] = parse_budget(budget)
+    return budgets
@@ -0,0 +1,46 @@
+"""
+Pre-encoded JSON response bodies for the hot endpoints.
+
+Responses are encoded exactly as Flask's jsonify does outside debug mode
+(compact separators, sorted keys, trailing newline), so clients see the same
+bytes whichever path produced them. Constant bodies such as the add_offer
+and health responses are encoded once at import, and cart_value results are
+rendered with a single bytes format instead of a generic JSON encoder.
+"""
+import json
+import math
+from typing import Any, Dict, Optional
+
+
+def encode_body(body: Dict[str, Any]) -> bytes:
+    """Encode a response body the way jsonify does outside debug mode."""
+    return json.dumps(body, separators=(',', ':'), sort_keys=True).encode('utf-8') + b'\n'
+
+
+# Constant response bodies
+SUCCESS_BODY = encode_body({"response_msg": "success"})
+HEALTHY_BODY = encode_body({"status": "healthy"})
+USER_SEGMENT_NOT_FOUND_BODY = encode_body({"error": "User segment not found"})
+TOO_MANY_REQUESTS_BODY = encode_body({"error": "Too many requests"})
+
+
+def encode_cart_value(cart_value: Any) -> Optional[bytes]:
+    """
+    Render {"cart_value": ...} without going through the JSON encoder.
+
+    json.dumps writes finite floats and ints with repr(), so the result is
+    byte-for-byte what jsonify produces.
+
+    Returns:
+        The encoded body, or None for values the fast path does not handle
+        (non-finite floats, bools and other types), which callers encode
+        with encode_body or jsonify instead
+    """
+    value_type = type(cart_value)
+    if value_type is float:
+        if not math.isfinite(cart_value):
+            return None
+        return b'{"cart_value":%b}\n' % float.__repr__(cart_value).encode('ascii')
+    if value_type is int:
+        return b'{"cart_value":%d}\n' % cart_value
+    return None
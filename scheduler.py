@@ -0,0 +1,112 @@
+"""
+Timed actions for the Zomato cart offer mock service.
+
+A Scheduler keeps actions in a heap ordered by due time and runs them from
+one background thread, which sleeps until the earliest action is due.
+Scheduling or running an action is O(log n) and nothing is ever scanned.
+Actions are dropped once they have run, so memory is bounded by the number
+of pending actions. The thread is only started once something is scheduled.
+
+The service uses it to activate offers at valid_from and expire them at
+valid_until, so the apply path never looks at a timestamp.
+
+The lock and thread do not survive fork(). A child process starts with a
+fresh lock; its pending actions run once it schedules another action or
+calls start().
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+import traceback
+import weakref
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class Scheduler:
+    """Heap of actions run by a background thread when they are due."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        """
+        Args:
+            clock: Time source for due times, in seconds
+        """
+        self.clock = clock
+        # Structure: [(due, sequence, action, args)]; sequence keeps actions
+        # due at the same time in the order they were scheduled
+        self._heap: List[Tuple[float, int, Callable[..., Any], tuple]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        reference = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: reference() and reference()._after_fork())
+
+    def _after_fork(self) -> None:
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, due: float, action: Callable[..., Any], *args: Any) -> None:
+        """Run action(*args) at time due (immediately if it has passed)."""
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._sequence), action, args))
+            if self._heap[0][0] == due:
+                # New earliest action: wake the thread to sleep less
+                self._condition.notify()
+        self.start()
+
+    def start(self) -> None:
+        """Start the background thread, if it is not running."""
+        if self._thread is None:
+            with self._condition:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+                    self._thread.start()
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """
+        Run every action due by now, in due order.
+
+        Actions scheduled by these actions run too, if they are due by now.
+        Errors raised by an action are printed and do not stop the others.
+
+        Returns:
+            The number of actions run
+        """
+        if now is None:
+            now = self.clock()
+        count = 0
+        while True:
+            with self._condition:
+                heap = self._heap
+                if not heap or heap[0][0] > now:
+                    return count
+                _, _, action, args = heapq.heappop(heap)
+            try:
+                action(*args)
+            except Exception:
+                traceback.print_exc()
+            count += 1
+
+    def pending(self) -> List[Tuple[float, Callable[..., Any], tuple]]:
+        """Pending (due, action, args) entries, in due order."""
+        with self._condition:
+            return [(due, action, args) for due, _, action, args in sorted(self._heap)]
+
+    def clear(self) -> None:
+        """Drop every pending action."""
+        with self._condition:
+            self._heap = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while True:
+                    delay = self._heap[0][0] - self.clock() if self._heap else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._condition.wait(delay)
+            self.run_due()
@@ -0,0 +1,109 @@
+"""
+Test cases for the asyncio (ASGI) implementation of the endpoints.
+"""
+import asyncio
+import json
+import threading
+import pytest
+import asgi_service
+from api.cart_api import CartAPI
+from test_data.test_data import TestData
+
+
+def call(method, path, body=None, query=b'', content_type=b'application/json'):
+    """Run one request through the ASGI app and return (status, parsed body)."""
+    messages = []
+    
+    async def receive():
+        return {'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b''}
+    
+    async def send(message):
+        messages.append(message)
+    
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'headers': [(b'content-type', content_type)]}
+    asyncio.run(asgi_service.app(scope, receive, send))
+    return messages[0]['status'], json.loads(messages[1]['body'])
+
+
+@pytest.fixture(scope='module')
+def asgi_client():
+    """Serve the ASGI app with the built-in server on a free port."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    servers = []
+    
+    def started(server):
+        servers.append(server)
+        ready.set()
+    
+    thread = threading.Thread(target=loop.run_until_complete,
+                              args=(asgi_service.serve('127.0.0.1', 0, started=started),), daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    port = servers[0].sockets[0].getsockname()[1]
+    # Like the Flask server in conftest, the server thread ends with the session
+    return CartAPI(base_url=f'http://127.0.0.1:{port}')
+
+
+class TestAsgiApp:
+    """Test cases calling the ASGI app directly."""
+    
+    def test_add_and_apply_offer(self):
+        """Test that offers and segments written through the ASGI app are applied."""
+        assert call('POST', '/api/v1/offer', TestData.get_valid_flatx_offer_p1().to_dict()) == \
+            (200, {'response_msg': 'success'})
+        user_segment = TestData.get_user_segment_p1()
+        assert call('POST', '/api/v1/user_segment', {'user_id': user_segment.user_id, 'segment': user_segment.segment})[0] == 200
+        assert call('POST', '/api/v1/cart/apply_offer', TestData.get_cart_apply_offer_p1().to_dict()) == \
+            (200, {'cart_value': TestData.EXPECTED_190})
+        assert call('GET', '/api/v1/user_segment', query=b'user_id=%d' % user_segment.user_id) == \
+            (200, {'segment': user_segment.segment})
+    
+    def test_validation_matches_flask(self):
+        """Test that validation errors and status codes match the Flask app."""
+        assert call('POST', '/api/v1/offer', {'restaurant_id': 1}) == (400, {'error': 'Missing required fields'})
+        assert call('POST', '/api/v1/user_segment', {'user_id': 1, 'segment': 'p9'})[0] == 400
+        assert call('GET', '/api/v1/user_segment', query=b'user_id=abc') == \
+            (400, {'error': 'user_id must be an integer'})
+        assert call('GET', '/api/v1/user_segment') == (400, {'error': 'Missing user_id parameter'})
+        assert call('POST', '/api/v1/cart/apply_offer', TestData.get_cart_apply_offer_p1().to_dict()) == \
+            (404, {'error': 'User segment not found'})
+        assert call('POST', '/api/v1/offer', {}, content_type=b'text/plain')[0] == 500
+    
+    def test_routing(self):
+        """Test the health check, unknown paths and unsupported methods."""
+        assert call('GET', '/health') == (200, {'status': 'healthy'})
+        assert call('GET', '/missing')[0] == 404
+        assert call('DELETE', '/api/v1/offer')[0] == 405
+
+
+class TestAsgiServer:
+    """Test cases for the built-in asyncio HTTP server."""
+    
+    def test_api_client_round_trip(self, asgi_client: CartAPI, api_client: CartAPI):
+        """Test the CartAPI client against the asyncio server, sharing state with Flask."""
+        assert asgi_client.health_check()['data'] == {'status': 'healthy'}
+        assert asgi_client.add_offer(**TestData.get_valid_flat_percent_offer_p2().to_dict())['status_code'] == 200
+        user_segment = TestData.get_user_segment_p2()
+        assert asgi_client.set_user_segment(user_segment.user_id, user_segment.segment)['status_code'] == 200
+        cart = TestData.get_cart_apply_offer_p2().to_dict()
+        assert asgi_client.apply_offer(**cart)['data'] == api_client.apply_offer(**cart)['data']
+    
+    def test_invalid_content_length(self, asgi_client: CartAPI):
+        """Test that a non-numeric or negative Content-Length is answered with 400 and the connection closed."""
+        host, port = asgi_client.base_url.rsplit('/', 1)[1].split(':')
+        
+        async def send_request(content_length):
+            reader, writer = await asyncio.open_connection(host, int(port))
+            writer.write(b'POST /api/v1/offer HTTP/1.1\r\nHost: x\r\nContent-Length: ' + content_length + b'\r\n\r\n{}')
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+        
+        for content_length in (b'abc', b'-5'):
+            response = asyncio.run(send_request(content_length))
+            assert response.startswith(b'HTTP/1.1 400 Bad Request')
+            assert json.loads(response.split(b'\r\n\r\n', 1)[1]) == {'error': 'Invalid Content-Length'}
+
@@ -0,0 +1,145 @@
+"""
+Test cases for chain offers inherited by outlets.
+"""
+import time
+
+import mock_service
+from api.cart_api import CartAPI
+from offer_store import Offer, OfferTable
+from pricing import FLAT_PERCENT_CODE
+from test_data.test_data import TestData
+
+
+class TestChainTable:
+    """Test cases for the flattened rows of chain outlets."""
+
+    def test_outlets_inherit_and_override(self):
+        """Test that outlets get the chain's offers except where they have their own."""
+        table = OfferTable()
+        table.set_offer(1, ['p1'], 'FLATX', 20)
+        table.set_chain(1, 'chain')
+        table.set_chain(2, 'chain')
+        table.set_chain_offer('chain', ['p1', 'p2'], 'FLAT%', 10)
+
+        assert table.get_offers(1) == {
+            'p1': {'offer_type': 'FLATX', 'offer_value': 20},
+            'p2': {'offer_type': 'FLAT%', 'offer_value': 10},
+        }
+        assert table.get_offers(2) == {
+            'p1': {'offer_type': 'FLAT%', 'offer_value': 10},
+            'p2': {'offer_type': 'FLAT%', 'offer_value': 10},
+        }
+        # One flattened row per outlet, sharing the chain's Offer
+        assert table.lookup(1, 'p2') is table.lookup(2, 'p2')
+        assert table.lookup(3, 'p1') is None
+
+        table.set_offer(2, ['p2'], 'FLATX', 5)
+        assert table.lookup(2, 'p2').value == 5
+        assert table.expire(2, ['p2'], Offer(0, 5))
+        assert table.lookup(2, 'p2').type_code == FLAT_PERCENT_CODE
+
+    def test_chain_writes_touch_only_their_outlets(self):
+        """Test that chain writes republish the rows of that chain's outlets and nothing else."""
+        table = OfferTable()
+        for restaurant_id in range(10):
+            table.set_chain(restaurant_id, 'even' if restaurant_id % 2 == 0 else 'odd')
+        table.set_offer(100, ['p1'], 'FLATX', 1)
+        version = table.changes.version
+
+        table.set_chain_offer('even', ['p3'], 'FLATX', 30)
+        changes, _ = table.changes.since(version, 100)
+        assert sorted(key for _, key in changes) == [0, 2, 4, 6, 8]
+        assert 1 not in table and table.lookup(100, 'p1').value == 1
+
+        assert table.expire_chain('even', ['p3'], Offer(0, 30))
+        assert 0 not in table and table.get_chain_offers('even') is None
+
+    def test_membership_changes(self):
+        """Test that moving an outlet swaps its inherited offers and leaving keeps only its own."""
+        table = OfferTable()
+        table.set_chain_offer('a', ['p1'], 'FLATX', 10)
+        table.set_chain_offer('b', ['p1', 'p2'], 'FLATX', 20)
+        table.set_offer(1, ['p3'], 'FLATX', 3)
+        table.set_chain(1, 'a')
+        assert table.lookup(1, 'p1').value == 10 and table.chain_of(1) == 'a'
+
+        table.set_chain(1, 'b')
+        assert table.lookup(1, 'p2').value == 20 and table.chain_outlets('a') == []
+        assert list(table.items(inherited=False)) == [(1, {'p3': {'offer_type': 'FLATX', 'offer_value': 3}})]
+
+        table.set_chain(1, None)
+        assert table.get_offers(1) == {'p3': {'offer_type': 'FLATX', 'offer_value': 3}}
+        table.set_chain(2, 'b')
+        table.set_chain(2, None)
+        assert 2 not in table and table.memberships() == []
+
+
+class TestChainOffers:
+    """Test cases for chain offers through the API."""
+
+    def test_apply_inherited_offer(self, api_client: CartAPI):
+        """Test that carts at outlets get the chain's offer unless the outlet overrides it."""
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        assert api_client.set_chain_outlets(7, [1, 2])['status_code'] == 200
+        assert api_client.add_chain_offer(7, 'FLAT%', 10, ['p1'])['status_code'] == 200
+        api_client.add_offer(2, 'FLATX', 30, ['p1'])
+
+        assert api_client.apply_offer(200, TestData.USER_1, 1)['data']['cart_value'] == 180.0
+        assert api_client.apply_offer(200, TestData.USER_1, 2)['data']['cart_value'] == 170.0
+        response = api_client.apply_offers_batch(
+            [{'cart_value': 200, 'user_id': TestData.USER_1, 'restaurant_id': restaurant_id} for restaurant_id in (1, 2)]
+        )
+        assert response['data']['results'] == [{'cart_value': 180.0}, {'cart_value': 170.0}]
+
+        client = CartAPI(api_client.base_url)
+        client.enable_local_evaluation()
+        assert client._local_quote(200, TestData.USER_1, 1) == 180.0
+
+        response = api_client.get_chain(7)
+        assert response['data']['offers'] == {'p1': {'offer_type': 'FLAT%', 'offer_value': 10.0}}
+        assert sorted(response['data']['restaurant_ids']) == [1, 2]
+        assert api_client.get_chain(8)['status_code'] == 404
+
+    def test_dump_records_keep_hierarchy(self, api_client: CartAPI):
+        """Test that dumped records rebuild chains, chain offers and only the outlets' own offers."""
+        api_client.set_chain_outlets(7, [1, 2])
+        api_client.add_chain_offer(7, 'FLATX', 20, ['p1', 'p2'])
+        api_client.add_chain_offer(7, 'FLAT%', 10, ['p1'], mode='add')
+        api_client.add_offer(1, 'FLATX', 5, ['p2'])
+        api_client.add_offer(3, 'FLATX', 15, ['p3'])
+        offers = dict(mock_service.offers_db.items())
+
+        records = list(mock_service.dump_records())
+        assert records[0] == {"op": "chains", "rows": [[1, 7], [2, 7]]}
+        mock_service.offers_db.clear()
+        for record in records:
+            mock_service.apply_record(record)
+        assert dict(mock_service.offers_db.items()) == offers
+        assert dict(mock_service.offers_db.items(inherited=False)) == {
+            1: {'p2': {'offer_type': 'FLATX', 'offer_value': 5.0}},
+            3: {'p3': {'offer_type': 'FLATX', 'offer_value': 15.0}},
+        }
+
+        # Leaving the chain drops what was inherited
+        api_client.set_chain_outlets(None, [1, 2])
+        assert mock_service.offers_db.get_offers(1) == {'p2': {'offer_type': 'FLATX', 'offer_value': 5.0}}
+        assert 2 not in mock_service.offers_db
+
+    def test_chain_offer_expiry(self, api_client: CartAPI):
+        """Test that an expiring chain offer is removed from every outlet."""
+        now = time.time()
+        api_client.set_chain_outlets(7, [1, 2])
+        api_client.add_chain_offer(7, 'FLATX', 20, ['p1'], valid_until=now + 60)
+        assert mock_service.offers_db.lookup(2, 'p1').valid_until == now + 60
+
+        mock_service.offer_scheduler.run_due(now + 61)
+        assert 1 not in mock_service.offers_db and 2 not in mock_service.offers_db
+
+    def test_invalid_requests(self, api_client: CartAPI):
+        """Test that malformed chain requests are rejected."""
+        response = api_client.add_chain_offer(None, 'FLATX', 20, ['p1'])
+        assert response['status_code'] == 400
+        assert response['data']['error'] == "Missing required fields"
+        response = api_client.set_chain_outlets(7, 1)
+        assert response['data']['error'] == "restaurant_ids must be a list of restaurant ids"
+        assert api_client.add_chain_offer(7, 'FLATX', 20, ['p1'], max_discount=5)['status_code'] == 400
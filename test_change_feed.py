@@ -0,0 +1,129 @@
+"""
+Test cases for the offer change feed and client-side catalog mirrors.
+"""
+import requests
+import mock_service
+from api.cart_api import CartAPI
+from change_feed import ChangeFeed
+from offer_store import OfferTable
+
+
+class TestChangeFeed:
+    """Test cases for the bounded change ring."""
+
+    def test_since_returns_changes_in_version_order(self):
+        """Test that changes after a version are returned in order, limited to a page."""
+        feed = ChangeFeed(capacity=8)
+        for key in ('a', 'b', 'c', 'a'):
+            feed.record(key)
+
+        assert feed.since(0, 10) == ([(1, 'a'), (2, 'b'), (3, 'c'), (4, 'a')], 4)
+        assert feed.since(1, 2) == ([(2, 'b'), (3, 'c')], 4)
+        assert feed.since(4, 10) == ([], 4)
+
+    def test_aged_out_reset_and_future_versions(self):
+        """Test that versions the ring cannot serve ask for a snapshot."""
+        feed = ChangeFeed(capacity=4)
+        for key in range(10):
+            feed.record(key)
+
+        assert feed.oldest == 6
+        assert feed.since(5, 10) is None
+        assert feed.since(6, 10) == ([(7, 6), (8, 7), (9, 8), (10, 9)], 10)
+        assert feed.since(11, 10) is None
+
+        assert feed.reset() == 11
+        assert feed.since(10, 10) is None
+        assert feed.since(11, 10) == ([], 11)
+
+    def test_offer_table_records_writes(self):
+        """Test that every published row and clear() advance the catalog version."""
+        table = OfferTable(shards=4, change_capacity=16)
+        table.set_offers([(1, 'FLATX', 10, ['p1']), (2, 'FLAT%', 5, ['p2'])])
+        table.set_offer(1, ['p2'], 'FLATX', 20)
+
+        assert table.changes.since(0, 10) == ([(1, 1), (2, 2), (3, 1)], 3)
+        table.clear()
+        assert table.changes.version == 4
+        assert table.changes.since(3, 10) is None
+
+
+class TestOfferChangesEndpoint:
+    """Test cases for GET /api/v1/offers/changes and CartAPI.sync_offers."""
+
+    def test_deltas_are_paginated(self, api_client: CartAPI):
+        """Test that delta pages list each changed restaurant once, with its current offers."""
+        start = mock_service.offers_db.changes.version
+        api_client.add_offer(1, 'FLATX', 10, ['p1'])
+        api_client.add_offer(2, 'FLATX', 20, ['p1'])
+        api_client.add_offer(1, 'FLAT%', 5, ['p2'])
+
+        response = api_client.get_offer_changes(start, limit=2)
+        assert response['status_code'] == 200
+        page = response['data']
+        assert page['snapshot'] is False
+        assert page['has_more'] is True
+        assert page['version'] == start + 2
+        assert [change['restaurant_id'] for change in page['changes']] == [1, 2]
+
+        page = api_client.get_offer_changes(page['version'], limit=2)['data']
+        assert page['has_more'] is False
+        assert page['changes'] == [{
+            'restaurant_id': 1,
+            'offers': {'p1': {'offer_type': 'FLATX', 'offer_value': 10.0},
+                       'p2': {'offer_type': 'FLAT%', 'offer_value': 5.0}}
+        }]
+
+    def test_snapshot_fallback(self, api_client: CartAPI):
+        """Test that a version from before a clear gets snapshot pages of every restaurant."""
+        api_client.add_offer(1, 'FLATX', 10, ['p1'])
+        api_client.add_offer(2, 'FLATX', 20, ['p1'])
+        version = mock_service.offers_db.changes.version
+
+        restaurants = {}
+        page = api_client.get_offer_changes(0)['data']
+        while True:
+            assert page['snapshot'] is True and page['version'] == version
+            restaurants.update((change['restaurant_id'], change['offers']) for change in page['changes'])
+            if not page['has_more']:
+                break
+            page = api_client.get_offer_changes(page['version'], cursor=page['next_cursor'])['data']
+        assert sorted(restaurants) == [1, 2]
+        assert page['cursor'] == mock_service.offers_db.shard_count - 1
+
+    def test_invalid_parameters(self, api_client: CartAPI):
+        """Test that a missing since, a bad limit or an out-of-range cursor is rejected."""
+        url = f'{api_client.base_url}/api/v1/offers/changes'
+        assert requests.get(url).json() == {'error': 'Missing since parameter'}
+        assert requests.get(url, params={'since': 0, 'limit': 0}).status_code == 400
+        assert requests.get(url, params={'since': 0, 'cursor': 10 ** 6}).status_code == 400
+
+    def test_sync_offers_mirror(self, api_client: CartAPI):
+        """Test that a mirror loads a snapshot once and then applies only deltas."""
+        api_client.add_offer(1, 'FLATX', 10, ['p1'])
+        api_client.add_offer(2, 'FLATX', 20, ['p1'])
+
+        result = api_client.sync_offers()
+        assert result['status_code'] == 200
+        assert result['data']['snapshot'] is True
+        assert result['data']['size'] == 2
+
+        api_client.add_offer(2, 'FLAT%', 15, ['p3'])
+        api_client.add_offer(3, 'FLATX', 30, ['p2'])
+        result = api_client.sync_offers(limit=1)
+        assert result['data']['snapshot'] is False
+        assert result['data']['changes'] == 2
+        assert result['data']['version'] == mock_service.offers_db.changes.version
+
+        assert api_client.offers_mirror == {
+            restaurant_id: offers for restaurant_id, offers in mock_service.offers_db.items()
+        }
+        assert api_client.offers_mirror[2]['p3'] == {'offer_type': 'FLAT%', 'offer_value': 15.0}
+
+        assert api_client.sync_offers()['data']['changes'] == 0
+
+        mock_service.offers_db.clear()
+        api_client.add_offer(4, 'FLATX', 40, ['p1'])
+        result = api_client.sync_offers()
+        assert result['data']['snapshot'] is True
+        assert list(api_client.offers_mirror) == [4]
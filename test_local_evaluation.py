@@ -0,0 +1,99 @@
+"""
+Test cases for local offer evaluation in CartAPI.
+"""
+import mock_service
+from api.cart_api import CartAPI
+from segment_store import SegmentStore
+from test_data.test_data import TestData
+
+
+CART_VALUES = [0, 0.01, 5, 99.999, 100.5, 200, 1234.565, 10 ** 6 + 0.125]
+
+
+class TestSegmentChanges:
+    """Test cases for GET /api/v1/user_segments/changes and CartAPI.sync_segments."""
+
+    def test_sync_segments_mirror(self, api_client: CartAPI):
+        """Test that segments are replicated with a snapshot and then deltas."""
+        client = CartAPI(api_client.base_url)
+        for user_id in range(5):
+            api_client.set_user_segment(user_id, TestData.SEGMENT_P1)
+
+        result = client.sync_segments(limit=2)
+        assert result['status_code'] == 200
+        assert result['data']['snapshot'] is True
+        assert client.segments_mirror == {user_id: 'p1' for user_id in range(5)}
+
+        api_client.set_user_segment(3, TestData.SEGMENT_P3)
+        api_client.set_user_segments_bulk([(10, 'p2'), (11, 'p2')], fmt='csv')
+        result = client.sync_segments()
+        assert result['data']['snapshot'] is False
+        assert result['data']['changes'] == 3
+        assert client.segments_mirror == dict(mock_service.user_segments_db.items())
+
+
+    def test_snapshot_pages_without_commit_lock(self, api_client: CartAPI, monkeypatch):
+        """Test that snapshot pages of either store resume at their cursor and are served while writers hold the lock."""
+        for store in ({}, SegmentStore()):
+            monkeypatch.setattr(mock_service, 'user_segments_db', store)
+            mock_service.segment_changes.reset()
+            for user_id in range(25):
+                store[user_id] = TestData.SEGMENT_P2
+            
+            users, cursor = [], None
+            with mock_service._commit_lock:
+                while True:
+                    page = api_client.get_user_segment_changes(0, limit=10, cursor=cursor)['data']
+                    users += [change['user_id'] for change in page['changes']]
+                    if not page['has_more']:
+                        break
+                    cursor = page['next_cursor']
+                    # Users added during a snapshot may be in later pages, and are in the deltas
+                    store[100 + cursor] = TestData.SEGMENT_P1
+            assert users[:25] == list(range(25)) and len(set(users)) == len(users)
+
+
+class TestLocalEvaluation:
+    """Test cases for pricing carts from local copies."""
+
+    def test_local_quotes_match_service(self, api_client: CartAPI):
+        """Test that local results are identical to the service's for every offer type and segment."""
+        api_client.add_offer(1, 'FLATX', 10, ['p1'])
+        api_client.add_offer(1, 'FLAT%', 12.5, ['p2'])
+        api_client.add_offer(2, 'FLATX', 150.75, ['p1', 'p2'])
+        for user_id, segment in ((1, 'p1'), (2, 'p2'), (3, 'p3')):
+            api_client.set_user_segment(user_id, segment)
+
+        client = CartAPI(api_client.base_url)
+        assert client.enable_local_evaluation()['status_code'] == 200
+        for cart_value in CART_VALUES:
+            for user_id in (1, 2, 3):
+                for restaurant_id in (1, 2):
+                    local = client.apply_offer(cart_value, user_id, restaurant_id)
+                    remote = api_client.apply_offer(cart_value, user_id, restaurant_id)
+                    assert local == remote
+                    assert type(local['data']['cart_value']) is type(remote['data']['cart_value'])
+                    assert client.quote(cart_value, user_id, restaurant_id) == remote['data']['cart_value']
+
+    def test_falls_back_to_service(self, api_client: CartAPI):
+        """Test that unknown users and restaurants and invalid carts are sent to the service."""
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        client = CartAPI(api_client.base_url)
+        client.enable_local_evaluation()
+
+        # Added after the last refresh, so only the service knows them
+        api_client.add_offer(1, 'FLATX', 10, ['p1'])
+        api_client.set_user_segment(TestData.USER_2, TestData.SEGMENT_P1)
+        assert client.quote(200, TestData.USER_2, 1) == TestData.EXPECTED_190
+
+        response = client.apply_offer(200, TestData.USER_INVALID, 1)
+        assert response['status_code'] == 404
+        assert client.quote(200, TestData.USER_INVALID, 1) is None
+
+        client.refresh_local()
+        assert client._local_quote(200, TestData.USER_1, 1) == TestData.EXPECTED_190
+        assert client._local_quote(-1, TestData.USER_1, 1) is None
+        assert client.apply_offer(-1, TestData.USER_1, 1)['status_code'] == 400
+
+        client.disable_local_evaluation()
+        assert client.local_evaluation is False
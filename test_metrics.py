@@ -0,0 +1,119 @@
+"""
+Test cases for request metrics and the /metrics endpoint.
+"""
+import threading
+import requests
+from api.cart_api import CartAPI
+from metrics import NUM_BUCKETS, UNMATCHED_ROUTE, MetricsMiddleware, RequestMetrics, bucket_index, bucket_upper_bound
+from test_data.test_data import TestData
+
+
+def parse_metrics(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+class TestRequestMetrics:
+    """Test cases for recording and merging request metrics."""
+
+    def test_bucket_bounds(self):
+        """Test that every latency falls below its bucket's upper bound and above the previous one's."""
+        for nanoseconds in [0, 1023, 1024, 1279, 1280, 1500, 2047, 2048, 10 ** 6, 123456789, 2 ** 36 - 1]:
+            index = bucket_index(nanoseconds)
+            assert nanoseconds < bucket_upper_bound(index)
+            if index:
+                assert nanoseconds >= bucket_upper_bound(index - 1)
+        assert bucket_index(2 ** 40) == NUM_BUCKETS - 1
+
+    def test_quantiles(self):
+        """Test that quantiles are estimated within one bucket."""
+        recorder = RequestMetrics()
+        route = ('GET', '/x')
+        recorder.start(route)
+        stats = recorder.collect()[route]
+        stats.in_flight = 0
+        for latency_us in range(1, 1001):
+            stats.buckets[bucket_index(latency_us * 1000)] += 1
+        stats.count = 1000
+        assert 500e-6 <= stats.quantile(0.5) <= 500e-6 * 1.25
+        assert 990e-6 <= stats.quantile(0.99) <= 990e-6 * 1.25
+
+    def test_threads_merge_on_collect(self):
+        """Test that per-thread shards, including those of exited threads, are merged."""
+        recorder = RequestMetrics()
+        route = ('POST', '/api/v1/cart/apply_offer')
+
+        def handle(count):
+            for _ in range(count):
+                recorder.finish(route, 200, recorder.start(route))
+
+        threads = [threading.Thread(target=handle, args=(100,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        started = recorder.start(route)
+
+        stats = recorder.collect()[route]
+        assert stats.count == 400
+        assert stats.statuses == {200: 400}
+        assert stats.in_flight == 1
+        recorder.finish(route, 404, started)
+        assert recorder.collect()[route].statuses == {200: 400, 404: 1}
+
+
+    def test_unmatched_requests_do_not_list_routes(self):
+        """Test that routes are listed again for a miss only when their version changed."""
+        routes = [('GET', '/a')]
+        listed = []
+        
+        def list_routes():
+            listed.append(1)
+            return list(routes)
+        
+        recorder = RequestMetrics()
+        middleware = MetricsMiddleware(lambda environ, start_response: [], recorder, list_routes, lambda: len(routes))
+        for index in range(100):
+            middleware({'REQUEST_METHOD': 'GET', 'PATH_INFO': f'/scan/{index}'}, None)
+        assert len(listed) == 1
+        assert recorder.collect()[UNMATCHED_ROUTE].count == 100
+        
+        routes.append(('GET', '/b'))
+        middleware({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/b'}, None)
+        assert len(listed) == 2 and recorder.collect()[('GET', '/b')].count == 1
+
+
+class TestMetricsEndpoint:
+    """Test cases for the /metrics endpoint."""
+
+    def test_metrics_endpoint(self, api_client: CartAPI):
+        """Test that requests and store sizes show up in the exposition output."""
+        offer = TestData.get_valid_flatx_offer_p1()
+        api_client.add_offer(offer.restaurant_id, offer.offer_type, offer.offer_value, offer.customer_segment)
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        before = parse_metrics(requests.get(f'{api_client.base_url}/metrics').text)
+        api_client.apply_offer(cart_value=200, user_id=TestData.USER_1, restaurant_id=offer.restaurant_id)
+        api_client.apply_offer(cart_value=200, user_id=TestData.USER_2, restaurant_id=offer.restaurant_id)
+
+        response = requests.get(f'{api_client.base_url}/metrics')
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        samples = parse_metrics(response.text)
+        labels = 'method="POST",route="/api/v1/cart/apply_offer"'
+
+        def delta(name):
+            return samples.get(name, 0) - before.get(name, 0)
+
+        assert delta(f'cart_offers_http_requests_total{{{labels},status="200"}}') == 1
+        assert delta(f'cart_offers_http_requests_total{{{labels},status="404"}}') == 1
+        assert delta(f'cart_offers_http_request_duration_seconds_count{{{labels}}}') == 2
+        assert delta(f'cart_offers_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == 2
+        assert samples[f'cart_offers_http_requests_in_flight{{{labels}}}'] == 0
+        assert f'cart_offers_http_request_duration_quantile_seconds{{{labels},quantile="0.99"}}' in samples
+        assert samples['cart_offers_http_requests_in_flight{method="GET",route="/metrics"}'] == 1
+        assert samples['cart_offers_restaurants'] == 1
+        assert samples['cart_offers_user_segments'] == 1
@@ -0,0 +1,130 @@
+"""
+Test cases for memory-mapped binary snapshots.
+"""
+import os
+import subprocess
+import sys
+import pytest
+import mock_service
+from api.cart_api import CartAPI
+from mmap_snapshot import MappedSnapshot, SnapshotSource, write_snapshot
+from offer_store import Offer, OfferTable
+from persistence import FSYNC_ALWAYS
+from pricing import FLATX_CODE, FLAT_PERCENT_CODE
+from test_data.test_data import TestData
+
+
+def build_table():
+    table = OfferTable()
+    table.set_offer(1, ['p1'], 'FLATX', 10)
+    table.set_offer(1, ['p2', 'p3'], 'FLAT%', 12.5)
+    table.set_offer(-7, ['p3'], 'FLATX', 3)
+    return table
+
+
+class TestMappedSnapshot:
+    """Test cases for writing and mapping snapshot files."""
+    
+    def test_round_trip(self, tmp_path):
+        """Test that offers and segments read back from a mapped snapshot."""
+        path = str(tmp_path / 'state.snap')
+        segments = [(0, 'p1'), (5, 'p2'), (-3, 'p3'), (10 ** 12, 'p1'), ('guest', 'p2')]
+        stats = write_snapshot(path, build_table().items(), segments)
+        assert stats == {'users': 4, 'restaurants': 2, 'skipped': 1, 'expiring': 0, 'multiple': 0}
+        
+        snapshot = MappedSnapshot(path)
+        assert snapshot.get(0) == 'p1'
+        assert snapshot.get(5) == 'p2'
+        assert snapshot.get(-3) == 'p3'
+        assert snapshot.get(10 ** 12) == 'p1'
+        assert snapshot.get(4) is None
+        assert snapshot.get('guest') is None
+        assert snapshot.lookup(1, 'p1') == Offer(FLATX_CODE, 10)
+        assert snapshot.lookup(1, 'p3') == Offer(FLAT_PERCENT_CODE, 12.5)
+        assert snapshot.lookup(-7, 'p1') is None
+        assert snapshot.lookup(2, 'p1') is None
+        assert snapshot.get_row(-7)[1:] == (None, None, Offer(FLATX_CODE, 3))
+    
+    def test_rejects_other_files(self, tmp_path):
+        """Test that a file without the snapshot header is rejected."""
+        path = tmp_path / 'state.snap'
+        path.write_bytes(b'{"lsn": 1}\n' + bytes(64))
+        with pytest.raises(ValueError):
+            MappedSnapshot(str(path))
+    
+    def test_atomic_swap(self, tmp_path):
+        """Test that a replaced snapshot is remapped while the old mapping stays readable."""
+        path = str(tmp_path / 'state.snap')
+        write_snapshot(path, build_table().items(), [(1, 'p1')])
+        source = SnapshotSource(path, poll_interval=0)
+        old = source.current
+        assert source.refresh() is False
+        
+        write_snapshot(path, [], [(1, 'p2')])
+        assert source.refresh() is True
+        assert source.get(1) == 'p2'
+        assert source.lookup(1, 'p1') is None
+        assert old.get(1) == 'p1'
+        assert not [name for name in os.listdir(str(tmp_path)) if '.tmp' in name]
+    
+    def test_offer_table_base_layer(self, tmp_path):
+        """Test that an OfferTable reads through to its base and copies base rows on write."""
+        path = str(tmp_path / 'state.snap')
+        write_snapshot(path, build_table().items(), [])
+        table = OfferTable(base=MappedSnapshot(path))
+        assert table.lookup(1, 'p2') == Offer(FLAT_PERCENT_CODE, 12.5)
+        assert 1 not in table
+        
+        table.set_offer(1, ['p2'], 'FLATX', 20)
+        assert table.lookup(1, 'p2') == Offer(FLATX_CODE, 20)
+        assert table.lookup(1, 'p1') == Offer(FLATX_CODE, 10)
+        assert table.get_offers(-7) == {'p3': {'offer_type': 'FLATX', 'offer_value': 3.0}}
+
+
+class TestServiceSnapshot:
+    """Test cases for serving a mapped snapshot from the mock service."""
+    
+    def test_apply_offer_from_snapshot(self, api_client: CartAPI, tmp_path):
+        """Test that the service serves offers and segments from an attached snapshot."""
+        offer = TestData.get_valid_flatx_offer_p1()
+        user_segment = TestData.get_user_segment_p1()
+        path = str(tmp_path / 'state.snap')
+        write_snapshot(path,
+                       [(offer.restaurant_id, {seg: {'offer_type': offer.offer_type, 'offer_value': offer.offer_value}
+                                               for seg in offer.customer_segment})],
+                       [(user_segment.user_id, user_segment.segment)])
+        
+        stats = mock_service.attach_snapshot(path, poll_interval=0)
+        try:
+            assert stats['restaurants'] == 1
+            response = api_client.apply_offer(**TestData.get_cart_apply_offer_p1().to_dict())
+            assert response['data']['cart_value'] == TestData.EXPECTED_190
+            assert api_client.get_user_segment(user_segment.user_id)['data']['segment'] == user_segment.segment
+            
+            # Local writes take precedence over the snapshot
+            api_client.set_user_segment(user_segment.user_id, TestData.SEGMENT_P2)
+            assert api_client.get_user_segment(user_segment.user_id)['data']['segment'] == TestData.SEGMENT_P2
+        finally:
+            mock_service.detach_snapshot()
+        assert api_client.apply_offer(**TestData.get_cart_apply_offer_p1().to_dict())['data']['cart_value'] == \
+            TestData.get_cart_apply_offer_p1().cart_value
+    
+    def test_export_cli(self, tmp_path):
+        """Test exporting a persistence data directory to a snapshot file."""
+        data_dir = str(tmp_path / 'data')
+        mock_service.enable_persistence(data_dir, fsync_policy=FSYNC_ALWAYS, snapshot_interval=0)
+        try:
+            mock_service._commit({'op': 'offers', 'rows': [[3, 'FLATX', 15, ['p1']]]})
+            mock_service._commit({'op': 'segments', 'rows': [[9, 'p1']]})
+        finally:
+            mock_service.disable_persistence()
+        
+        path = str(tmp_path / 'state.snap')
+        result = subprocess.run(
+            [sys.executable, 'mmap_snapshot.py', 'export', data_dir, path],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr
+        snapshot = MappedSnapshot(path)
+        assert snapshot.get(9) == 'p1'
+        assert snapshot.lookup(3, 'p1') == Offer(FLATX_CODE, 15)
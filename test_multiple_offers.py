@@ -0,0 +1,111 @@
+"""
+Test cases for several concurrent offers per restaurant and segment.
+"""
+import random
+import time
+from bisect import bisect_right
+
+import mock_service
+from api.cart_api import CartAPI
+from offer_store import Offer, OfferSet
+from pricing import DISCOUNTS, FLAT_PERCENT_CODE, FLATX_CODE
+from test_data.test_data import TestData
+
+
+CART_VALUES = [0, 0.01, 20, 99.99, 100, 100.01, 133.33, 250, 1000, 12345.67]
+
+
+class TestOfferSet:
+    """Test cases for the precomputed best offer."""
+
+    def test_single_comparison_matches_best_candidate(self):
+        """Test that the precomputed thresholds pick the cheapest result among all offers."""
+        rng = random.Random(20)
+        for _ in range(500):
+            offers = tuple(
+                Offer(rng.choice((FLATX_CODE, FLAT_PERCENT_CODE)), float(rng.randrange(0, 60)))
+                for _ in range(rng.randrange(2, 6))
+            )
+            offer_set = OfferSet(offers)
+            for cart_value in CART_VALUES + [round(rng.uniform(0, 2000), 2) for _ in range(20)]:
+                best = offer_set.choices[bisect_right(offer_set.thresholds, cart_value)]
+                assert DISCOUNTS[best.type_code](cart_value, best.value) == min(
+                    DISCOUNTS[offer.type_code](cart_value, offer.value) for offer in offers
+                )
+
+    def test_crossover(self):
+        """Test that FLATX wins up to 100 * X / P and FLAT% above it."""
+        offer_set = OfferSet((Offer(FLAT_PERCENT_CODE, 10.0), Offer(FLATX_CODE, 20.0), Offer(FLATX_CODE, 15.0)))
+        assert offer_set.thresholds == (200.0,)
+        assert offer_set.choices == (Offer(FLATX_CODE, 20.0), Offer(FLAT_PERCENT_CODE, 10.0))
+
+        offer_set = OfferSet((Offer(FLATX_CODE, 20.0), Offer(FLATX_CODE, 30.0)))
+        assert offer_set.thresholds == () and offer_set.choices == (Offer(FLATX_CODE, 30.0),)
+
+
+class TestMultipleOffers:
+    """Test cases for add_offer with mode 'add'."""
+
+    def test_best_offer_is_applied(self, api_client: CartAPI):
+        """Test that each cart gets the best of the segment's offers, in single and batch requests."""
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        api_client.add_offer(1, 'FLATX', 20, ['p1'])
+        assert api_client.add_offer(1, 'FLAT%', 10, ['p1'], mode='add')['status_code'] == 200
+        api_client.add_offer(1, 'FLAT%', 10, ['p1'], mode='add')
+
+        assert api_client.get_offers(1)['data']['offers'] == {'p1': [
+            {'offer_type': 'FLATX', 'offer_value': 20.0},
+            {'offer_type': 'FLAT%', 'offer_value': 10.0},
+        ]}
+        expected = [min(max(0, value - 20), value * 0.9) for value in CART_VALUES]
+        for cart_value, final_cart_value in zip(CART_VALUES, expected):
+            response = api_client.apply_offer(cart_value, TestData.USER_1, 1)
+            assert response['data']['cart_value'] == round(final_cart_value, 2)
+        response = api_client.apply_offers_batch(
+            [{'cart_value': value, 'user_id': TestData.USER_1, 'restaurant_id': 1} for value in CART_VALUES]
+        )
+        assert [result['cart_value'] for result in response['data']['results']] == [
+            round(value, 2) for value in expected
+        ]
+
+        client = CartAPI(api_client.base_url)
+        client.enable_local_evaluation()
+        for cart_value, final_cart_value in zip(CART_VALUES, expected):
+            assert client._local_quote(cart_value, TestData.USER_1, 1) == round(final_cart_value, 2)
+
+    def test_replace_clears_added_offers(self, api_client: CartAPI):
+        """Test that a replacing offer drops every offer of its segments only."""
+        api_client.add_offer(1, 'FLATX', 20, ['p1', 'p2'])
+        api_client.add_offer(1, 'FLAT%', 10, ['p1', 'p2'], mode='add')
+        api_client.add_offer(1, 'FLATX', 5, ['p1'])
+
+        offers = mock_service.offers_db.get_offers(1)
+        assert offers['p1'] == {'offer_type': 'FLATX', 'offer_value': 5.0}
+        assert len(offers['p2']) == 2
+
+    def test_expiry_keeps_other_offers(self, api_client: CartAPI):
+        """Test that an expiring offer leaves the segment's other offers."""
+        now = time.time()
+        api_client.add_offer(1, 'FLATX', 20, ['p1'])
+        api_client.add_offer(1, 'FLAT%', 10, ['p1'], valid_until=now + 60, mode='add')
+
+        mock_service.offer_scheduler.run_due(now + 61)
+        assert mock_service.offers_db.get_offers(1) == {'p1': {'offer_type': 'FLATX', 'offer_value': 20.0}}
+
+    def test_dump_records_rebuild_offers(self, api_client: CartAPI):
+        """Test that dumped records rebuild segments with several offers."""
+        api_client.add_offer(1, 'FLATX', 20, ['p1', 'p2'])
+        api_client.add_offer(1, 'FLAT%', 10, ['p1'], mode='add')
+        api_client.add_offer(2, 'FLAT%', 5, ['p3'], mode='add')
+        api_client.add_offers_bulk([
+            {'restaurant_id': 2, 'offer_type': 'FLATX', 'offer_value': 40, 'customer_segment': ['p3'], 'mode': 'add'},
+            {'restaurant_id': 3, 'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': ['p1']},
+        ])
+        offers = dict(mock_service.offers_db.items())
+        assert len(offers[2]['p3']) == 2
+
+        records = list(mock_service.dump_records())
+        mock_service.offers_db.clear()
+        for record in records:
+            mock_service.apply_record(record)
+        assert dict(mock_service.offers_db.items()) == offers
@@ -0,0 +1,150 @@
+"""
+Test cases for the compact offer table.
+"""
+import threading
+import pytest
+from offer_store import DEFAULT_SHARDS, Offer, OfferTable
+from pricing import FLATX_CODE, FLAT_PERCENT_CODE
+from test_data.test_data import TestData
+
+
+class TestOfferTable:
+    """Test cases for OfferTable lookups and updates."""
+    
+    def test_set_and_lookup_offer(self):
+        """Test looking up an offer by restaurant and segment."""
+        table = OfferTable()
+        offer_data = TestData.get_valid_flat_percent_offer_multiple_segments()
+        table.set_offer(offer_data.restaurant_id, offer_data.customer_segment,
+                        offer_data.offer_type, offer_data.offer_value)
+        offer = table.lookup(TestData.RESTAURANT_1, TestData.SEGMENT_P1)
+        assert offer == Offer(FLAT_PERCENT_CODE, TestData.OFFER_VALUE_15)
+        assert offer.offer_type == TestData.OFFER_TYPE_FLAT_PERCENT
+        # One record is shared by every segment the offer was added for
+        assert table.lookup(TestData.RESTAURANT_1, TestData.SEGMENT_P2) is offer
+    
+    def test_lookup_missing(self):
+        """Test lookups for unknown restaurants and segments without offers."""
+        table = OfferTable()
+        offer_data = TestData.get_valid_flatx_offer_p1()
+        table.set_offer(offer_data.restaurant_id, offer_data.customer_segment,
+                        offer_data.offer_type, offer_data.offer_value)
+        assert table.lookup(TestData.RESTAURANT_INVALID, TestData.SEGMENT_P1) is None
+        assert table.lookup(TestData.RESTAURANT_1, TestData.SEGMENT_P3) is None
+    
+    def test_set_offer_overwrites_segment(self):
+        """Test that a new offer replaces the old one for the same segment only."""
+        table = OfferTable()
+        table.set_offer(TestData.RESTAURANT_1, [TestData.SEGMENT_P1, TestData.SEGMENT_P2],
+                        TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10)
+        table.set_offer(TestData.RESTAURANT_1, [TestData.SEGMENT_P1],
+                        TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_20)
+        assert table.get_offers(TestData.RESTAURANT_1) == {
+            TestData.SEGMENT_P1: {'offer_type': TestData.OFFER_TYPE_FLATX, 'offer_value': TestData.OFFER_VALUE_20},
+            TestData.SEGMENT_P2: {'offer_type': TestData.OFFER_TYPE_FLATX, 'offer_value': TestData.OFFER_VALUE_10},
+        }
+    
+    def test_set_offers_bulk(self):
+        """Test setting many offers in one pass."""
+        table = OfferTable()
+        table.set_offers([
+            (TestData.RESTAURANT_1, TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10, [TestData.SEGMENT_P1]),
+            (TestData.RESTAURANT_2, TestData.OFFER_TYPE_FLAT_PERCENT, TestData.OFFER_VALUE_15, [TestData.SEGMENT_P2]),
+        ])
+        assert len(table) == 2
+        assert TestData.RESTAURANT_2 in table
+        assert table.lookup(TestData.RESTAURANT_1, TestData.SEGMENT_P1).type_code == FLATX_CODE
+        assert dict(table.items())[TestData.RESTAURANT_2] == {
+            TestData.SEGMENT_P2: {'offer_type': TestData.OFFER_TYPE_FLAT_PERCENT, 'offer_value': TestData.OFFER_VALUE_15}
+        }
+        table.clear()
+        assert len(table) == 0
+    
+    def test_invalid_offer_type_and_segment(self):
+        """Test that invalid offer types and segments are rejected."""
+        table = OfferTable()
+        with pytest.raises(ValueError):
+            table.set_offer(TestData.RESTAURANT_1, [TestData.SEGMENT_P1],
+                            TestData.OFFER_TYPE_INVALID, TestData.OFFER_VALUE_10)
+        with pytest.raises(ValueError):
+            table.set_offer(TestData.RESTAURANT_1, [TestData.SEGMENT_INVALID],
+                            TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10)
+        assert TestData.RESTAURANT_1 not in table
+    
+    def test_offer_is_immutable(self):
+        """Test that published offers cannot be modified in place."""
+        offer = Offer(FLATX_CODE, TestData.OFFER_VALUE_10)
+        with pytest.raises(AttributeError):
+            offer.value = TestData.OFFER_VALUE_20
+    
+    def test_readers_never_see_half_applied_offer(self):
+        """Test that a multi-segment offer is visible for all segments at once."""
+        table = OfferTable()
+        segments = [TestData.SEGMENT_P1, TestData.SEGMENT_P2, TestData.SEGMENT_P3]
+        table.set_offer(TestData.RESTAURANT_1, segments, TestData.OFFER_TYPE_FLATX, 0.0)
+        done = threading.Event()
+        
+        def writer():
+            for value in range(1, 20000):
+                table.set_offer(TestData.RESTAURANT_1, segments, TestData.OFFER_TYPE_FLATX, float(value))
+            done.set()
+        
+        thread = threading.Thread(target=writer)
+        thread.start()
+        torn_reads = 0
+        while not done.is_set():
+            offers = table.get_offers(TestData.RESTAURANT_1)
+            values = {offer['offer_value'] for offer in offers.values()}
+            torn_reads += len(values) != 1
+        thread.join()
+        assert torn_reads == 0
+        assert table.version == 20000
+    
+    def test_shards(self):
+        """Test that restaurants are spread over shards that version their rows independently."""
+        table = OfferTable(shards=4)
+        assert OfferTable().shard_count == DEFAULT_SHARDS
+        for restaurant_id in range(8):
+            table.set_offer(restaurant_id, [TestData.SEGMENT_P1], TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10)
+        assert len(table) == 8
+        assert table.version == 8
+        # Restaurants 0 and 4 share a shard, 1 is the first write to its shard
+        assert table.get_versioned_offers(0)[0] == 1
+        assert table.get_versioned_offers(4)[0] == 2
+        assert table.get_versioned_offers(1)[0] == 1
+        assert sorted(restaurant_id for restaurant_id, _ in table.items()) == list(range(8))
+        with pytest.raises(ValueError):
+            OfferTable(shards=3)
+    
+    def test_set_offers_keeps_order_and_valid_prefix(self):
+        """Test that bulk writes fan out by shard but keep per-restaurant order and earlier entries on error."""
+        table = OfferTable(shards=4)
+        with pytest.raises(ValueError):
+            table.set_offers([
+                (1, TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10, [TestData.SEGMENT_P1]),
+                (2, TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10, [TestData.SEGMENT_P1]),
+                (1, TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_20, [TestData.SEGMENT_P1]),
+                (3, TestData.OFFER_TYPE_INVALID, TestData.OFFER_VALUE_10, [TestData.SEGMENT_P1]),
+                (4, TestData.OFFER_TYPE_FLATX, TestData.OFFER_VALUE_10, [TestData.SEGMENT_P1]),
+            ])
+        assert table.lookup(1, TestData.SEGMENT_P1).value == TestData.OFFER_VALUE_20
+        assert 2 in table
+        assert 3 not in table and 4 not in table
+    
+    def test_concurrent_writers_on_shards(self):
+        """Test that writers to different shards do not lose updates."""
+        table = OfferTable(shards=4)
+        
+        def writer(offset):
+            for value in range(500):
+                table.set_offers([(offset + 4 * index, TestData.OFFER_TYPE_FLATX, float(value), [TestData.SEGMENT_P1])
+                                  for index in range(5)])
+        
+        threads = [threading.Thread(target=writer, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(table) == 20
+        assert table.version == 4 * 500 * 5
+        assert all(table.lookup(restaurant_id, TestData.SEGMENT_P1).value == 499.0 for restaurant_id in range(20))
@@ -0,0 +1,115 @@
+"""
+Test cases for the integer-paise pricing engine.
+"""
+import random
+from array import array
+
+import pytest
+
+import mock_service
+import paise
+from api.cart_api import CartAPI
+from pricing import DISCOUNTS, FLAT_PERCENT_CODE, FLATX_CODE
+from test_data.test_data import TestData
+
+
+# Cart and offer values used by test_cart_offers.py
+CART_VALUES = [value for name, value in vars(TestData).items() if name.startswith('CART_VALUE_')]
+OFFER_VALUES = [value for name, value in vars(TestData).items() if name.startswith('OFFER_VALUE_') and value >= 0]
+
+# The only results that differ from the float engine for those values: the
+# exact discount is half a paisa, which HALF_UP gives to the customer while
+# round(0.005, 2) rounds the binary value up to 0.01
+DOCUMENTED_DIFFERENCES = {(0.01, 50.0, FLAT_PERCENT_CODE): (0.01, 0)}
+
+
+@pytest.fixture
+def paise_engine():
+    """Serve apply_offer with the paise engine for one test."""
+    mock_service.set_pricing_engine('paise')
+    yield
+    mock_service.set_pricing_engine('float')
+
+
+class TestPaiseArithmetic:
+    """Test cases for discounts in integer paise."""
+
+    def test_rounding_modes(self):
+        """Test that a discount of 62.5 paise rounds as each mode says."""
+        assert paise.percent_discount(500, 1250, paise.ROUND_HALF_UP) == 63
+        assert paise.percent_discount(500, 1250, paise.ROUND_HALF_EVEN) == 62
+        assert paise.percent_discount(1500, 1250, paise.ROUND_HALF_EVEN) == 188
+        assert paise.percent_discount(500, 1250, paise.ROUND_DOWN) == 62
+        assert paise.percent_discount(500, 1250, paise.ROUND_UP) == 63
+        assert paise.percent_discount(500, 1000, paise.ROUND_UP) == 50
+        with pytest.raises(ValueError):
+            paise.percent_discount(500, 1250, 'NEAREST')
+
+    def test_offers_and_caps(self):
+        """Test FLATX, FLAT% and capped FLAT% results, clamped at zero."""
+        assert paise.flatx(20000, 1000) == 19000
+        assert paise.flatx(500, 1000) == 0
+        assert paise.flat_percent(10050, 1250) == 8794
+        assert paise.flat_percent(100000, 2000, max_discount_paise=10000) == 90000
+        assert paise.flat_percent(100, 10100) == 0
+        assert paise.to_paise(100.5) == 10050 and paise.to_basis_points(12.5) == 1250
+        assert paise.from_paise(8794) == 87.94
+
+    def test_batches_match_single_carts(self):
+        """Test that array batches give the single-cart result for every cart and mode."""
+        rng = random.Random(22)
+        carts = array('q', [rng.randrange(0, 10 ** 7) for _ in range(500)] + [0, 1, 5, 50])
+        for rounding in paise.ROUNDING_MODES:
+            for basis_points, cap in ((1250, None), (3333, 20000), (0, None), (10000, 1)):
+                assert paise.flat_percent_batch(carts, basis_points, cap, rounding) == array('q', [
+                    paise.flat_percent(cart, basis_points, cap, rounding) for cart in carts
+                ])
+        assert paise.flatx_batch(carts, 5000) == array('q', [paise.flatx(cart, 5000) for cart in carts])
+
+    def test_same_results_as_float_engine(self):
+        """Test that the paise tables match pricing.DISCOUNTS for the suite's values, or differ as documented."""
+        discounts, batch_discounts = paise.discount_tables('paise')
+        for cart_value in CART_VALUES:
+            for offer_value in OFFER_VALUES:
+                for code in (FLATX_CODE, FLAT_PERCENT_CODE):
+                    expected = DISCOUNTS[code](cart_value, offer_value)
+                    result = discounts[code](cart_value, offer_value)
+                    if (cart_value, offer_value, code) in DOCUMENTED_DIFFERENCES:
+                        assert (expected, result) == DOCUMENTED_DIFFERENCES[cart_value, offer_value, code]
+                        continue
+                    assert result == expected and type(result) is type(expected)
+        for code in (FLATX_CODE, FLAT_PERCENT_CODE):
+            assert batch_discounts[code](CART_VALUES, 12.5) == [discounts[code](value, 12.5) for value in CART_VALUES]
+        # No paise value: left to the float functions
+        assert discounts[FLATX_CODE](float('inf'), 10) == DISCOUNTS[FLATX_CODE](float('inf'), 10) == float('inf')
+
+    def test_unknown_engine(self):
+        """Test that unknown engines and rounding modes are rejected."""
+        with pytest.raises(ValueError):
+            paise.discount_tables('decimal')
+        with pytest.raises(ValueError):
+            mock_service.set_pricing_engine('paise', 'NEAREST')
+        assert mock_service.pricing_engine == 'float'
+
+
+class TestPaiseService:
+    """Test cases for the service switched to the paise engine."""
+
+    def test_apply_offer(self, api_client: CartAPI, paise_engine):
+        """Test that single, batch and local results use paise rounding."""
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        api_client.add_offer(TestData.RESTAURANT_1, 'FLAT%', TestData.OFFER_VALUE_12_5, ['p1'])
+
+        response = api_client.apply_offer(TestData.CART_VALUE_100_50, TestData.USER_1, TestData.RESTAURANT_1)
+        assert response['data']['cart_value'] == TestData.EXPECTED_87_94
+        # 5.00 - 0.625: the float engine gives 4.38
+        assert api_client.apply_offer(5, TestData.USER_1, TestData.RESTAURANT_1)['data']['cart_value'] == 4.37
+        response = api_client.apply_offers_batch([
+            {'cart_value': value, 'user_id': TestData.USER_1, 'restaurant_id': TestData.RESTAURANT_1}
+            for value in (5, 100.5)
+        ])
+        assert response['data']['results'] == [{'cart_value': 4.37}, {'cart_value': 87.94}]
+
+        client = CartAPI(api_client.base_url, pricing_engine='paise')
+        client.enable_local_evaluation()
+        assert client._local_quote(5, TestData.USER_1, TestData.RESTAURANT_1) == 4.37
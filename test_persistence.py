@@ -0,0 +1,154 @@
+"""
+Test cases for write-ahead log and snapshot persistence.
+"""
+import glob
+import os
+import time
+import pytest
+import mock_service
+from api.cart_api import CartAPI
+from persistence import FSYNC_ALWAYS, FSYNC_NEVER, Persistence, WAL_PATTERN
+from test_data.test_data import TestData
+
+
+class DictState:
+    """Minimal key/value state driven by persistence records."""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def apply_record(self, record):
+        self.data[record['key']] = record['value']
+    
+    def dump_records(self):
+        for key, value in self.data.items():
+            yield {'key': key, 'value': value}
+    
+    def open(self, directory, **kwargs):
+        manager = Persistence(directory, self.apply_record, self.dump_records, snapshot_interval=0, **kwargs)
+        return manager, manager.recover()
+    
+    def write(self, manager, key, value):
+        record = {'key': key, 'value': value}
+        self.apply_record(record)
+        manager.log(record)
+        manager.sync()
+
+
+class TestPersistence:
+    """Test cases for WAL replay, snapshots and recovery."""
+    
+    def test_wal_replay_after_restart(self, tmp_path):
+        """Test that logged records are replayed on startup."""
+        state = DictState()
+        manager, stats = state.open(str(tmp_path), fsync_policy=FSYNC_ALWAYS)
+        assert stats['wal_records'] == 0
+        state.write(manager, 'a', 1)
+        state.write(manager, 'b', 2)
+        state.write(manager, 'a', 3)
+        manager.close()
+        
+        restarted = DictState()
+        manager, stats = restarted.open(str(tmp_path))
+        manager.close()
+        assert restarted.data == {'a': 3, 'b': 2}
+        assert stats['wal_records'] == 3
+        assert stats['last_lsn'] == 3
+    
+    def test_snapshot_compacts_log(self, tmp_path):
+        """Test that a snapshot drops covered WAL segments and only the tail is replayed."""
+        state = DictState()
+        manager, _ = state.open(str(tmp_path), fsync_policy=FSYNC_NEVER)
+        for value in range(100):
+            state.write(manager, 'key', value)
+        snapshot = manager.snapshot()
+        assert snapshot == {'lsn': 100, 'records': 1, 'seconds': snapshot['seconds']}
+        state.write(manager, 'tail', 'value')
+        manager.close()
+        assert len(glob.glob(os.path.join(str(tmp_path), WAL_PATTERN))) == 1
+        
+        restarted = DictState()
+        manager, stats = restarted.open(str(tmp_path))
+        manager.close()
+        assert restarted.data == {'key': 99, 'tail': 'value'}
+        assert stats['snapshot_lsn'] == 100
+        assert stats['snapshot_records'] == 1
+        assert stats['wal_records'] == 1
+    
+    def test_torn_record_is_discarded(self, tmp_path):
+        """Test that a record torn by a crash is dropped and later writes stay readable."""
+        state = DictState()
+        manager, _ = state.open(str(tmp_path))
+        state.write(manager, 'a', 1)
+        manager.close()
+        wal_path = glob.glob(os.path.join(str(tmp_path), WAL_PATTERN))[0]
+        with open(wal_path, 'ab') as f:
+            f.write(b'{"lsn":2,"key":"b","val')
+        
+        restarted = DictState()
+        manager, stats = restarted.open(str(tmp_path))
+        restarted.write(manager, 'c', 3)
+        manager.close()
+        assert stats['last_lsn'] == 1
+        
+        final = DictState()
+        manager, _ = final.open(str(tmp_path))
+        manager.close()
+        assert final.data == {'a': 1, 'c': 3}
+    
+    def test_invalid_fsync_policy(self, tmp_path):
+        """Test that an unknown fsync policy is rejected."""
+        with pytest.raises(ValueError):
+            Persistence(str(tmp_path), lambda record: None, lambda: [], fsync_policy='sometimes')
+
+
+class TestServicePersistence:
+    """Test cases for persisting mock service state."""
+    
+    def test_offers_and_segments_survive_restart(self, api_client: CartAPI, tmp_path):
+        """Test that offers and user segments are recovered after a restart."""
+        mock_service.enable_persistence(str(tmp_path), fsync_policy=FSYNC_ALWAYS, snapshot_interval=0)
+        try:
+            api_client.add_offer(**TestData.get_valid_flatx_offer_p1().to_dict())
+            user_segment = TestData.get_user_segment_p1()
+            api_client.set_user_segment(user_segment.user_id, user_segment.segment)
+            mock_service.persistence.snapshot()
+            api_client.set_user_segments_bulk([{'user_id': TestData.USER_2, 'segment': TestData.SEGMENT_P2}])
+        finally:
+            mock_service.disable_persistence()
+        
+        # Simulate a restart: lose in-memory state, then recover it
+        mock_service.offers_db.clear()
+        mock_service.user_segments_db.clear()
+        stats = mock_service.enable_persistence(str(tmp_path), snapshot_interval=0)
+        try:
+            assert stats['wal_records'] == 1
+            response = api_client.apply_offer(**TestData.get_cart_apply_offer_p1().to_dict())
+            assert response['data']['cart_value'] == TestData.EXPECTED_190
+            assert api_client.get_user_segment(TestData.USER_2)['data']['segment'] == TestData.SEGMENT_P2
+        finally:
+            mock_service.disable_persistence()
+    
+    def test_offer_windows_survive_restart(self, api_client: CartAPI, tmp_path):
+        """Test that expiring and not yet active offers are rescheduled on recovery."""
+        now = time.time()
+        mock_service.enable_persistence(str(tmp_path), fsync_policy=FSYNC_ALWAYS, snapshot_interval=0)
+        try:
+            api_client.add_offer(1, 'FLATX', 10, ['p1'], valid_until=now + 3600)
+            mock_service.persistence.snapshot()
+            api_client.add_offer(2, 'FLAT%', 5, ['p2'], valid_from=now + 60, valid_until=now + 120)
+        finally:
+            mock_service.disable_persistence()
+        
+        mock_service.offers_db.clear()
+        mock_service.offer_scheduler.clear()
+        mock_service.enable_persistence(str(tmp_path), snapshot_interval=0)
+        try:
+            assert mock_service.offers_db.get_offers(1)['p1']['valid_until'] == now + 3600
+            assert 2 not in mock_service.offers_db
+            assert [due for due, _, _ in mock_service.offer_scheduler.pending()] == [now + 60, now + 3600]
+            
+            mock_service.offer_scheduler.run_due(now + 3601)
+            assert 1 not in mock_service.offers_db and 2 not in mock_service.offers_db
+        finally:
+            mock_service.disable_persistence()
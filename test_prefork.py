@@ -0,0 +1,146 @@
+"""
+Test cases for the pre-forking multi-process server.
+"""
+import os
+import signal
+import subprocess
+import json
+import sys
+import time
+import pytest
+from api.cart_api import CartAPI
+from test_data.test_data import TestData
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-forking requires os.fork()")
+
+
+class PreforkProcess:
+    """A prefork.py server running in a subprocess, with its log lines."""
+    
+    def __init__(self, workers, env=None):
+        self.process = subprocess.Popen(
+            [sys.executable, '-u', 'prefork.py', '--workers', str(workers), '--host', '127.0.0.1', '--port', '0'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True,
+            env={
+                **{key: value for key, value in os.environ.items() if key not in ('DATA_DIR', 'MMAP_SNAPSHOT')},
+                **(env or {})
+            }
+        )
+        line = self.wait_for('listening on')
+        self.port = int(line.split()[2].rsplit(':', 1)[1])
+        self.client = CartAPI(base_url=f'http://127.0.0.1:{self.port}')
+    
+    def wait_for(self, text, count=1):
+        """Read log lines until count lines containing text were seen; return the last."""
+        while count:
+            line = self.process.stdout.readline()
+            if not line:
+                pytest.fail(f"server exited while waiting for {text!r}")
+            if text in line:
+                count -= 1
+        return line
+    
+    def wait_for_workers(self, text, count):
+        """Worker pids from the next count log lines containing text."""
+        return [int(self.wait_for(text).split()[1]) for _ in range(count)]
+    
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=30)
+
+
+@pytest.fixture
+def prefork_server():
+    server = PreforkProcess(workers=2)
+    server.workers = server.wait_for_workers('started', 2)
+    yield server
+    server.stop()
+
+
+def apply_many(client, count=20):
+    """Apply the p1 cart count times over fresh connections."""
+    cart = TestData.get_cart_apply_offer_p1().to_dict()
+    return {client.apply_offer(**cart)['data']['cart_value'] for _ in range(count)}
+
+
+class TestPrefork:
+    """Test cases for write propagation, restarts and worker supervision."""
+    
+    def test_writes_reach_every_worker(self, prefork_server):
+        """Test that a write accepted by one worker is visible from all of them."""
+        client = prefork_server.client
+        assert client.add_offer(**TestData.get_valid_flatx_offer_p1().to_dict())['status_code'] == 200
+        user_segment = TestData.get_user_segment_p1()
+        assert client.set_user_segment(user_segment.user_id, user_segment.segment)['status_code'] == 200
+        assert apply_many(client) == {TestData.EXPECTED_190}
+        
+        response = client.set_user_segments_bulk([{'user_id': TestData.USER_2, 'segment': TestData.SEGMENT_P2}])
+        assert response['data']['inserted'] == 1
+        assert {client.get_user_segment(TestData.USER_2)['data']['segment'] for _ in range(10)} == {TestData.SEGMENT_P2}
+    
+    def test_graceful_restart_keeps_state(self, prefork_server):
+        """Test that SIGHUP replaces every worker without losing state."""
+        client = prefork_server.client
+        client.add_offer(**TestData.get_valid_flatx_offer_p1().to_dict())
+        user_segment = TestData.get_user_segment_p1()
+        client.set_user_segment(user_segment.user_id, user_segment.segment)
+        
+        prefork_server.process.send_signal(signal.SIGHUP)
+        new_workers = prefork_server.wait_for_workers('started (generation 1)', 2)
+        exited = prefork_server.wait_for_workers('exited', 2)
+        assert sorted(exited) == sorted(prefork_server.workers)
+        assert not set(new_workers) & set(prefork_server.workers)
+        assert apply_many(client) == {TestData.EXPECTED_190}
+    
+    def test_dead_worker_is_replaced(self, prefork_server):
+        """Test that a crashed worker is replaced by one with the current state."""
+        client = prefork_server.client
+        client.add_offer(**TestData.get_valid_flatx_offer_p1().to_dict())
+        user_segment = TestData.get_user_segment_p1()
+        client.set_user_segment(user_segment.user_id, user_segment.segment)
+        
+        os.kill(prefork_server.workers[0], signal.SIGKILL)
+        prefork_server.wait_for('exited')
+        prefork_server.wait_for('started')
+        assert apply_many(client) == {TestData.EXPECTED_190}
+    
+    def test_scheduled_offers_reach_every_worker(self, prefork_server):
+        """Test that offers activated and expired by the parent's scheduler change what every worker applies."""
+        client = prefork_server.client
+        now = time.time()
+        client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        client.add_offer(TestData.RESTAURANT_1, 'FLATX', 10, ['p1'], valid_until=now + 1.5)
+        client.add_offer(TestData.RESTAURANT_2, 'FLATX', 10, ['p1'], valid_from=now + 1.5)
+        
+        def quotes(restaurant_id):
+            return {client.apply_offer(200, TestData.USER_1, restaurant_id)['data']['cart_value'] for _ in range(10)}
+        
+        assert quotes(TestData.RESTAURANT_1) == {TestData.EXPECTED_190}
+        assert quotes(TestData.RESTAURANT_2) == {200.0}
+        time.sleep(max(0.0, now + 2.5 - time.time()))
+        assert quotes(TestData.RESTAURANT_1) == {200.0}
+        assert quotes(TestData.RESTAURANT_2) == {TestData.EXPECTED_190}
+    
+    def test_reload_reaches_every_worker(self, tmp_path):
+        """Test that SIGUSR1 reloads RELOAD_PATH in the parent and every worker then serves the reloaded data."""
+        path = tmp_path / 'data.ndjson'
+        path.write_text(
+            json.dumps({"op": "offers", "rows": [[TestData.RESTAURANT_1, 'FLATX', 10, ['p1']]]}) + '\n'
+            + json.dumps({"op": "segments", "rows": [[TestData.USER_1, 'p1']]}) + '\n'
+        )
+        server = PreforkProcess(workers=2, env={'RELOAD_PATH': str(path)})
+        try:
+            workers = server.wait_for_workers('started', 2)
+            client = server.client
+            client.add_offer(TestData.RESTAURANT_1, 'FLATX', 50, ['p1'])
+            client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+            assert apply_many(client) == {150.0}
+            
+            server.process.send_signal(signal.SIGUSR1)
+            assert '"restaurants": 1' in server.wait_for('Reload:')
+            server.wait_for_workers('started (generation 1)', 2)
+            assert sorted(server.wait_for_workers('exited', 2)) == sorted(workers)
+            assert apply_many(client) == {TestData.EXPECTED_190}
+        finally:
+            server.stop()
+
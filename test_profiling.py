@@ -0,0 +1,87 @@
+"""
+Test cases for on-demand request profiling.
+"""
+import requests
+import mock_service
+from api.cart_api import CartAPI
+from profiling import ProfilingMiddleware, RequestProfiler
+from test_data.test_data import TestData
+
+
+def busy_leaf():
+    return sum(range(20000))
+
+
+def busy_parent():
+    return busy_leaf()
+
+
+class TestRequestProfiler:
+    """Test cases for recording collapsed stacks."""
+
+    def test_collapsed_stacks(self):
+        """Test that profiled calls are reported as nested collapsed stacks."""
+        profiler = RequestProfiler()
+        timer = profiler.start()
+        busy_parent()
+        profiler.stop(timer)
+
+        assert profiler.requests == 1
+        lines = profiler.collapsed().splitlines()
+        leaf_stacks = [line for line in lines if 'busy_leaf (test_profiling.py' in line]
+        assert leaf_stacks
+        stack, microseconds = leaf_stacks[0].rsplit(' ', 1)
+        frames = stack.split(';')
+        assert frames[0].startswith('busy_parent (test_profiling.py')
+        assert frames[1].startswith('busy_leaf (test_profiling.py')
+        assert int(microseconds) > 0
+
+        profiler.reset()
+        assert profiler.collapsed() == '' and profiler.requests == 0
+
+    def test_request_selection(self):
+        """Test that requests are selected by header or sample rate only."""
+        assert RequestProfiler(allow_header=True).should_profile({'HTTP_X_PROFILE': '1'})
+        assert not RequestProfiler(allow_header=True).should_profile({'HTTP_X_PROFILE': '0'})
+        assert not RequestProfiler(allow_header=False).should_profile({'HTTP_X_PROFILE': '1'})
+        assert RequestProfiler(sample_rate=1.0, allow_header=False).should_profile({})
+        assert not RequestProfiler(sample_rate=0.0).should_profile({})
+
+
+class TestProfileEndpoints:
+    """Test cases for the profiling admin endpoints."""
+
+    def test_profile_apply_offer(self, api_client: CartAPI):
+        """Test profiling an apply_offer request selected by header and downloading its stacks."""
+        url = f'{api_client.base_url}/admin/profile'
+        assert requests.get(url).status_code == 404
+        assert not isinstance(mock_service.app.wsgi_app, ProfilingMiddleware)
+
+        offer = TestData.get_valid_flatx_offer_p1()
+        api_client.add_offer(offer.restaurant_id, offer.offer_type, offer.offer_value, offer.customer_segment)
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        cart = {'cart_value': 200, 'user_id': TestData.USER_1, 'restaurant_id': offer.restaurant_id}
+        try:
+            response = requests.post(url, json={'sample_rate': 0})
+            assert response.json() == {'sample_rate': 0.0, 'allow_header': True}
+
+            response = requests.post(f'{api_client.base_url}/api/v1/cart/apply_offer', json=cart,
+                                     headers={'X-Profile': '1'})
+            assert response.json()['cart_value'] == TestData.EXPECTED_190
+            requests.post(f'{api_client.base_url}/api/v1/cart/apply_offer', json=cart)
+
+            response = requests.get(url)
+            assert response.status_code == 200
+            assert response.headers['X-Profiled-Requests'] == '1'
+            assert 'attachment' in response.headers['Content-Disposition']
+            assert 'apply_offer (mock_service.py' in response.text
+        finally:
+            assert requests.delete(url).status_code == 200
+        assert requests.get(url).status_code == 404
+        assert not isinstance(mock_service.app.wsgi_app, ProfilingMiddleware)
+
+    def test_invalid_sample_rate(self, api_client: CartAPI):
+        """Test that an out-of-range sample rate is rejected."""
+        response = requests.post(f'{api_client.base_url}/admin/profile', json={'sample_rate': 2})
+        assert response.status_code == 400
+        assert mock_service.profiler is None
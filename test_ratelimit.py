@@ -0,0 +1,146 @@
+"""
+Test cases for token-bucket rate limiting.
+"""
+import pytest
+import requests
+
+import mock_service
+from api.cart_api import CartAPI
+from ratelimit import RateLimiter, parse_budget, parse_route_budgets
+
+
+class FakeClock:
+    """Monotonic clock moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def rate_limited():
+    """Limit the offer route to a burst of 2 per client for one test."""
+    limiter = mock_service.enable_rate_limiting(routes={'/api/v1/offer': (0.001, 2)}, client_header='X-Client-Id')
+    yield limiter
+    mock_service.disable_rate_limiting()
+
+
+class TestRateLimiter:
+    """Test cases for the per-client, per-route buckets."""
+
+    def test_burst_then_refill(self):
+        """Test that a client gets its burst, is shed with the time to wait, and is admitted once it has passed."""
+        clock = FakeClock()
+        limiter = RateLimiter(default=(10, 3), clock=clock)
+        assert [limiter.admit('a', '/x') for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert limiter.admit('a', '/x') == pytest.approx(0.1)
+        assert limiter.shed == 1
+
+        clock.now += 0.1
+        assert limiter.admit('a', '/x') == 0.0
+        assert limiter.admit('a', '/x') > 0
+        clock.now += 10
+        assert [limiter.admit('a', '/x') for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    def test_budgets_are_per_client_and_route(self):
+        """Test that clients and routes have separate buckets, and exempt and unlimited routes are never shed."""
+        limiter = RateLimiter(routes={'/a': (1, 1), '/b': (1, 2)}, clock=FakeClock())
+        assert limiter.admit('c1', '/a') == 0.0 and limiter.admit('c1', '/a') > 0
+        assert limiter.admit('c2', '/a') == 0.0
+        assert limiter.admit('c1', '/b') == 0.0 and limiter.admit('c1', '/b') == 0.0
+        assert limiter.admit('c1', '/b') > 0
+        assert all(limiter.admit('c1', path) == 0.0 for path in ('/health', '/other') for _ in range(100))
+        assert limiter.stats()['/a'] == {'rate': 1, 'burst': 1, 'clients': 2, 'overflowing': False, 'shed': 1}
+
+    def test_full_buckets_are_forgotten(self):
+        """Test that past max_clients, clients whose buckets refilled are dropped and others kept."""
+        clock = FakeClock()
+        limiter = RateLimiter(default=(1, 5), max_clients=2, clock=clock)
+        limiter.admit('old', '/x')
+        clock.now += 5
+        limiter.admit('busy', '/x')
+        limiter.admit('new', '/x')
+        assert limiter.stats()['*']['clients'] == 2
+        assert limiter.admit('busy', '/x') == 0.0 and limiter.stats()['*']['clients'] == 2
+
+    def test_untracked_clients_share_a_bucket(self):
+        """Test that when no tracked bucket has refilled the table stays bounded and new clients share one budget."""
+        clock = FakeClock()
+        limiter = RateLimiter(default=(1, 2), max_clients=3, clock=clock)
+        for client in ('a', 'b', 'c'):
+            limiter.admit(client, '/x')
+        # Rotating identities gets one shared burst, not a burst each
+        assert limiter.admit('spoofed-1', '/x') == 0.0 and limiter.admit('spoofed-2', '/x') == 0.0
+        assert limiter.admit('spoofed-3', '/x') > 0
+        stats = limiter.stats()['*']
+        assert stats['clients'] == 3 and stats['overflowing']
+        # Tracked clients keep their own buckets
+        assert limiter.admit('a', '/x') == 0.0
+
+        clock.now += 10
+        assert limiter.admit('new', '/x') == 0.0
+        assert limiter.stats()['*']['clients'] == 3
+
+    def test_parse_budgets(self):
+        """Test the environment variable formats and invalid budgets."""
+        assert parse_budget('100:20') == (100.0, 20.0)
+        assert parse_budget('50') == (50.0, 50.0)
+        assert parse_route_budgets('/api/v1/offer=5:1, /metrics=1') == {
+            '/api/v1/offer': (5.0, 1.0), '/metrics': (1.0, 1.0)
+        }
+        with pytest.raises(ValueError):
+            parse_route_budgets('offer=5:1')
+        with pytest.raises(ValueError):
+            RateLimiter(default=(0, 1))
+        with pytest.raises(ValueError):
+            RateLimiter(routes={'/a': (1, 0.5)})
+        with pytest.raises(ValueError):
+            RateLimiter(default=(1, 1), max_clients=0)
+
+
+class TestRateLimitedService:
+    """Test cases for shedding through the service's middleware."""
+
+    def test_shed_before_parsing(self, api_client: CartAPI, rate_limited):
+        """Test that requests over budget get 429 and Retry-After whatever their body, and health still answers."""
+        url = f'{api_client.base_url}/api/v1/offer'
+        headers = {'X-Client-Id': 'flood', 'Content-Type': 'application/json'}
+        # Within budget the body is parsed and rejected
+        assert requests.post(url, data=b'{not json', headers=headers).status_code == 500
+        assert requests.post(url, data=b'{not json', headers=headers).status_code == 500
+
+        response = requests.post(url, data=b'{not json', headers=headers)
+        assert response.status_code == 429
+        assert response.json() == {'error': 'Too many requests'}
+        assert int(response.headers['Retry-After']) >= 1
+
+        assert requests.get(f'{api_client.base_url}/health', headers=headers).status_code == 200
+        other = {'X-Client-Id': 'other'}
+        assert requests.get(url, params={'restaurant_id': 1}, headers=other).status_code == 404
+        assert 'cart_offers_requests_shed 1' in requests.get(f'{api_client.base_url}/metrics').text
+
+    def test_header_not_trusted_by_default(self, api_client: CartAPI):
+        """Test that without a trusted header, changing X-Client-Id does not buy a new budget."""
+        mock_service.enable_rate_limiting(routes={'/api/v1/offer': (0.001, 1)})
+        try:
+            url = f'{api_client.base_url}/api/v1/offer'
+            statuses = [
+                requests.get(url, params={'restaurant_id': 1}, headers={'X-Client-Id': f'id-{index}'}).status_code
+                for index in range(3)
+            ]
+            assert statuses == [404, 429, 429]
+        finally:
+            mock_service.disable_rate_limiting()
+
+    def test_disable(self, api_client: CartAPI, rate_limited):
+        """Test that disabling removes the middleware and keeps the rest of the chain."""
+        mock_service.enable_profiling()
+        mock_service.disable_rate_limiting()
+        assert mock_service.rate_limiter is None
+        assert isinstance(mock_service.app.wsgi_app, mock_service.ProfilingMiddleware)
+        mock_service.disable_profiling()
+        assert isinstance(mock_service.app.wsgi_app, mock_service.MetricsMiddleware)
+        for _ in range(5):
+            assert api_client.get_offers(1)['status_code'] == 404
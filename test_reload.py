@@ -0,0 +1,188 @@
+"""
+Test cases for hot reloads of offers and user segments from a file.
+"""
+import json
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+import mock_service
+from api.cart_api import CartAPI
+from persistence import FSYNC_ALWAYS, SNAPSHOT_FILE
+from segment_store import SegmentStore
+from test_data.test_data import TestData
+
+
+def write_records(path, header: bool = True) -> None:
+    """Write the current state to path in the snapshot format, and clear it."""
+    with open(path, 'w') as f:
+        if header:
+            f.write(json.dumps({"lsn": 1, "created": time.time()}) + '\n')
+        for record in mock_service.dump_records():
+            f.write(json.dumps(record) + '\n')
+    mock_service.offers_db.clear()
+    mock_service.user_segments_db.clear()
+
+
+def wait_for_reload(timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while mock_service.reload_running() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+class TestReloadData:
+    """Test cases for building new tables and swapping them in."""
+
+    def test_replaces_state(self, tmp_path):
+        """Test that the file's offers, chains and segments replace the current ones and the epoch changes."""
+        now = time.time()
+        mock_service.offers_db.set_offer(1, ['p1'], 'FLATX', 20)
+        mock_service.offers_db.set_chain(2, 7)
+        mock_service.offers_db.set_chain_offer(7, ['p2'], 'FLAT%', 10)
+        mock_service.apply_record({"op": "offers", "rows": [[3, 'FLATX', 5, ['p3'], None, now + 60]]})
+        mock_service.user_segments_db[TestData.USER_1] = 'p1'
+        offers = dict(mock_service.offers_db.items())
+        write_records(tmp_path / 'data.ndjson')
+
+        mock_service.offers_db.set_offer(9, ['p1'], 'FLATX', 1)
+        mock_service.user_segments_db[TestData.USER_2] = 'p2'
+        epoch = mock_service.offers_db.epoch
+        report = mock_service.reload_data(str(tmp_path / 'data.ndjson'))
+
+        assert dict(mock_service.offers_db.items()) == offers
+        assert mock_service.offers_db.chain_of(2) == 7
+        assert dict(mock_service.user_segments_db.items()) == {TestData.USER_1: 'p1'}
+        assert mock_service.offers_db.epoch != epoch
+        assert report['records'] == 4 and report['restaurants'] == 3 and report['users'] == 1
+        assert report['replayed_writes'] == 0
+        assert report['build_seconds'] >= 0 and report['swap_pause_seconds'] >= 0
+        # The expiry of the reloaded offer is scheduled again
+        mock_service.offer_scheduler.run_due(now + 61)
+        assert 3 not in mock_service.offers_db
+
+    def test_invalid_file_keeps_state(self, tmp_path):
+        """Test that a bad record fails the reload and leaves the tables and listeners as they were."""
+        path = tmp_path / 'bad.ndjson'
+        path.write_text('{"op": "offers", "rows": [[1, "FLATX", 5, ["p1"]]]}\n{"op": "drop"}\n')
+        mock_service.offers_db.set_offer(2, ['p1'], 'FLATX', 20)
+        listeners = list(mock_service.write_listeners)
+
+        with pytest.raises(ValueError, match='line 2'):
+            mock_service.reload_data(str(path))
+        assert list(mock_service.offers_db.items()) == [(2, {'p1': {'offer_type': 'FLATX', 'offer_value': 20}})]
+        assert mock_service.write_listeners == listeners
+        with pytest.raises(OSError):
+            mock_service.reload_data(str(tmp_path / 'missing.ndjson'))
+
+    def test_new_state_is_durable_before_it_is_served(self, tmp_path, monkeypatch):
+        """Test that the store keeps its settings and the snapshot holds the new state by the time it is switched in."""
+        monkeypatch.setattr(mock_service, 'user_segments_db', SegmentStore(dense_limit=64))
+        mock_service.offers_db.set_offer(1, ['p1'], 'FLATX', 20)
+        mock_service.user_segments_db[TestData.USER_1] = 'p1'
+        write_records(tmp_path / 'data.ndjson')
+        data_dir = str(tmp_path / 'data')
+        mock_service.enable_persistence(data_dir, fsync_policy=FSYNC_ALWAYS, snapshot_interval=0)
+        try:
+            mock_service._commit({"op": "offers", "rows": [[9, 'FLATX', 5, ['p1']]]})
+            snapshot_at_swap = []
+            replace_contents = mock_service.offers_db.replace_contents
+            
+            def replace_and_look(offers):
+                with open(os.path.join(data_dir, SNAPSHOT_FILE)) as f:
+                    snapshot_at_swap.extend(json.loads(line) for line in f)
+                replace_contents(offers)
+            
+            monkeypatch.setattr(mock_service.offers_db, 'replace_contents', replace_and_look)
+            mock_service.reload_data(str(tmp_path / 'data.ndjson'))
+            assert mock_service.user_segments_db.dense_limit == 64
+            assert {"op": "offers", "rows": [[1, 'FLATX', 20.0, ['p1']]]} in snapshot_at_swap
+            mock_service._commit({"op": "segments", "rows": [[TestData.USER_2, 'p2']]})
+        finally:
+            mock_service.disable_persistence()
+        
+        # A restart recovers the reloaded state and the writes made after it
+        mock_service.offers_db.clear()
+        mock_service.user_segments_db.clear()
+        mock_service.enable_persistence(data_dir, snapshot_interval=0)
+        try:
+            assert sorted(restaurant_id for restaurant_id, _ in mock_service.offers_db.items()) == [1]
+            assert dict(mock_service.user_segments_db.items()) == {TestData.USER_1: 'p1', TestData.USER_2: 'p2'}
+        finally:
+            mock_service.disable_persistence()
+    
+    @pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason="needs named pipes")
+    def test_writes_during_build_are_kept(self, api_client: CartAPI, tmp_path):
+        """Test that writes committed while the file is read are applied to the new tables as well."""
+        path = str(tmp_path / 'pipe')
+        os.mkfifo(path)
+        assert mock_service.start_reload(path)
+        # Opening blocks until the reload has opened the file, so the writes below happen during the build
+        with open(path, 'w') as f:
+            f.write(json.dumps({"op": "offers", "rows": [[1, 'FLATX', 10, ['p1']]]}) + '\n')
+            f.flush()
+            assert not mock_service.start_reload(path)
+            assert api_client.add_offer(2, 'FLAT%', 15, ['p2'])['status_code'] == 200
+            api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+            f.write(json.dumps({"op": "segments", "rows": [[TestData.USER_2, 'p3']]}) + '\n')
+        wait_for_reload()
+
+        assert mock_service.last_reload['replayed_writes'] == 2
+        assert mock_service.offers_db.get_offers(1) == {'p1': {'offer_type': 'FLATX', 'offer_value': 10}}
+        assert mock_service.offers_db.get_offers(2) == {'p2': {'offer_type': 'FLAT%', 'offer_value': 15.0}}
+        assert dict(mock_service.user_segments_db.items()) == {TestData.USER_1: 'p1', TestData.USER_2: 'p3'}
+
+
+class TestReloadEndpoint:
+    """Test cases for /admin/reload."""
+
+    def test_reload_while_serving(self, api_client: CartAPI, tmp_path, monkeypatch):
+        """Test that a reload started over HTTP swaps in the file's data, and requests are served throughout."""
+        rows = [[restaurant_id, 'FLAT%', 10, ['p1']] for restaurant_id in range(1, 20001)]
+        mock_service.apply_record({"op": "offers", "rows": rows})
+        mock_service.user_segments_db[TestData.USER_1] = 'p1'
+        write_records(tmp_path / 'data.ndjson', header=False)
+        api_client.add_offer(1, 'FLATX', 50, ['p1'])
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        etag = requests.get(f'{api_client.base_url}/api/v1/offer', params={'restaurant_id': 1}).headers['ETag']
+
+        url = f'{api_client.base_url}/admin/reload'
+        monkeypatch.setattr(mock_service, 'reload_path', str(tmp_path / 'data.ndjson'))
+        stop = threading.Event()
+        statuses = []
+
+        def serve():
+            while not stop.is_set():
+                statuses.append(api_client.apply_offer(200, TestData.USER_1, 1)['status_code'])
+
+        reader = threading.Thread(target=serve)
+        reader.start()
+        try:
+            response = requests.post(url)
+            assert response.status_code == 202
+            wait_for_reload()
+        finally:
+            stop.set()
+            reader.join()
+
+        status = requests.get(url).json()
+        assert status['running'] is False and status['last']['restaurants'] == 20000
+        assert 'swap_pause_seconds' in status['last'] and 'build_seconds' in status['last']
+        assert set(statuses) == {200}
+        assert api_client.apply_offer(200, TestData.USER_1, 1)['data']['cart_value'] == 180.0
+        response = requests.get(f'{api_client.base_url}/api/v1/offer', params={'restaurant_id': 1},
+                                headers={'If-None-Match': etag})
+        assert response.status_code == 200
+
+    def test_bad_requests(self, api_client: CartAPI, tmp_path, monkeypatch):
+        """Test that only RELOAD_PATH is reloaded and a failed reload is reported."""
+        url = f'{api_client.base_url}/admin/reload'
+        assert requests.post(url, json={}).status_code == 400
+        monkeypatch.setattr(mock_service, 'reload_path', str(tmp_path / 'missing.ndjson'))
+        response = requests.post(url, json={'path': '/etc/passwd'})
+        assert response.status_code == 400 and 'RELOAD_PATH' in response.json()['error']
+        assert requests.post(url).status_code == 202
+        wait_for_reload()
+        assert 'error' in requests.get(url).json()['last']
@@ -0,0 +1,38 @@
+"""
+Test cases for pre-encoded response bodies.
+"""
+import pytest
+import requests
+from flask import jsonify
+from mock_service import app
+from responses import HEALTHY_BODY, SUCCESS_BODY, encode_cart_value
+
+
+class TestResponses:
+    """Test cases for the pre-encoded response fast path."""
+    
+    @pytest.mark.parametrize('cart_value', [0, 190.0, 87.94, 89.9991, 0.1 + 0.2, 1e16, 1e-7, 123456789012, -0.0])
+    def test_cart_value_matches_jsonify(self, cart_value):
+        """Test that the fast cart_value rendering is byte-for-byte what jsonify produces."""
+        with app.app_context():
+            assert encode_cart_value(cart_value) == jsonify({"cart_value": cart_value}).get_data()
+    
+    @pytest.mark.parametrize('cart_value', [float('inf'), float('-inf'), float('nan'), True, '190'])
+    def test_cart_value_fallback(self, cart_value):
+        """Test that values outside the fast path are left to the generic encoder."""
+        assert encode_cart_value(cart_value) is None
+    
+    def test_constant_bodies_match_jsonify(self):
+        """Test that constant bodies are encoded exactly like jsonify output."""
+        with app.app_context():
+            assert SUCCESS_BODY == jsonify({"response_msg": "success"}).get_data()
+            assert HEALTHY_BODY == jsonify({"status": "healthy"}).get_data()
+    
+    def test_non_finite_cart_value_response(self, api_client):
+        """Test that a non-finite cart value still gets a JSON response."""
+        api_client.set_user_segment(1, 'p1')
+        response = requests.post(f'{api_client.base_url}/api/v1/cart/apply_offer',
+                                 data='{"cart_value": 1e999, "user_id": 1, "restaurant_id": 1}',
+                                 headers={'Content-Type': 'application/json'})
+        assert response.status_code == 200
+        assert response.json()['cart_value'] == float('inf')
@@ -0,0 +1,93 @@
+"""
+Test cases for the scheduler and offers with a validity window.
+"""
+import threading
+import time
+
+import mock_service
+from api.cart_api import CartAPI
+from scheduler import Scheduler
+from test_data.test_data import TestData
+
+
+class TestScheduler:
+    """Test cases for the timed action heap."""
+
+    def test_run_due_in_order(self):
+        """Test that only due actions run, earliest first, and are then dropped."""
+        scheduler = Scheduler(clock=lambda: 0.0)
+        ran = []
+        scheduler.schedule(30, ran.append, 'c')
+        scheduler.schedule(10, ran.append, 'a')
+        scheduler.schedule(20, ran.append, 'b')
+        scheduler.schedule(10, ran.append, 'a2')
+
+        assert [due for due, _, _ in scheduler.pending()] == [10, 10, 20, 30]
+        assert scheduler.run_due(now=20) == 3
+        assert ran == ['a', 'a2', 'b']
+        assert len(scheduler) == 1
+
+        scheduler.clear()
+        assert scheduler.run_due(now=100) == 0
+
+    def test_background_thread_runs_actions(self):
+        """Test that the background thread runs an action once it is due."""
+        scheduler = Scheduler()
+        done = threading.Event()
+        scheduler.schedule(time.time() + 0.05, done.set)
+        assert done.wait(2)
+        assert len(scheduler) == 0
+
+
+class TestOfferWindows:
+    """Test cases for valid_from and valid_until on offers."""
+
+    def test_offer_activates_and_expires(self, api_client: CartAPI):
+        """Test that a future offer applies only inside its window and its row is reclaimed."""
+        now = time.time()
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        response = api_client.add_offer(1, 'FLATX', 10, ['p1'], valid_from=now + 3600, valid_until=now + 7200)
+        assert response['status_code'] == 200
+
+        assert api_client.apply_offer(200, TestData.USER_1, 1)['data']['cart_value'] == 200
+        assert 1 not in mock_service.offers_db
+
+        mock_service.offer_scheduler.run_due(now + 3601)
+        assert api_client.apply_offer(200, TestData.USER_1, 1)['data']['cart_value'] == TestData.EXPECTED_190
+        offers = api_client.get_offers(1)['data']['offers']
+        assert offers['p1'] == {'offer_type': 'FLATX', 'offer_value': 10.0, 'valid_until': now + 7200}
+
+        mock_service.offer_scheduler.run_due(now + 7201)
+        assert api_client.apply_offer(200, TestData.USER_1, 1)['data']['cart_value'] == 200
+        assert 1 not in mock_service.offers_db
+        assert len(mock_service.offer_scheduler) == 0
+
+    def test_expiry_keeps_replaced_offers(self, api_client: CartAPI):
+        """Test that expiring an offer leaves segments whose offer was replaced since."""
+        now = time.time()
+        api_client.add_offer(1, 'FLATX', 10, ['p1', 'p2'], valid_until=now + 3600)
+        api_client.add_offer(1, 'FLATX', 10, ['p2'])
+
+        mock_service.offer_scheduler.run_due(now + 3601)
+        assert mock_service.offers_db.get_offers(1) == {'p2': {'offer_type': 'FLATX', 'offer_value': 10.0}}
+
+    def test_pending_and_expiring_offers_are_dumped(self, api_client: CartAPI):
+        """Test that snapshot records keep validity windows and pending activations."""
+        now = time.time()
+        api_client.add_offer(1, 'FLAT%', 5, ['p1'], valid_until=now + 3600)
+        api_client.add_offer(2, 'FLATX', 20, ['p3'], valid_from=now + 60)
+
+        rows = [row for record in mock_service.dump_records() if record['op'] == 'offers' for row in record['rows']]
+        assert [1, 'FLAT%', 5.0, ['p1'], None, now + 3600] in rows
+        assert [2, 'FLATX', 20.0, ['p3'], now + 60, None] in rows
+
+    def test_invalid_windows(self, api_client: CartAPI):
+        """Test that empty, past and non-numeric windows are rejected."""
+        now = time.time()
+        response = api_client.add_offer(1, 'FLATX', 10, ['p1'], valid_from=now + 60, valid_until=now + 30)
+        assert response['status_code'] == 400
+        assert response['data']['error'] == "valid_until must be after valid_from"
+        response = api_client.add_offer(1, 'FLATX', 10, ['p1'], valid_until=now - 1)
+        assert response['data']['error'] == "valid_until must be in the future"
+        assert api_client.add_offer(1, 'FLATX', 10, ['p1'], valid_from='noon')['status_code'] == 400
+        assert 1 not in mock_service.offers_db
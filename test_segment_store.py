@@ -0,0 +1,157 @@
+"""
+Test cases for the compact array-backed user segment store.
+"""
+import sys
+import threading
+
+import pytest
+from segment_store import DENSE_POSITION, SegmentStore, MIN_DENSE_SLOTS
+from test_data.test_data import TestData
+
+
+class TestSegmentStore:
+    """Test cases for SegmentStore dict semantics."""
+    
+    def test_set_and_get_segments(self):
+        """Test storing and reading back segments for dense user ids."""
+        store = SegmentStore()
+        store[TestData.USER_1] = TestData.SEGMENT_P1
+        store[TestData.USER_2] = TestData.SEGMENT_P2
+        store[TestData.USER_3] = TestData.SEGMENT_P3
+        assert store.get(TestData.USER_1) == TestData.SEGMENT_P1
+        assert store[TestData.USER_2] == TestData.SEGMENT_P2
+        assert store.get(TestData.USER_3) == TestData.SEGMENT_P3
+        assert len(store) == 3
+    
+    def test_missing_user(self):
+        """Test lookups for users without a segment."""
+        store = SegmentStore()
+        store[TestData.USER_1] = TestData.SEGMENT_P1
+        assert store.get(TestData.USER_INVALID) is None
+        assert store.get(TestData.USER_INVALID, 'none') == 'none'
+        assert TestData.USER_INVALID not in store
+        with pytest.raises(KeyError):
+            store[TestData.USER_INVALID]
+    
+    def test_overwrite_does_not_change_length(self):
+        """Test that updating a user's segment keeps a single entry."""
+        store = SegmentStore()
+        store[TestData.USER_1] = TestData.SEGMENT_P1
+        store[TestData.USER_1] = TestData.SEGMENT_P3
+        assert store.get(TestData.USER_1) == TestData.SEGMENT_P3
+        assert len(store) == 1
+    
+    def test_sparse_and_non_integer_ids_overflow(self):
+        """Test that negative, string and far-away ids are stored in the overflow map."""
+        store = SegmentStore()
+        far_id = MIN_DENSE_SLOTS * 1000
+        store[-1] = TestData.SEGMENT_P1
+        store['invalid'] = TestData.SEGMENT_P2
+        store[far_id] = TestData.SEGMENT_P3
+        assert store.get(-1) == TestData.SEGMENT_P1
+        assert store.get('invalid') == TestData.SEGMENT_P2
+        assert store.get(far_id) == TestData.SEGMENT_P3
+        assert store.nbytes() <= MIN_DENSE_SLOTS
+    
+    def test_overflow_ids_move_into_dense_range(self):
+        """Test that overflowed ids stay readable after the dense array grows past them."""
+        store = SegmentStore()
+        far_id = MIN_DENSE_SLOTS * 4
+        store[far_id] = TestData.SEGMENT_P2
+        for user_id in range(far_id * 2):
+            if user_id != far_id:
+                store[user_id] = TestData.SEGMENT_P1
+        assert store.nbytes() > far_id
+        assert store.get(far_id) == TestData.SEGMENT_P2
+        assert len(store) == far_id * 2
+    
+    def test_float_and_bool_ids_match_int_ids(self):
+        """Test that integral floats find the same entry as ints, like dict keys."""
+        store = SegmentStore()
+        store[TestData.USER_1] = TestData.SEGMENT_P1
+        assert store.get(float(TestData.USER_1)) == TestData.SEGMENT_P1
+        assert store.get(True) == TestData.SEGMENT_P1
+    
+    def test_invalid_segment_rejected(self):
+        """Test that only p1/p2/p3 can be stored."""
+        store = SegmentStore()
+        with pytest.raises(ValueError):
+            store[TestData.USER_1] = TestData.SEGMENT_INVALID
+    
+    def test_items_delete_and_clear(self):
+        """Test iteration, deletion and clearing."""
+        store = SegmentStore()
+        store[TestData.USER_1] = TestData.SEGMENT_P1
+        store[-1] = TestData.SEGMENT_P2
+        assert dict(store.items()) == {TestData.USER_1: TestData.SEGMENT_P1, -1: TestData.SEGMENT_P2}
+        del store[TestData.USER_1]
+        assert TestData.USER_1 not in store
+        assert len(store) == 1
+        store.clear()
+        assert len(store) == 0
+        assert store.get(-1) is None
+    
+    def test_pages_resume_at_position(self):
+        """Test that pages list every user once, overflow ids first and then dense ids by id."""
+        store = SegmentStore(dense_limit=100)
+        for user_id in (0, 3, 4, 9):
+            store[user_id] = TestData.SEGMENT_P1
+        store[-1] = TestData.SEGMENT_P2
+        store['guest'] = TestData.SEGMENT_P3
+        
+        pages, position = [], 0
+        while position is not None:
+            rows, position = store.page(position, 2)
+            pages.append(rows)
+        assert [row for rows in pages for row in rows] == [
+            (-1, TestData.SEGMENT_P2), ('guest', TestData.SEGMENT_P3),
+            (0, TestData.SEGMENT_P1), (3, TestData.SEGMENT_P1), (4, TestData.SEGMENT_P1), (9, TestData.SEGMENT_P1)
+        ]
+        # A dense position is a user id: the page starts there without a scan
+        assert store.page(DENSE_POSITION + 4, 1) == ([(4, TestData.SEGMENT_P1)], DENSE_POSITION + 5)
+        # Removed overflow entries are skipped and do not move later ones
+        rows, position = store.page(0, 1)
+        del store[-1]
+        assert store.page(position, 1) == ([('guest', TestData.SEGMENT_P3)], DENSE_POSITION)
+    
+    def test_pages_while_ids_move_into_dense_range(self):
+        """Test that a snapshot paged while writes move overflow ids into the dense array misses no user."""
+        def snapshot(store, write):
+            seen, position = set(), 0
+            while position is not None:
+                rows, position = store.page(position, 7)
+                seen.update(user_id for user_id, _ in rows)
+                write()
+            return seen
+        
+        def far_store():
+            store = SegmentStore()
+            store[0] = TestData.SEGMENT_P1
+            # Far ids overflow until enough users are stored to cover them
+            for user_id in far_ids:
+                store[user_id] = TestData.SEGMENT_P2
+            assert len(store._overflow) == len(far_ids)
+            return store
+        
+        far_ids = list(range(5000, 5400))
+        # Between pages: each page is followed by a batch of new ids that grows the array
+        store = far_store()
+        new_ids = iter(range(1, 5000))
+        seen = snapshot(store, lambda: [store.__setitem__(next(new_ids, 1), TestData.SEGMENT_P3) for _ in range(100)])
+        assert not store._overflow and {0, *far_ids} <= seen
+        
+        # During pages: a writer thread switched to as often as possible
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for _ in range(5):
+                store = far_store()
+                writer = threading.Thread(
+                    target=lambda: [store.__setitem__(user_id, TestData.SEGMENT_P3) for user_id in range(1, 5000)]
+                )
+                writer.start()
+                seen = snapshot(store, lambda: None)
+                writer.join()
+                assert {0, *far_ids} <= seen
+        finally:
+            sys.setswitchinterval(switch_interval)
@@ -0,0 +1,110 @@
+"""
+Test cases for cart-threshold tiered offers and FLAT% discount caps.
+"""
+import random
+import time
+from bisect import bisect_right
+
+import mock_service
+from api.cart_api import CartAPI
+from pricing import FLAT_PERCENT_CODE, FLATX_CODE, apply_discount, best_offer_tiers
+from test_data.test_data import TestData
+
+
+class TestBestOfferTiers:
+    """Test cases for the threshold arrays of concurrent offers."""
+
+    def test_thresholds_match_best_applicable_offer(self):
+        """Test that the looked-up choice is the cheapest result among the offers a cart qualifies for."""
+        rng = random.Random(21)
+        for _ in range(500):
+            offers = []
+            for _ in range(rng.randrange(1, 6)):
+                type_code = rng.choice((FLATX_CODE, FLAT_PERCENT_CODE))
+                max_discount = float(rng.randrange(0, 200)) if type_code == FLAT_PERCENT_CODE and rng.random() < 0.5 else None
+                offers.append((type_code, float(rng.randrange(0, 60)), float(rng.choice((0, 0, 100, 300, 600))), max_discount))
+            thresholds, choices = best_offer_tiers(offers)
+            assert list(thresholds) == sorted(thresholds) and len(choices) == len(thresholds) + 1
+            for cart_value in [0, 100, 299.99, 300, 600, 1000] + [round(rng.uniform(0, 3000), 2) for _ in range(20)]:
+                candidates = [
+                    apply_discount(cart_value, ('FLATX', 'FLAT%')[type_code], value, max_discount)
+                    for type_code, value, min_cart_value, max_discount in offers
+                    if cart_value >= min_cart_value
+                ]
+                choice = choices[bisect_right(thresholds, cart_value)]
+                if not candidates:
+                    assert choice is None
+                    continue
+                type_code, value, _, max_discount = offers[choice]
+                assert apply_discount(cart_value, ('FLATX', 'FLAT%')[type_code], value, max_discount) == min(candidates)
+
+    def test_capped_percent(self):
+        """Test that a FLAT% cap limits the discount and is ignored by FLATX."""
+        assert apply_discount(400, 'FLAT%', 20, 100) == 320.0
+        assert apply_discount(1000, 'FLAT%', 20, 100) == 900.0
+        assert apply_discount(1000, 'FLATX', 20, 5) == 980.0
+
+
+class TestTieredOffers:
+    """Test cases for offers with min_cart_value and max_discount through the API."""
+
+    def test_campaign_tiers(self, api_client: CartAPI):
+        """Test that "50 off above 300, 120 off above 600" resolves the tier for each cart."""
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        assert api_client.add_offer(1, 'FLATX', 50, ['p1'], min_cart_value=300)['status_code'] == 200
+        api_client.add_offer(1, 'FLATX', 120, ['p1'], min_cart_value=600, mode='add')
+
+        assert mock_service.offers_db.lookup(1, 'p1').thresholds == (300.0, 600.0)
+        expected = {0: 0, 299.99: 299.99, 300: 250.0, 599.99: 549.99, 600: 480.0, 1500: 1380.0}
+        for cart_value, final_cart_value in expected.items():
+            assert api_client.apply_offer(cart_value, TestData.USER_1, 1)['data']['cart_value'] == final_cart_value
+        response = api_client.apply_offers_batch(
+            [{'cart_value': value, 'user_id': TestData.USER_1, 'restaurant_id': 1} for value in expected]
+        )
+        assert [result['cart_value'] for result in response['data']['results']] == list(expected.values())
+
+        client = CartAPI(api_client.base_url)
+        client.enable_local_evaluation()
+        for cart_value, final_cart_value in expected.items():
+            assert client._local_quote(cart_value, TestData.USER_1, 1) == final_cart_value
+
+    def test_single_offer_with_minimum(self, api_client: CartAPI):
+        """Test that a lone offer with a minimum cart value and a cap is stored and applied."""
+        api_client.set_user_segment(TestData.USER_1, TestData.SEGMENT_P1)
+        api_client.add_offer(1, 'FLAT%', 20, ['p1'], min_cart_value=200, max_discount=100)
+
+        assert api_client.get_offers(1)['data']['offers'] == {'p1': {
+            'offer_type': 'FLAT%', 'offer_value': 20.0, 'min_cart_value': 200.0, 'max_discount': 100.0
+        }}
+        assert api_client.apply_offer(150, TestData.USER_1, 1)['data']['cart_value'] == 150
+        assert api_client.apply_offer(400, TestData.USER_1, 1)['data']['cart_value'] == 320.0
+        assert api_client.apply_offer(1000, TestData.USER_1, 1)['data']['cart_value'] == 900.0
+
+    def test_conditions_survive_dump_and_expiry(self, api_client: CartAPI):
+        """Test that dumped records keep conditions and that an expiring tier is removed on its own."""
+        now = time.time()
+        api_client.add_offer(1, 'FLATX', 50, ['p1'], min_cart_value=300)
+        api_client.add_offer(1, 'FLAT%', 25, ['p1'], min_cart_value=600, max_discount=200,
+                             valid_until=now + 60, mode='add')
+        offers = dict(mock_service.offers_db.items())
+
+        records = list(mock_service.dump_records())
+        mock_service.offers_db.clear()
+        for record in records:
+            mock_service.apply_record(record)
+        assert dict(mock_service.offers_db.items()) == offers
+
+        mock_service.offer_scheduler.run_due(now + 61)
+        assert mock_service.offers_db.get_offers(1) == {
+            'p1': {'offer_type': 'FLATX', 'offer_value': 50.0, 'min_cart_value': 300.0}
+        }
+
+    def test_invalid_conditions(self, api_client: CartAPI):
+        """Test that a cap on FLATX and negative or non-numeric conditions are rejected."""
+        response = api_client.add_offer(1, 'FLATX', 50, ['p1'], max_discount=10)
+        assert response['status_code'] == 400
+        assert response['data']['error'] == "max_discount applies to FLAT% offers only"
+        response = api_client.add_offer(1, 'FLATX', 50, ['p1'], min_cart_value=-1)
+        assert response['data']['error'] == "min_cart_value must not be negative"
+        assert api_client.add_offer(1, 'FLAT%', 5, ['p1'], max_discount='lots')['status_code'] == 400
+        assert 1 not in mock_service.offers_db
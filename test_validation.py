@@ -0,0 +1,86 @@
+"""
+Test cases for compiled request validators.
+"""
+import pytest
+from validation import (
+    CHOICE,
+    NUMBER,
+    Field,
+    Schema,
+    compile_schema,
+    validate_bulk_user_segment,
+    validate_cart,
+    validate_offer,
+    validate_user_id_param,
+    validate_user_segment
+)
+
+
+class TestValidation:
+    """Test cases for schema compilation and the endpoint validators."""
+
+    def test_valid_offer(self):
+        """Test that a valid offer is returned with offer_value converted."""
+        offer, error = validate_offer({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': '10',
+                                       'customer_segment': ['p1', 'p3']})
+        assert error is None
+        assert offer == (1, 'FLATX', 10.0, ['p1', 'p3'], None, None, 'replace', 0, None)
+
+    @pytest.mark.parametrize('data, message', [
+        ({'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': ['p1']}, "Missing required fields"),
+        ({'restaurant_id': 1, 'offer_type': '', 'offer_value': 10, 'customer_segment': ['p1']},
+         "Missing required fields"),
+        ({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': []},
+         "Missing required fields"),
+        ({'restaurant_id': 1, 'offer_type': 'BOGO', 'offer_value': 10, 'customer_segment': ['p1']},
+         "Invalid offer_type. Must be 'FLATX' or 'FLAT%'"),
+        ({'restaurant_id': 1, 'offer_type': ['FLATX'], 'offer_value': 10, 'customer_segment': ['p1']},
+         "Invalid offer_type. Must be 'FLATX' or 'FLAT%'"),
+        ({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 'ten', 'customer_segment': ['p1']},
+         "offer_value must be a number"),
+        ({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': -1, 'customer_segment': ['p1']},
+         "offer_value must be non-negative"),
+        ({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': ['p1', 'p9']},
+         "Invalid segment: p9. Must be one of ['p1', 'p2', 'p3']"),
+        ({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': ['p1'],
+          'valid_from': 'lunch'}, "valid_from must be a number"),
+        ({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 10, 'customer_segment': ['p1'],
+          'mode': 'merge'}, "mode must be 'replace' or 'add'"),
+    ])
+    def test_invalid_offer(self, data, message):
+        """Test that invalid offers report the same errors as the hand-written checks did."""
+        assert validate_offer(data) == (None, (message, 400))
+
+    def test_zero_values_are_present(self):
+        """Test that zero cart and offer values are accepted rather than treated as missing."""
+        assert validate_cart({'cart_value': 0, 'user_id': 1, 'restaurant_id': 1}) == ((0.0, 1, 1), None)
+        offer, error = validate_offer({'restaurant_id': 1, 'offer_type': 'FLATX', 'offer_value': 0,
+                                       'customer_segment': ['p1']})
+        assert error is None and offer[2] == 0.0
+
+    def test_user_segment_validators(self):
+        """Test the single and bulk user segment validators."""
+        assert validate_user_segment({'user_id': 'guest', 'segment': 'p2'}) == (('guest', 'p2'), None)
+        assert validate_user_segment({'user_id': 1, 'segment': 'p4'}) == \
+            (None, ("Invalid segment. Must be one of ['p1', 'p2', 'p3']", 400))
+        assert validate_bulk_user_segment({'user_id': 0, 'segment': 'p1'}) == ((0, 'p1'), None)
+        assert validate_bulk_user_segment({'user_id': True, 'segment': 'p1'}) == \
+            (None, ("user_id must be an integer", 400))
+
+    def test_query_params(self):
+        """Test integer query parameter validation."""
+        assert validate_user_id_param({'user_id': '42'}) == ((42,), None)
+        assert validate_user_id_param({}) == (None, ("Missing user_id parameter", 400))
+        assert validate_user_id_param({'user_id': 'abc'}) == (None, ("user_id must be an integer", 400))
+
+    def test_custom_schema(self):
+        """Test compiling a schema with its own messages and minimum."""
+        validate = compile_schema(Schema('tip', [
+            Field('amount', NUMBER, minimum=5),
+            Field('currency', CHOICE, ['INR'], missing="currency is required"),
+        ]))
+        assert validate({'amount': '7.5', 'currency': 'INR'}) == ((7.5, 'INR'), None)
+        assert validate({'amount': 7.5}) == (None, ("currency is required", 400))
+        assert validate({'amount': 1, 'currency': 'INR'}) == (None, ("amount must be at least 5", 400))
+        with pytest.raises(ValueError):
+            Field('currency', CHOICE)
@@ -0,0 +1,290 @@
+"""
+Declarative request validation for the Zomato cart offer mock service.
+
+Each endpoint describes its payload as a Schema of Fields. A schema is
+compiled once, at import, into a plain Python function that reads every
+field, checks presence, converts numbers and checks choices in straight-line
+code, with choice sets held as frozensets and every error tuple built ahead
+of time. The Flask service, the ASGI service and the bulk and batch paths
+all share the same compiled validators.
+
+A compiled validator takes a mapping (a JSON object or request.args) and
+returns (values, None), where values holds the converted fields in schema
+order, or (None, (error_message, status_code)).
+
+A field is missing when it is absent, None, or an empty string, list or
+object. Zero and False are values, so a zero cart_value or offer_value is
+accepted.
+"""
+import math
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from pricing import OFFER_TYPES
+
+
+# Field kinds
+ANY = 'any'                  # any present value, passed through unchanged
+NUMBER = 'number'            # converted with float()
+INTEGER = 'integer'          # converted with int(), e.g. query parameters
+STRICT_INTEGER = 'strict'    # must already be an int (bool is rejected)
+CHOICE = 'choice'            # a string from a fixed set
+CHOICE_LIST = 'choice_list'  # an iterable of strings from a fixed set
+
+KINDS = frozenset([ANY, NUMBER, INTEGER, STRICT_INTEGER, CHOICE, CHOICE_LIST])
+
+# Valid customer segments
+VALID_SEGMENTS = frozenset(['p1', 'p2', 'p3'])
+
+# Valid offer types
+VALID_OFFER_TYPES = frozenset(OFFER_TYPES)
+
+# Value types that count as missing when empty
+_EMPTY_TYPES = frozenset([str, list, dict])
+
+Error = Tuple[str, int]
+Validator = Callable[[Mapping[str, Any]], Tuple[Optional[tuple], Optional[Error]]]
+
+
+class Field:
+    """One field of a request schema."""
+
+    def __init__(
+        self,
+        name: str,
+        kind: str = ANY,
+        choices: Optional[Iterable[str]] = None,
+        minimum: Optional[float] = None,
+        missing: Optional[str] = None,
+        invalid: Optional[str] = None,
+        below_minimum: Optional[str] = None,
+        required: bool = True,
+        default: Any = None
+    ):
+        """
+        Describe a field.
+
+        Args:
+            name: Key of the field in the payload
+            kind: One of KINDS
+            choices: Allowed values for CHOICE and CHOICE_LIST fields
+            minimum: Smallest allowed value for NUMBER and INTEGER fields
+            missing: Error when the field is missing; defaults to the
+                schema's missing message
+            invalid: Error when the value has the wrong type or is not one
+                of the choices. For CHOICE_LIST fields, "{value}" is
+                replaced with the offending item
+            below_minimum: Error when the value is below minimum
+            required: Whether a missing field is an error; optional fields
+                that are missing take the default and skip their checks
+            default: Value of a missing optional field (None, a bool, a
+                number or a string)
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown field kind: {kind}")
+        if kind in (CHOICE, CHOICE_LIST) and not choices:
+            raise ValueError(f"Field {name} needs choices")
+        if choices and not all(type(choice) is str for choice in choices):
+            raise ValueError(f"Choices of field {name} must be strings")
+        if minimum is not None and (type(minimum) not in (int, float) or not math.isfinite(minimum)):
+            raise ValueError(f"Minimum of field {name} must be a finite number")
+        if default is not None and type(default) not in (bool, int, float, str):
+            raise ValueError(f"Default of field {name} must be None, a bool, a number or a string")
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.choices: Optional[FrozenSet[str]] = frozenset(choices) if choices else None
+        self.minimum = minimum
+        self.missing = missing
+        if invalid is None:
+            if kind == NUMBER:
+                invalid = f"{name} must be a number"
+            elif kind in (INTEGER, STRICT_INTEGER):
+                invalid = f"{name} must be an integer"
+            elif kind == CHOICE:
+                invalid = f"Invalid {name}. Must be one of {sorted(self.choices)}"
+            elif kind == CHOICE_LIST:
+                invalid = f"Invalid {name}: {{value}}. Must be one of {sorted(self.choices)}"
+        self.invalid = invalid
+        if below_minimum is None and minimum is not None:
+            below_minimum = f"{name} must be non-negative" if minimum == 0 else f"{name} must be at least {minimum}"
+        self.below_minimum = below_minimum
+
+
+class Schema:
+    """The fields of one request payload, in the order they are checked."""
+
+    def __init__(self, name: str, fields: Sequence[Field], missing: Optional[str] = "Missing required fields"):
+        """
+        Describe a payload.
+
+        Args:
+            name: Name of the payload, used for the compiled function
+            fields: Fields in the order they are validated and returned
+            missing: Error when any field without its own missing message
+                is missing
+        """
+        if not name.isidentifier():
+            raise ValueError(f"Schema name must be an identifier: {name}")
+        self.name = name
+        self.fields = tuple(fields)
+        self.missing = missing
+
+
+def compile_schema(schema: Schema) -> Validator:
+    """
+    Compile a schema into a validator function.
+
+    All fields are checked for presence first, then each field is converted
+    and checked in order, so the first error reported is the same one the
+    hand-written validators reported.
+    """
+    # Messages, error tuples, limits and choice sets are written into the
+    # source as literals, so the compiler folds them into constants (a set
+    # literal tested with "in" becomes a frozenset constant)
+    lines = [f"def validate_{schema.name}(data):", "    get = data.get"]
+    names = []
+    for index, field in enumerate(schema.fields):
+        var = f"v{index}"
+        names.append(var)
+        lines.append(f"    {var} = get({field.name!r})")
+
+    # Presence checks. Truthy values skip the rest of the check; 0 and False are present
+    for index, field in enumerate(schema.fields):
+        if not field.required:
+            continue
+        var = names[index]
+        message = field.missing if field.missing is not None else schema.missing
+        lines.append(f"    if not {var} and ({var} is None or type({var}) in _EMPTY_TYPES):")
+        lines.append(f"        return None, ({message!r}, 400)")
+
+    # Conversions and value checks
+    for index, field in enumerate(schema.fields):
+        var = names[index]
+        checks = _value_checks(field, var)
+        if field.required:
+            lines.extend('    ' + line for line in checks)
+            continue
+        lines.append(f"    if not {var} and ({var} is None or type({var}) in _EMPTY_TYPES):")
+        lines.append(f"        {var} = {field.default!r}")
+        if checks:
+            lines.append("    else:")
+            lines.extend('        ' + line for line in checks)
+
+    lines.append(f"    return ({', '.join(names)},), None")
+    namespace: Dict[str, Any] = {'_EMPTY_TYPES': _EMPTY_TYPES}
+    exec('\n'.join(lines), namespace)
+    validator = namespace[f"validate_{schema.name}"]
+    validator.schema = schema
+    return validator
+
+
+def _value_checks(field: Field, var: str) -> List[str]:
+    """Source lines that convert and check one present field, unindented."""
+    failure = f"return None, ({field.invalid!r}, 400)"
+    lines = []
+    if field.kind in (NUMBER, INTEGER):
+        convert = 'float' if field.kind == NUMBER else 'int'
+        lines.append("try:")
+        lines.append(f"    {var} = {convert}({var})")
+        lines.append("except (ValueError, TypeError):")
+        lines.append(f"    {failure}")
+    elif field.kind == STRICT_INTEGER:
+        lines.append(f"if type({var}) is not int:")
+        lines.append(f"    {failure}")
+    elif field.kind == CHOICE:
+        choices = '{' + ', '.join(repr(choice) for choice in sorted(field.choices)) + '}'
+        lines.append(f"if type({var}) is not str or {var} not in {choices}:")
+        lines.append(f"    {failure}")
+    elif field.kind == CHOICE_LIST:
+        choices = '{' + ', '.join(repr(choice) for choice in sorted(field.choices)) + '}'
+        lines.append(f"for item in {var}:")
+        lines.append(f"    if type(item) is not str or item not in {choices}:")
+        prefix, _, suffix = field.invalid.partition('{value}')
+        lines.append(f"        return None, ({prefix!r} + str(item) + {suffix!r}, 400)")
+    if field.minimum is not None:
+        lines.append(f"if {var} < {field.minimum!r}:")
+        lines.append(f"    return None, ({field.below_minimum!r}, 400)")
+    return lines
+
+
+# Endpoint schemas
+
+OFFER_SCHEMA = Schema('offer', [
+    Field('restaurant_id'),
+    Field('offer_type', CHOICE, VALID_OFFER_TYPES, invalid="Invalid offer_type. Must be 'FLATX' or 'FLAT%'"),
+    Field('offer_value', NUMBER, minimum=0),
+    Field('customer_segment', CHOICE_LIST, VALID_SEGMENTS,
+          invalid="Invalid segment: {value}. Must be one of ['p1', 'p2', 'p3']"),
+    # Optional validity window, in Unix seconds
+    Field('valid_from', NUMBER, minimum=0, invalid="valid_from must be a number",
+          below_minimum="valid_from must not be negative", required=False),
+    Field('valid_until', NUMBER, minimum=0, invalid="valid_until must be a number",
+          below_minimum="valid_until must not be negative", required=False),
+    # Whether the offer replaces the segments' offers or is added to them
+    Field('mode', CHOICE, ('replace', 'add'), invalid="mode must be 'replace' or 'add'",
+          required=False, default='replace'),
+    # Optional conditions: smallest cart the offer applies to, cap on a FLAT% discount
+    Field('min_cart_value', NUMBER, minimum=0, invalid="min_cart_value must be a number",
+          below_minimum="min_cart_value must not be negative", required=False, default=0),
+    Field('max_discount', NUMBER, minimum=0, invalid="max_discount must be a number",
+          below_minimum="max_discount must not be negative", required=False),
+])
+
+# An offer set for a chain, applying to its outlets
+CHAIN_OFFER_SCHEMA = Schema('chain_offer', [Field('chain_id')] + list(OFFER_SCHEMA.fields[1:]))
+
+# Restaurants joining a chain, or leaving theirs when chain_id is missing
+CHAIN_OUTLETS_SCHEMA = Schema('chain_outlets', [
+    Field('restaurant_ids', missing="Missing restaurant_ids"),
+    Field('chain_id', required=False),
+])
+
+CART_SCHEMA = Schema('cart', [
+    Field('cart_value', NUMBER, minimum=0),
+    Field('user_id'),
+    Field('restaurant_id'),
+])
+
+USER_SEGMENT_SCHEMA = Schema('user_segment', [
+    Field('user_id'),
+    Field('segment', CHOICE, VALID_SEGMENTS),
+])
+
+# Bulk uploads store segments under integer user ids only
+BULK_USER_SEGMENT_SCHEMA = Schema('bulk_user_segment', [
+    Field('user_id', STRICT_INTEGER),
+    Field('segment', CHOICE, VALID_SEGMENTS),
+])
+
+USER_ID_PARAM_SCHEMA = Schema('user_id_param', [
+    Field('user_id', INTEGER, missing="Missing user_id parameter"),
+])
+
+RESTAURANT_ID_PARAM_SCHEMA = Schema('restaurant_id_param', [
+    Field('restaurant_id', INTEGER, missing="Missing restaurant_id parameter"),
+])
+
+CHAIN_ID_PARAM_SCHEMA = Schema('chain_id_param', [
+    Field('chain_id', INTEGER, missing="Missing chain_id parameter"),
+])
+
+CHANGES_PARAM_SCHEMA = Schema('changes_param', [
+    Field('since', INTEGER, minimum=0, missing="Missing since parameter",
+          invalid="since must be an integer", below_minimum="since must not be negative"),
+    Field('limit', INTEGER, minimum=1, invalid="limit must be an integer",
+          below_minimum="limit must be at least 1", required=False, default=1000),
+    Field('cursor', INTEGER, minimum=0, invalid="cursor must be an integer",
+          below_minimum="cursor must not be negative", required=False),
+])
+
+validate_offer = compile_schema(OFFER_SCHEMA)
+validate_chain_offer = compile_schema(CHAIN_OFFER_SCHEMA)
+validate_chain_outlets = compile_schema(CHAIN_OUTLETS_SCHEMA)
+validate_cart = compile_schema(CART_SCHEMA)
+validate_user_segment = compile_schema(USER_SEGMENT_SCHEMA)
+validate_bulk_user_segment = compile_schema(BULK_USER_SEGMENT_SCHEMA)
+validate_user_id_param = compile_schema(USER_ID_PARAM_SCHEMA)
+validate_restaurant_id_param = compile_schema(RESTAURANT_ID_PARAM_SCHEMA)
+validate_chain_id_param = compile_schema(CHAIN_ID_PARAM_SCHEMA)
+validate_changes_param = compile_schema(CHANGES_PARAM_SCHEMA)